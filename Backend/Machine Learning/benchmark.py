@@ -0,0 +1,328 @@
+"""
+benchmark.py — Offline Benchmarks for the ML Hot Paths
+─────────────────────────────────────────────────────────
+Runs on synthetic data in a scratch directory (no server, no real models,
+no network) and measures:
+
+    generator   step_building ticks/s (the engine run_building loops on),
+                FleetSimulator.tick and run_scheduler building-ticks/s
+    windows     train_local.create_windows windows/s and peak memory
+    fedavg      fedavg_round wall time vs. number of clients
+    predict     predict_building single-window latency percentiles and
+                predict_batch batched latency / throughput
+
+Results are JSON — every metric carries its unit and whether higher or
+lower is better — and can be compared with a stored baseline; a metric
+that got worse by more than --threshold is flagged and the exit code is 1.
+
+    python benchmark.py                              # full suite, print + compare with baseline
+    python benchmark.py --only predict,fedavg --out run.json
+    python benchmark.py --save-baseline              # record this machine's numbers
+    python benchmark.py --rows 50000 --clients 2,8 --ticks 2000   # quicker run
+
+The four scripts are loaded from their file paths, so their module-level
+settings (MODEL_DIR, DATA_DIR, …) are the ones benchmarked. windows
+imports train_local, which needs TensorFlow; the other groups do not.
+"""
+
+import os, sys, json, time, random, shutil, platform, tempfile, tracemalloc, contextlib, importlib.util
+import numpy as np
+import h5py
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = {
+    "generator":   "generator (1).py",
+    "train_local": "train_local (1).py",
+    "fedavg":      "fedavg (1).py",
+    "predict":     "predict (1).py",
+}
+GROUPS    = ("generator", "windows", "fedavg", "predict")
+BASELINE  = os.path.join(HERE, "bench_baseline.json")
+THRESHOLD = 0.20   # relative change counted as a regression
+
+# Default sizes — small enough for a laptop run of a minute or two
+TICKS       = 20_000              # step_building ticks
+FLEET       = 1_000               # buildings in the fleet / scheduler runs
+FLEET_TICKS = 200
+ROWS        = 200_000             # telemetry rows fed to create_windows
+CLIENTS     = (2, 8, 32, 128)     # fedavg_round client counts
+BUILDINGS   = 5                   # predict: synthetic buildings
+SAMPLES     = 200                 # predict: timed calls per case
+BATCH       = 256                 # predict: windows per building in a batched call
+REPEAT      = 3                   # throughput runs — best one is kept
+
+_modules = {}
+
+
+def load_script(name):
+    """Import one of the ML scripts by path (their file names aren't importable)."""
+    if name not in _modules:
+        if HERE not in sys.path:
+            sys.path.insert(0, HERE)
+        spec = importlib.util.spec_from_file_location(f"{name}_bench", os.path.join(HERE, SCRIPTS[name]))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[name] = module
+    return _modules[name]
+
+
+@contextlib.contextmanager
+def scratch_dir():
+    """cd into a fresh temp dir (the scripts use relative models/ data/ store/ dirs)."""
+    cwd, tmp = os.getcwd(), tempfile.mkdtemp(prefix="bench_")
+    try:
+        os.chdir(tmp)
+        yield tmp
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the scripts' progress prints while timing."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def metric(value, unit, better):
+    return {"value": round(float(value), 6), "unit": unit, "better": better}
+
+
+def best_rate(fn, count, repeat=REPEAT):
+    """count / fastest of `repeat` calls of fn()."""
+    best = min(_timed(fn) for _ in range(repeat))
+    return count / best
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def percentiles(samples_s, prefix, unit="ms"):
+    ms = np.asarray(samples_s) * 1000
+    return {f"{prefix}.{name}": metric(np.percentile(ms, q), unit, "lower")
+            for name, q in (("p50", 50), ("p95", 95), ("p99", 99))}
+
+
+def synthetic_weights(path, shapes, rng):
+    """A .weights.h5 with the real model's layout and random values."""
+    with h5py.File(path, "w") as f:
+        for k, shape in shapes.items():
+            f.create_dataset(k, data=rng.normal(0, 0.1, shape).astype(np.float32))
+
+
+# ── Benchmarks ───────────────────────────────────────────────
+
+def bench_generator(cfg):
+    gen = load_script("generator")
+    out = {}
+    profile = gen.PROFILES["B1"]
+
+    def scalar():
+        state, rng = gen.new_building_state(profile), random.Random(cfg["seed"])
+        for _ in range(cfg["ticks"]):
+            gen.step_building(state, profile, rng)
+    out["generator.step_building.ticks_per_s"] = metric(best_rate(scalar, cfg["ticks"]), "ticks/s", "higher")
+
+    profiles = gen.fleet_profiles(cfg["fleet"])
+
+    def fleet():
+        sim = gen.FleetSimulator(profiles, seed=cfg["seed"])
+        for _ in range(cfg["fleet_ticks"]):
+            sim.tick()
+    out["generator.fleet_tick.building_ticks_per_s"] = metric(
+        best_rate(fleet, cfg["fleet"] * cfg["fleet_ticks"]), "building-ticks/s", "higher")
+
+    # Full tick path incl. CSV rows, as fast as the clock allows, no network
+    with scratch_dir(), quiet():
+        seconds = _timed(lambda: gen.run_scheduler(profiles, speed=None, seed=cfg["seed"],
+                                                   data_dir="data", max_minutes=cfg["fleet_ticks"],
+                                                   report_every=1e9))
+    out["generator.run_scheduler_csv.building_ticks_per_s"] = metric(
+        cfg["fleet"] * cfg["fleet_ticks"] / seconds, "building-ticks/s", "higher")
+    return out
+
+
+def bench_windows(cfg):
+    tl  = load_script("train_local")
+    rng = np.random.default_rng(cfg["seed"])
+    rows = cfg["rows"]
+    scaled = rng.random((rows, len(tl.FEATURES)), dtype=np.float32)
+    df = {"net_flow_kw": rng.normal(0, 0.05, rows).round(6),
+          "is_deficit":  (rng.random(rows) < 0.3).astype(np.int64)}
+    windows = rows - tl.WINDOW_IN - tl.WINDOW_OUT + 1
+
+    out = {"windows.create_windows.windows_per_s": metric(
+        best_rate(lambda: tl.create_windows(scaled, df), windows), "windows/s", "higher")}
+
+    tracemalloc.start()
+    X, y_net, y_def = tl.create_windows(scaled, df)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    out["windows.create_windows.peak_mb"] = metric(peak / 2**20, "MB", "lower")
+    out["windows.create_windows.bytes_per_window"] = metric(peak / windows, "B", "lower")
+
+    # One training batch gathered from the strided view (what WindowBatches does per step)
+    idx = rng.permutation(windows)[:tl.BATCH_SIZE * 100]
+    out["windows.batch_gather.windows_per_s"] = metric(
+        best_rate(lambda: [X[idx[i:i + tl.BATCH_SIZE]] for i in range(0, len(idx), tl.BATCH_SIZE)], len(idx)),
+        "windows/s", "higher")
+    return out
+
+
+def bench_fedavg(cfg):
+    fa  = load_script("fedavg")
+    out = {}
+    for n in cfg["clients"]:
+        rng = np.random.default_rng(cfg["seed"])
+        with scratch_dir():
+            os.makedirs(fa.MODEL_DIR)
+            ids = [f"S{i:05d}" for i in range(n)]
+            for bid in ids:
+                synthetic_weights(fa.weights_path(fa.MODEL_DIR, bid), fa.SYNTHETIC_SHAPES, rng)
+            with quiet():
+                seconds = min(_timed(lambda: fa.fedavg_round(ids)) for _ in range(REPEAT))
+        out[f"fedavg.round_s.clients_{n}"] = metric(seconds, "s", "lower")
+        out[f"fedavg.per_client_ms.clients_{n}"] = metric(seconds / n * 1000, "ms", "lower")
+    return out
+
+
+def bench_predict(cfg):
+    pr  = load_script("predict")
+    fa  = load_script("fedavg")    # SYNTHETIC_SHAPES — the real model's tensor layout
+    rng = np.random.default_rng(cfg["seed"])
+    out = {}
+    with scratch_dir():
+        os.makedirs(pr.MODEL_DIR)
+        ids = [f"B{i + 1}" for i in range(cfg["buildings"])]
+        for bid in ids:
+            synthetic_weights(os.path.join(pr.MODEL_DIR, f"{bid}_weights.weights.h5"), fa.SYNTHETIC_SHAPES, rng)
+            with open(os.path.join(pr.MODEL_DIR, f"{bid}_norm.json"), "w") as f:
+                json.dump({feat: {"min": 0.0, "max": 1.0} for feat in pr.FEATURES}, f)
+        frames = {bid: {feat: rng.random(pr.WINDOW_IN) for feat in pr.FEATURES} for bid in ids}
+
+        with quiet():
+            loads = [_timed(lambda: pr.load_building(bid)) for bid in ids]   # each a distinct model file
+        out["predict.cold_load_ms"] = metric(np.median(loads) * 1000, "ms", "lower")
+        pr.predict_building(ids[0], frames[ids[0]])   # warm-up
+
+        single = [_timed(lambda: pr.predict_building(ids[0], frames[ids[0]])) for _ in range(cfg["samples"])]
+        out.update(percentiles(single, "predict.single"))
+
+        windows = {bid: rng.random((cfg["batch"], pr.WINDOW_IN, len(pr.FEATURES)), dtype=np.float32)
+                   for bid in ids}
+        batched = [_timed(lambda: pr.predict_batch(windows)) for _ in range(max(5, cfg["samples"] // 20))]
+        out.update(percentiles(batched, "predict.batched"))
+        out["predict.batched.windows_per_s"] = metric(
+            len(ids) * cfg["batch"] / float(np.median(batched)), "windows/s", "higher")
+    return out
+
+
+BENCHMARKS = {
+    "generator": bench_generator,
+    "windows":   bench_windows,
+    "fedavg":    bench_fedavg,
+    "predict":   bench_predict,
+}
+
+
+def run(groups=GROUPS, **cfg):
+    """Run the selected groups; returns {"meta": …, "metrics": {name: metric}}."""
+    cfg = {"ticks": TICKS, "fleet": FLEET, "fleet_ticks": FLEET_TICKS, "rows": ROWS,
+           "clients": CLIENTS, "buildings": BUILDINGS, "samples": SAMPLES, "batch": BATCH,
+           "seed": 0, **cfg}
+    metrics = {}
+    for group in groups:
+        start = time.perf_counter()
+        metrics.update(BENCHMARKS[group](cfg))
+        print(f"[bench] {group:10s} done in {time.perf_counter() - start:.1f}s")
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python":    platform.python_version(),
+            "numpy":     np.__version__,
+            "platform":  platform.platform(),
+            "cpus":      os.cpu_count(),
+            "config":    {k: list(v) if isinstance(v, tuple) else v for k, v in cfg.items()},
+        },
+        "metrics": metrics,
+    }
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """
+    [(name, baseline value, value, relative change, regressed)] for metrics
+    present in both. change > 0 is always an improvement, whichever
+    direction the metric counts as better.
+    """
+    rows = []
+    for name, m in results["metrics"].items():
+        ref = baseline["metrics"].get(name)
+        if ref is None or ref["value"] == 0:
+            continue
+        change = (m["value"] - ref["value"]) / ref["value"]
+        if m["better"] == "lower":
+            change = -change
+        rows.append((name, ref["value"], m["value"], change, change < -threshold))
+    return rows
+
+
+def print_results(results, comparison=None):
+    changes = {row[0]: row for row in comparison or []}
+    for name, m in results["metrics"].items():
+        line = f"  {name:50s} {m['value']:>14,.3f} {m['unit']}"
+        if name in changes:
+            _, ref, _, change, regressed = changes[name]
+            line += f"   (baseline {ref:,.3f}, {change:+.1%}{'  REGRESSION' if regressed else ''})"
+        print(line)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the ML scripts")
+    parser.add_argument("--only", default=",".join(GROUPS), help=f"comma-separated groups: {', '.join(GROUPS)}")
+    parser.add_argument("--ticks", type=int, default=TICKS)
+    parser.add_argument("--fleet", type=int, default=FLEET)
+    parser.add_argument("--fleet-ticks", type=int, default=FLEET_TICKS)
+    parser.add_argument("--rows", type=int, default=ROWS)
+    parser.add_argument("--clients", default=",".join(map(str, CLIENTS)), help="fedavg client counts")
+    parser.add_argument("--buildings", type=int, default=BUILDINGS)
+    parser.add_argument("--samples", type=int, default=SAMPLES)
+    parser.add_argument("--batch", type=int, default=BATCH)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="relative slowdown flagged as a regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    groups = [g for g in args.only.split(",") if g]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown groups: {', '.join(sorted(unknown))}")
+
+    results = run(groups, ticks=args.ticks, fleet=args.fleet, fleet_ticks=args.fleet_ticks, rows=args.rows,
+                  clients=tuple(int(c) for c in args.clients.split(",")), buildings=args.buildings,
+                  samples=args.samples, batch=args.batch, seed=args.seed)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    comparison = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            comparison = compare(results, json.load(f), args.threshold)
+    print_results(results, comparison)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved → {args.baseline}")
+    elif comparison is not None:
+        regressed = [row[0] for row in comparison if row[4]]
+        print(f"{len(regressed)} regression(s) vs {args.baseline}" + (f": {', '.join(regressed)}" if regressed else ""))
+        sys.exit(1 if regressed else 0)
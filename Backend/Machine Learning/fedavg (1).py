@@ -3,23 +3,93 @@ fedavg.py — Federated Averaging
 ─────────────────────────────────────────────────────────
 Collects weights from all 5 building models.
 Computes weighted average (weighted by training data size).
-Pushes global weights back to all buildings.
+Publishes the global weights once; buildings use them by reference.
+
+Weights are read straight from each building's *_weights.weights.h5
+(or the weights member inside *_model.keras) with h5py — no TensorFlow,
+no model deserialization. Clients are loaded in parallel and folded into
+one running weighted-sum accumulator, so memory holds the accumulator
+plus the few clients currently in flight, however many buildings join.
+
+Event-driven mode (--watch) polls the client weight files and starts a
+round as soon as --min-updates buildings have retrained since the last
+one, instead of on a timer. Late updates — trained from an older global
+model — are mixed in with a staleness discount; the weight they lose goes
+to the previous global model, as does the weight of clients that didn't
+retrain, so nobody's contribution is overwritten by a partial round.
+
+Clients may publish a compressed <bid>_update.npz (see weight_codec.py)
+instead of having their full weights read: a delta against the global
+model, optionally int8-quantized or top-k sparsified. It is used when it
+encodes the client's current weights file and was taken against the
+current global round (a stale delta falls back to the full weights); the
+round logs the bytes read versus dense float32 weights and the clients'
+reconstruction error.
+
+Per-client load / aggregation time and round time are recorded in
+metrics.py (--metrics-port / --metrics-file); shard workers send theirs
+back to the root.
 
 Run manually:      python fedavg.py
-Run on schedule:   python fedavg.py --watch   (runs every 24 sim-hours)
+Run on updates:    python fedavg.py --watch [--min-updates K] [--max-wait S]
+Round history:     python round_journal.py tail models/fedavg_log.jsonl 10
 """
 
-import os, json, sys, time
+import os, io, json, math, time, shutil, zipfile
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import numpy as np
-from tensorflow import keras
+import h5py
+from telemetry_store import TelemetryStore, STORE_DIR
+from model_registry import (GLOBAL_MODEL, GLOBAL_WEIGHTS, file_stamp, load_manifest,
+                            model_path, weights_path, write_manifest)
+from round_journal import RoundJournal, migrate_json_log
+from weight_codec import read_tensors, read_update, read_update_header, update_path
+import metrics
 
 MODEL_DIR = "models"
 BUILDINGS = ["B1", "B2", "B3", "B4", "B5"]
 DATA_DIR  = "data"
 
+LOAD_WORKERS  = 8            # clients read concurrently
+PRINT_CLIENTS = 20           # per-client weight lines printed per round
+
+# Tensors of the default LSTM model (Keras 3 .weights.h5 paths) — used by
+# the synthetic harness when no real client is available as a template
+SYNTHETIC_SHAPES = {
+    "layers/lstm/cell/vars/0":   (5, 256),  "layers/lstm/cell/vars/1":   (64, 256),
+    "layers/lstm/cell/vars/2":   (256,),
+    "layers/lstm_1/cell/vars/0": (64, 128), "layers/lstm_1/cell/vars/1": (32, 128),
+    "layers/lstm_1/cell/vars/2": (128,),
+    "layers/dense/vars/0":   (32, 16), "layers/dense/vars/1":   (16,),
+    "layers/dense_1/vars/0": (32, 16), "layers/dense_1/vars/1": (16,),
+    "layers/dense_2/vars/0": (16, 1),  "layers/dense_2/vars/1": (1,),
+    "layers/dense_3/vars/0": (16, 1),  "layers/dense_3/vars/1": (1,),
+}
+KERAS_WEIGHTS = "model.weights.h5"   # weights member inside a .keras zip
+
+LOG_FILE        = "fedavg_log.jsonl"   # append-only round journal (one JSON object per line)
+LEGACY_LOG_FILE = "fedavg_log.json"    # old whole-array log, imported once on first use
+
+# Event-driven aggregation (watch_mode)
+MIN_UPDATES     = 2      # fresh client updates that trigger a round
+POLL_SECONDS    = 5      # how often client files are checked
+MAX_WAIT        = 300    # aggregate fewer than MIN_UPDATES once the oldest has waited this long
+STALENESS_ALPHA = 0.5    # an update `s` rounds behind counts (1 + s) ** -alpha of its data size
+
+# Metrics (see metrics.py)
+LOAD_SECONDS  = metrics.histogram("fedavg_client_load_seconds", "Reading one client's weights/update + data size")
+AGG_SECONDS   = metrics.histogram("fedavg_client_aggregate_seconds", "Adding one client to the accumulator")
+CLIENTS       = metrics.counter("fedavg_clients_total", "Clients per outcome (merged / skipped)")
+ROUND_SECONDS = metrics.histogram("fedavg_round_seconds", "Wall time per aggregation round")
+SHARD_SECONDS = metrics.histogram("fedavg_shard_seconds", "Wall time per shard worker (hierarchical)")
+PENDING       = metrics.gauge("fedavg_watch_pending", "Clients with new files waiting for a round (--watch)")
+
 
 def get_data_size(building_id):
     """Number of training rows — used as weight in FedAvg."""
+    store = TelemetryStore(STORE_DIR)
+    if store.has(building_id):
+        return store.num_rows(building_id)   # O(1) from the store index
     csv_path = os.path.join(DATA_DIR, f"{building_id}.csv")
     if not os.path.exists(csv_path):
         return 1
@@ -27,104 +97,636 @@ def get_data_size(building_id):
         return sum(1 for _ in f) - 1  # subtract header
 
 
-def load_model(building_id):
-    path = os.path.join(MODEL_DIR, f"{building_id}_model.keras")
+def _open_weights(building_id):
+    """The building's weights as an h5 source — .weights.h5 if present, else inside the .keras zip."""
+    path = weights_path(MODEL_DIR, building_id)
+    if os.path.exists(path):
+        return path
+    path = model_path(MODEL_DIR, building_id)
+    if os.path.exists(path):
+        with zipfile.ZipFile(path) as z:
+            return io.BytesIO(z.read(KERAS_WEIGHTS))
+    raise FileNotFoundError(f"Model not found: {path}")
+
+
+def read_weights(building_id):
+    """{dataset path: float32 array} for every model tensor of a building."""
+    return read_tensors(_open_weights(building_id))
+
+
+def read_global_weights():
+    """Tensors of the current global model, or None before the first round."""
+    path = os.path.join(MODEL_DIR, GLOBAL_WEIGHTS)
     if not os.path.exists(path):
-        raise FileNotFoundError(f"Model not found: {path}")
-    return keras.models.load_model(path)
+        return None
+    return read_tensors(path)
+
+
+def current_round():
+    """Round of the current global model (0 before the first round)."""
+    return (load_manifest(MODEL_DIR) or {}).get("round", 0)
+
+
+def read_client(building_id, base=None, base_round=None):
+    """
+    (tensors, update header or None). With a global model to apply it to,
+    a client's update file is used instead of its weights when it encodes
+    the current weights file and was taken against that same global model
+    (base_round, default: the manifest's round). A delta against an older
+    round would land on the wrong base, so the full weights are read instead.
+    """
+    path = update_path(MODEL_DIR, building_id)
+    if base is not None and os.path.exists(path):
+        header = read_update_header(path)
+        if base_round is None:
+            base_round = current_round()
+        if header["weights_stamp"] == file_stamp(weights_path(MODEL_DIR, building_id)) \
+                and header["base_round"] == base_round:
+            header, delta = read_update(path)
+            if set(delta) != set(base):
+                raise ValueError("update doesn't match the global model (different architecture?)")
+            return {k: base[k] + d for k, d in delta.items()}, header
+    return read_weights(building_id), None
+
+
+def client_stamps(building_id):
+    """File versions of a building's model + weights — compared against the manifest."""
+    return {"model":   file_stamp(model_path(MODEL_DIR, building_id)),
+            "weights": file_stamp(weights_path(MODEL_DIR, building_id))}
+
 
+def client_base_round(building_id):
+    """Global round a client's update was trained from (train_local's base_round), or None."""
+    path = os.path.join(MODEL_DIR, f"{building_id}_train_state.json")
+    try:
+        with open(path) as f:
+            return json.load(f).get("base_round")
+    except (FileNotFoundError, ValueError):
+        return None
 
-def fedavg_round():
+
+def staleness_discount(staleness, alpha=STALENESS_ALPHA):
+    return (1.0 + max(0, staleness)) ** -alpha
+
+
+def discover_clients():
+    """Buildings that have a model or weights file in MODEL_DIR."""
+    if not os.path.isdir(MODEL_DIR):
+        return []
+    ids = set()
+    for name in os.listdir(MODEL_DIR):
+        if ".tmp" in name:
+            continue
+        for suffix in ("_weights.weights.h5", "_model.keras"):
+            if name.endswith(suffix):
+                ids.add(name[:-len(suffix)])
+    ids.discard("global")
+    return sorted(ids)
+
+
+class WeightAccumulator:
+    """
+    Running sum of data_size × weights; result() divides by the total once.
+
+    Sums are compensated (TwoSum: a float64 sum plus a float64 error term),
+    and the total is kept as its terms and added with math.fsum, so the
+    result doesn't depend on the order clients arrive in or on how they
+    were split into shards — flat and hierarchical rounds agree exactly.
+    """
+
+    def __init__(self):
+        self.sums   = None
+        self.comp   = None
+        self.shapes = None
+        self.sizes  = []
+
+    @property
+    def total(self):
+        return math.fsum(self.sizes)
+
+    def _init(self, shapes):
+        self.shapes = dict(shapes)
+        self.sums   = {k: np.zeros(s, dtype=np.float64) for k, s in self.shapes.items()}
+        self.comp   = {k: np.zeros(s, dtype=np.float64) for k, s in self.shapes.items()}
+
+    def _two_sum(self, k, x):
+        s = self.sums[k]
+        t = s + x
+        b = t - s
+        self.comp[k] += (s - (t - b)) + (x - b)
+        self.sums[k] = t
+
+    def add(self, tensors, data_size):
+        shapes = {k: v.shape for k, v in tensors.items()}
+        if self.sums is None:
+            self._init(shapes)
+        elif shapes != self.shapes:
+            raise ValueError("weight tensors don't match the other clients (different architecture?)")
+        for k, v in tensors.items():
+            self._two_sum(k, data_size * v.astype(np.float64))
+        self.sizes.append(data_size)
+
+    def merge(self, other):
+        """Fold in another accumulator's partial sums (e.g. one shard's)."""
+        if other.sums is None:
+            return
+        if self.sums is None:
+            self._init(other.shapes)
+        elif other.shapes != self.shapes:
+            raise ValueError("shard weight tensors don't match (different architecture?)")
+        for k in self.sums:
+            self._two_sum(k, other.sums[k])
+            self.comp[k] += other.comp[k]
+        self.sizes.extend(other.sizes)
+
+    def result(self):
+        total = self.total
+        return {k: ((s + self.comp[k]) / total).astype(np.float32) for k, s in self.sums.items()}
+
+
+def load_clients(building_ids, workers=LOAD_WORKERS, base=None, sizes=None, base_round=None):
+    """
+    Yield (building_id, tensors, data_size, update_header, error) as clients
+    finish loading — at most `workers` clients are held in memory at once.
+    base is the current global model (of round base_round), needed to apply
+    update files; sizes ({bid: rows}) overrides get_data_size.
+    """
+    def load(b):
+        with LOAD_SECONDS.time():
+            tensors, header = read_client(b, base, base_round)
+            return tensors, sizes[b] if sizes is not None else get_data_size(b), header
+
+    ids = iter(building_ids)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        for bid in ids:
+            pending[pool.submit(load, bid)] = bid
+            if len(pending) >= workers:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                bid = pending.pop(fut)
+                try:
+                    tensors, size, header = fut.result()
+                    yield bid, tensors, size, header, None
+                except Exception as e:
+                    yield bid, None, None, None, e
+                nxt = next(ids, None)
+                if nxt is not None:
+                    pending[pool.submit(load, nxt)] = nxt
+
+
+def write_global(template_id, global_weights):
+    """
+    Write global_model.weights.h5 (and global_model.keras if the template
+    building has one) exactly once, by patching a copy of the template
+    client's files — no Keras model is built or saved.
+    """
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    out_weights = os.path.join(MODEL_DIR, GLOBAL_WEIGHTS)
+    tmp_weights = out_weights + ".tmp"
+
+    src_weights = weights_path(MODEL_DIR, template_id)
+    src_model   = model_path(MODEL_DIR, template_id)
+    if os.path.exists(src_weights):
+        shutil.copyfile(src_weights, tmp_weights)
+    else:
+        with zipfile.ZipFile(src_model) as z, open(tmp_weights, "wb") as out:
+            out.write(z.read(KERAS_WEIGHTS))
+
+    with h5py.File(tmp_weights, "r+") as f:
+        for k, v in global_weights.items():
+            f[k][...] = v
+    os.replace(tmp_weights, out_weights)
+
+    if not os.path.exists(src_model):
+        return out_weights, None
+    out_model = os.path.join(MODEL_DIR, GLOBAL_MODEL)
+    tmp_model = out_model + ".tmp"
+    with zipfile.ZipFile(src_model) as zin, zipfile.ZipFile(tmp_model, "w") as zout:
+        for item in zin.infolist():
+            if item.filename == KERAS_WEIGHTS:
+                zout.write(out_weights, KERAS_WEIGHTS)
+            else:
+                zout.writestr(item, zin.read(item.filename))
+    os.replace(tmp_model, out_model)
+    return out_weights, out_model
+
+
+def collect_clients(building_ids, staleness=None, alpha=STALENESS_ALPHA, base=None,
+                    verify_updates=False, sizes=None, log=print, base_round=None):
+    """
+    Step 1 of a round for one group of clients: stream them into a
+    WeightAccumulator. Returns the accumulator plus per-client bookkeeping
+    (data sizes, discounts, file stamps, update headers).
+    """
+    part = {"acc": WeightAccumulator(), "exact": WeightAccumulator() if verify_updates else None,
+            "data_sizes": {}, "discounts": {}, "stamps": {}, "updates": {}, "skipped": 0}
+
+    for bid, tensors, size, header, err in load_clients(building_ids, base=base, sizes=sizes,
+                                                        base_round=base_round):
+        if err is not None:
+            part["skipped"] += 1
+            CLIENTS.inc(status="skipped")
+            log(f"  [{bid}] SKIP — {err}")
+            continue
+        d = staleness_discount(staleness.get(bid, 0), alpha) if staleness is not None else 1.0
+        try:
+            with AGG_SECONDS.time():
+                part["acc"].add(tensors, size * d)
+                if part["exact"] is not None:
+                    part["exact"].add(read_weights(bid) if header else tensors, size * d)
+        except ValueError as e:
+            part["skipped"] += 1
+            CLIENTS.inc(status="skipped")
+            log(f"  [{bid}] SKIP — {e}")
+            continue
+        CLIENTS.inc(status="merged")
+        part["data_sizes"][bid] = size
+        part["discounts"][bid]  = d
+        part["stamps"][bid]     = client_stamps(bid)
+        late = f", {staleness[bid]} rounds stale (×{d:.3f})" if d < 1 else ""
+        if header:
+            part["updates"][bid] = header
+            late += (f", {header['codec']} update {header['bytes']/1024:,.0f} KB"
+                     f" (err {header['rel_error']:.2e})")
+        log(f"  [{bid}] loaded — {size:,} rows{late}")
+    return part
+
+
+def _quiet(*args, **kwargs):
+    pass
+
+
+def _collect_shard(shard, building_ids, staleness, alpha, verify_updates, sizes):
+    """Worker process: partial weighted sum of one shard."""
+    start = time.perf_counter()
+    part = collect_clients(building_ids, staleness, alpha, read_global_weights(),
+                           verify_updates, sizes, log=_quiet, base_round=current_round())
+    part["shard"], part["wall_s"] = shard, round(time.perf_counter() - start, 3)
+    SHARD_SECONDS.observe(time.perf_counter() - start)
+    part["metrics"] = metrics.state(reset=True)   # merged into the root process's registry
+    return part
+
+
+def make_shards(building_ids, num_shards=None, shard_map=None):
+    """
+    {shard name: [building ids]}. shard_map ({bid: shard}, e.g. building
+    type or campus) takes priority; unmapped buildings — or all of them
+    without a map — are dealt round-robin into num_shards groups.
+    """
+    shard_map = shard_map or {}
+    shards = {}
+    rest   = []
+    for bid in building_ids:
+        if bid in shard_map:
+            shards.setdefault(str(shard_map[bid]), []).append(bid)
+        else:
+            rest.append(bid)
+    n = max(1, num_shards or (os.cpu_count() or 1))
+    for i, bid in enumerate(sorted(rest)):
+        shards.setdefault(f"shard{i % n:03d}", []).append(bid)
+    return shards
+
+
+def collect_sharded(building_ids, staleness=None, alpha=STALENESS_ALPHA, verify_updates=False,
+                    sizes=None, num_shards=None, shard_map=None, workers=None):
+    """
+    Hierarchical step 1: each shard's partial sum is built in its own
+    process, the root merges the partials. Same result as collect_clients.
+    """
+    import multiprocessing as mp
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    shards  = make_shards(building_ids, num_shards, shard_map)
+    workers = min(workers or (os.cpu_count() or 1), len(shards))
+    root = {"acc": WeightAccumulator(), "exact": WeightAccumulator() if verify_updates else None,
+            "data_sizes": {}, "discounts": {}, "stamps": {}, "updates": {}, "skipped": 0}
+
+    print(f"  {len(building_ids)} clients in {len(shards)} shards, {workers} worker processes")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+        futures = [
+            pool.submit(_collect_shard, name, ids,
+                        {b: staleness[b] for b in ids if b in staleness} if staleness is not None else None,
+                        alpha, verify_updates, {b: sizes[b] for b in ids} if sizes is not None else None)
+            for name, ids in sorted(shards.items())
+        ]
+        # Merging in completion order is fine: the accumulator is order-independent
+        for fut in as_completed(futures):
+            part = fut.result()
+            metrics.merge(part.pop("metrics"))
+            root["acc"].merge(part["acc"])
+            if root["exact"] is not None:
+                root["exact"].merge(part["exact"])
+            for key in ("data_sizes", "discounts", "stamps", "updates"):
+                root[key].update(part[key])
+            root["skipped"] += part["skipped"]
+            print(f"  [{part['shard']}] {len(part['data_sizes']):,} clients merged"
+                  f" ({part['skipped']} skipped, {part['wall_s']}s)")
+    return root
+
+
+def open_journal():
+    """The round journal, importing a legacy fedavg_log.json the first time."""
+    journal = RoundJournal(os.path.join(MODEL_DIR, LOG_FILE))
+    legacy  = os.path.join(MODEL_DIR, LEGACY_LOG_FILE)
+    if not journal.files() and os.path.exists(legacy):
+        n = migrate_json_log(legacy, journal)
+        print(f"  Imported {n} rounds from {legacy} → {journal.path}")
+    return journal
+
+
+def fedavg_round(buildings=None, staleness=None, alpha=STALENESS_ALPHA, extra=None,
+                 verify_updates=False, shards=None, shard_map=None, workers=None):
+    """
+    One aggregation round over `buildings` (default: every client in
+    MODEL_DIR). With staleness ({bid: rounds behind}) it is an asynchronous
+    round: each update is discounted and the previous global model keeps
+    the remaining weight. verify_updates also averages the clients' full
+    weights to measure how far compressed updates moved the global model.
+    shards / shard_map switch step 1 to the hierarchical, multi-process
+    aggregator. Returns the journal entry, or None if there was nothing
+    to aggregate.
+    """
     print("\n" + "="*55)
     print("  FedAvg Round Starting")
     print("="*55)
+    buildings = buildings or discover_clients() or BUILDINGS
+    start = time.perf_counter()
+    previous   = load_manifest(MODEL_DIR) or {}
+    base       = read_global_weights()
+    base_round = previous.get("round", 0)
 
-    # ── Step 1: Load all models + get data sizes ──────────────
-    models     = {}
-    data_sizes = {}
+    # ── Step 1: Stream clients into the weighted-sum accumulator ──
+    if shards or shard_map:
+        part = collect_sharded(buildings, staleness, alpha, verify_updates,
+                               num_shards=shards, shard_map=shard_map, workers=workers)
+    else:
+        part = collect_clients(buildings, staleness, alpha, base, verify_updates, base_round=base_round)
+    acc, exact = part["acc"], part["exact"]
+    data_sizes, discounts = part["data_sizes"], part["discounts"]
+    stamps, updates       = part["stamps"], part["updates"]
 
-    for bid in BUILDINGS:
-        try:
-            models[bid]     = load_model(bid)
-            data_sizes[bid] = get_data_size(bid)
-            print(f"  [{bid}] loaded — {data_sizes[bid]:,} rows")
-        except Exception as e:
-            print(f"  [{bid}] SKIP — {e}")
+    # Async rounds: the previous global keeps the weight discounted away from
+    # late updates plus that of synced clients that didn't retrain
+    anchor = 0.0
+    if staleness is not None and data_sizes:
+        anchor = sum(data_sizes[b] * (1 - discounts[b]) for b in data_sizes)
+        anchor += sum(get_data_size(b) for b in previous.get("buildings", {}) if b not in data_sizes)
+        if base is None:
+            anchor = 0.0
+        elif anchor > 0:
+            try:
+                acc.add(base, anchor)
+                if exact is not None:
+                    exact.add(base, anchor)
+            except ValueError as e:
+                print(f"  [global] not mixed in — {e}")
+                anchor = 0.0
 
-    if len(models) < 2:
+    if len(data_sizes) + (anchor > 0) < 2:
         print("  Not enough models for aggregation. Need at least 2.")
-        return
+        return None
 
     # ── Step 2: Weighted average of all weights ───────────────
-    total_data = sum(data_sizes[bid] for bid in models)
-    weights    = {bid: data_sizes[bid] / total_data for bid in models}
+    total_data = sum(data_sizes.values())
+    weights    = {bid: data_sizes[bid] * discounts[bid] / acc.total for bid in data_sizes}
 
-    print(f"\n  Aggregating {len(models)} models (total rows: {total_data:,})")
-    for bid, w in weights.items():
+    print(f"\n  Aggregated {len(data_sizes)} models (total rows: {total_data:,})")
+    for bid, w in list(weights.items())[:PRINT_CLIENTS]:
         print(f"  [{bid}] weight = {w:.4f}  ({data_sizes[bid]:,} rows)")
+    if len(weights) > PRINT_CLIENTS:
+        print(f"  … and {len(weights) - PRINT_CLIENTS:,} more")
+    if anchor:
+        print(f"  [previous global] weight = {anchor / acc.total:.4f}")
+
+    global_weights = acc.result()
+    print(f"\n  Global weights computed ({len(global_weights)} weight tensors)")
+
+    compression = None
+    if updates:
+        sent  = sum(h["bytes"] for h in updates.values())
+        dense = sum(h["dense_bytes"] for h in updates.values())
+        compression = {
+            "updates":     {bid: h["codec"] for bid, h in updates.items()},
+            "bytes":       sent,
+            "dense_bytes": dense,
+            "bytes_saved": dense - sent,
+            "max_rel_error": round(max(h["rel_error"] for h in updates.values()), 8),
+        }
+        print(f"  {len(updates)} compressed updates: {sent/1024:,.0f} KB read vs "
+              f"{dense/1024:,.0f} KB dense ({1 - sent/dense:.1%} saved)")
+        if exact is not None:
+            ref  = exact.result()
+            diff = np.sqrt(sum(float(np.sum((global_weights[k].astype(np.float64) - ref[k]) ** 2)) for k in ref))
+            step = np.sqrt(sum(float(np.sum((ref[k].astype(np.float64) - (base[k] if base else 0)) ** 2)) for k in ref))
+            compression["global_rel_error"] = round(diff / step, 8) if step else 0.0
+            print(f"  Global model vs full-weight FedAvg: relative error {compression['global_rel_error']:.2e}")
+
+    # ── Step 3: Save global model once ────────────────────────
+    ref_bid = sorted(data_sizes)[0]
+    out_weights, out_model = write_global(ref_bid, global_weights)
+    print(f"\n  Global model saved → {out_model or out_weights}")
 
-    # Get layer weights from first model as template
-    ref_bid        = list(models.keys())[0]
-    ref_weights    = models[ref_bid].get_weights()
-    num_layers     = len(ref_weights)
-    global_weights = [np.zeros_like(w) for w in ref_weights]
-
-    # Weighted sum across all buildings
-    for bid, model in models.items():
-        w       = weights[bid]
-        m_weights = model.get_weights()
-        for i in range(num_layers):
-            global_weights[i] += w * m_weights[i]
-
-    print(f"\n  Global weights computed ({num_layers} weight tensors)")
-
-    # ── Step 3: Push global weights back to all buildings ─────
-    print("\n  Distributing global weights...")
-    for bid, model in models.items():
-        model.set_weights(global_weights)
-        model_path = os.path.join(MODEL_DIR, f"{bid}_model.keras")
-        model.save(model_path)
-        print(f"  [{bid}] updated → {model_path}")
-
-    # ── Step 4: Save global model separately ──────────────────
-    global_path = os.path.join(MODEL_DIR, "global_model.keras")
-    models[ref_bid].save(global_path)
-    print(f"\n  Global model saved → {global_path}")
+    # ── Step 4: Buildings reference the global model ──────────
+    # A building keeps using it until its own model file changes (local retrain);
+    # clients already on the previous global that haven't retrained move up too
+    synced = {b: st for b, st in previous.get("buildings", {}).items()
+              if b not in stamps and client_stamps(b) == st}
+    synced.update(stamps)
+    round_no = previous.get("round", 0) + 1
+    write_manifest(MODEL_DIR, {
+        "round":     round_no,
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "model":     GLOBAL_MODEL if out_model else None,
+        "weights":   GLOBAL_WEIGHTS,
+        "buildings": synced,
+    })
+    print(f"  {len(synced)} buildings now reference the global model")
 
     # ── Step 5: Log the round ─────────────────────────────────
     log = {
         "timestamp":   time.strftime("%Y-%m-%d %H:%M:%S"),
-        "buildings":   list(models.keys()),
-        "data_sizes":  {bid: data_sizes[bid] for bid in models},
-        "weights":     {bid: round(weights[bid], 6) for bid in models},
+        "round":       round_no,
+        "buildings":   list(data_sizes.keys()),
+        "data_sizes":  data_sizes,
+        "weights":     {bid: round(weights[bid], 6) for bid in data_sizes},
         "total_rows":  total_data,
+        "duration_s":  round(time.perf_counter() - start, 3),
     }
-    log_path = os.path.join(MODEL_DIR, "fedavg_log.json")
-    logs = []
-    if os.path.exists(log_path):
-        with open(log_path) as f:
-            logs = json.load(f)
-    logs.append(log)
-    with open(log_path, "w") as f:
-        json.dump(logs, f, indent=2)
-
-    print(f"\n  Round complete. Log → {log_path}")
+    ROUND_SECONDS.observe(time.perf_counter() - start)
+    if compression:
+        log["compression"]   = compression
+    if staleness is not None:
+        log["staleness"]     = {bid: staleness.get(bid, 0) for bid in data_sizes}
+        log["global_weight"] = round(anchor / acc.total, 6)
+    log.update(extra or {})
+    journal = open_journal()
+    journal.append(log)
+    print(f"\n  Round complete. Log → {journal.path}")
     print("="*55 + "\n")
-    return global_weights
+    return log
 
 
-def watch_mode(interval_seconds=86400):
-    """Run FedAvg every interval_seconds (default 24 hours)."""
-    print(f"FedAvg watch mode — running every {interval_seconds}s")
-    while True:
-        fedavg_round()
-        print(f"  Next round in {interval_seconds}s...")
-        time.sleep(interval_seconds)
+def watch_mode(min_updates=MIN_UPDATES, poll_seconds=POLL_SECONDS, max_wait=MAX_WAIT,
+               alpha=STALENESS_ALPHA, verify_updates=False, shards=None, shard_map=None, workers=None):
+    """
+    Aggregate whenever min_updates clients have new weight files since the
+    last round (or the oldest pending update has waited max_wait seconds).
+    A changed file is only used once its stamp is unchanged for one poll,
+    so a client still writing its model is never read half-way.
+    """
+    print(f"FedAvg watch mode — round on {min_updates} fresh updates "
+          f"(poll {poll_seconds}s, max wait {max_wait}s, staleness alpha {alpha})")
+    counts   = {"polls": 0, "skipped": 0, "triggered": 0, "merged": 0, "stale_merged": 0}
+    pending  = {}   # bid → (stamps, monotonic time first seen pending)
+    rejected = {}   # bid → stamps that failed to load; retried once the files change
+    try:
+        while True:
+            counts["polls"] += 1
+            manifest = load_manifest(MODEL_DIR) or {}
+            synced   = manifest.get("buildings", {})
+            now      = time.monotonic()
+
+            fresh = []
+            for bid in discover_clients():
+                st = client_stamps(bid)
+                if synced.get(bid) == st or rejected.get(bid) == st:
+                    pending.pop(bid, None)
+                    continue
+                prev = pending.get(bid)
+                pending[bid] = (st, prev[1] if prev else now)
+                if prev is not None and prev[0] == st:
+                    fresh.append(bid)
+            PENDING.set(len(pending))
+
+            # With no global model yet a round needs two clients; afterwards one
+            # fresh client can be merged into the previous global
+            least  = 1 if os.path.exists(os.path.join(MODEL_DIR, GLOBAL_WEIGHTS)) else 2
+            waited = max((now - pending[b][1] for b in fresh), default=0)
+            if len(fresh) >= max(min_updates, least):
+                reason = f"{len(fresh)} fresh updates"
+            elif len(fresh) >= least and waited >= max_wait:
+                reason = f"oldest update waited {waited:.0f}s"
+            else:
+                counts["skipped"] += 1
+                time.sleep(poll_seconds)
+                continue
+
+            current   = manifest.get("round", 0)
+            staleness = {}
+            for bid in fresh:
+                base = client_base_round(bid)
+                staleness[bid] = max(0, current - base) if base is not None else 0
+
+            counts["triggered"] += 1
+            print(f"\n  Triggered: {reason} — {', '.join(fresh)}")
+            entry = fedavg_round(fresh, staleness, alpha,
+                                 extra={"trigger": reason, "watch": dict(counts)},
+                                 verify_updates=verify_updates, shards=shards,
+                                 shard_map=shard_map, workers=workers)
+            merged = entry["buildings"] if entry else []
+            counts["merged"]       += len(merged)
+            counts["stale_merged"] += sum(1 for b in merged if staleness[b] > 0)
+            for bid in fresh:
+                if bid not in merged:
+                    rejected[bid] = pending[bid][0]
+                pending.pop(bid, None)
+            print(f"  Watch: {counts}")
+            time.sleep(poll_seconds)
+    except KeyboardInterrupt:
+        print(f"\nFedAvg watch mode stopped — {counts}")
+        return counts
+
+
+def synthetic_harness(num_clients, shards=None, workers=None, seed=0):
+    """
+    Local many-client check of the hierarchical aggregator: writes
+    num_clients random weight files (same tensors as a real client if one
+    exists, else the default architecture) to a temp dir, runs step 1 flat
+    and sharded, and checks the global weights are identical.
+    """
+    import tempfile
+    template = None
+    for bid in discover_clients():
+        try:
+            template = read_weights(bid)
+            break
+        except Exception:
+            continue
+    shapes = {k: v.shape for k, v in template.items()} if template else SYNTHETIC_SHAPES
+    rng  = np.random.default_rng(seed)
+    ids  = [f"S{i:05d}" for i in range(num_clients)]
+    sizes     = {bid: int(n) for bid, n in zip(ids, rng.integers(1_000, 60_000, num_clients))}
+    staleness = {bid: int(s) for bid, s in zip(ids, rng.integers(0, 4, num_clients))}
+
+    cwd, tmp = os.getcwd(), tempfile.mkdtemp(prefix="fedavg_synthetic_")
+    try:
+        os.chdir(tmp)
+        os.makedirs(MODEL_DIR)
+        t0 = time.perf_counter()
+        for bid in ids:
+            with h5py.File(weights_path(MODEL_DIR, bid), "w") as f:
+                for k, shape in shapes.items():
+                    f.create_dataset(k, data=rng.normal(0, 0.1, shape).astype(np.float32))
+        print(f"  Wrote {num_clients:,} synthetic clients ({len(shapes)} tensors each) "
+              f"in {time.perf_counter() - t0:.1f}s")
+
+        t0 = time.perf_counter()
+        flat = collect_clients(ids, staleness, sizes=sizes, log=_quiet)["acc"].result()
+        flat_s = time.perf_counter() - t0
+        print(f"  Flat:         {flat_s:7.2f}s")
+
+        t0 = time.perf_counter()
+        tree = collect_sharded(ids, staleness, sizes=sizes, num_shards=shards, workers=workers)["acc"].result()
+        tree_s = time.perf_counter() - t0
+        print(f"  Hierarchical: {tree_s:7.2f}s  ({flat_s / tree_s:.1f}x)")
+
+        identical = all(np.array_equal(flat[k], tree[k]) for k in flat)
+        max_diff  = max(float(np.abs(flat[k] - tree[k]).max()) for k in flat)
+        print(f"  Global weights identical: {identical}  (max abs diff {max_diff:.3g})")
+        return {"clients": num_clients, "flat_s": round(flat_s, 3), "sharded_s": round(tree_s, 3),
+                "identical": identical}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp, ignore_errors=True)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1 and sys.argv[1] == "--watch":
-        # For demo: run every 60 real seconds = every simulated day
-        watch_mode(interval_seconds=60)
+    import argparse
+    parser = argparse.ArgumentParser(description="Federated averaging of building models")
+    parser.add_argument("--watch", action="store_true", help="aggregate whenever enough clients retrain")
+    parser.add_argument("--min-updates", type=int, default=MIN_UPDATES, help="--watch: fresh updates per round")
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS, help="--watch: seconds between checks")
+    parser.add_argument("--max-wait", type=float, default=MAX_WAIT,
+                        help="--watch: aggregate fewer updates once one has waited this long")
+    parser.add_argument("--alpha", type=float, default=STALENESS_ALPHA,
+                        help="--watch: staleness discount exponent (0 = no discount)")
+    parser.add_argument("--verify-updates", action="store_true",
+                        help="also average full weights to report the error compressed updates introduce")
+    parser.add_argument("--shards", type=int, help="hierarchical aggregation over N shards (one process each)")
+    parser.add_argument("--shard-map", help="JSON {building: shard} (e.g. building type); implies hierarchical")
+    parser.add_argument("--workers", type=int, help="hierarchical: worker processes (default: cores)")
+    parser.add_argument("--synthetic", type=int, metavar="N",
+                        help="compare flat vs hierarchical aggregation on N synthetic clients and exit")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    snapshots = metrics.start_from_args(args)
+
+    shard_map = None
+    if args.shard_map:
+        with open(args.shard_map) as f:
+            shard_map = json.load(f)
+
+    if args.synthetic:
+        synthetic_harness(args.synthetic, args.shards, args.workers)
+    elif args.watch:
+        watch_mode(args.min_updates, args.poll, args.max_wait, args.alpha, args.verify_updates,
+                   args.shards, shard_map, args.workers)
     else:
-        fedavg_round()
\ No newline at end of file
+        fedavg_round(verify_updates=args.verify_updates, shards=args.shards,
+                     shard_map=shard_map, workers=args.workers)
+
+    if snapshots is not None:
+        snapshots.close()
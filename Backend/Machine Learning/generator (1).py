@@ -1,23 +1,44 @@
 """
 generator.py — 5 Buildings
 ────────────────────────────
-Every 1s = 1 simulated minute.
+Every 1s = 1 simulated minute (scale with --speed 60 / 1000 / max).
 
-5 buildings run in parallel threads.
+One SimClock drives all buildings on absolute deadlines, so every building
+shares the same sim_minute and I/O latency never causes drift.
 Each building has its own solar, battery, consumption profile, spike state.
-All buildings tick at the same real-time pace.
-All POST to the same server identified by building_id.
+(--legacy-threads runs the old one-thread-per-building loop.)
+All POST to the same server identified by building_id — through a shared
+TelemetryPublisher (publisher.py), so a slow server never stalls a building.
 
 DEFICIT: battery hits 0 and total_drained > solar_gained
 SURPLUS: otherwise
 
 SPIKE: appliance event (AC, washing machine, etc.)
-"""
 
-import math, random, time, requests, threading, csv, os
+FLEET: FleetSimulator advances thousands of buildings per tick in NumPy.
+  python generator.py --compare-fleet 30 --seed 0   (scalar vs fleet stats)
+
+BACKFILL: offline fast-forward — no sleeping, no network, same CSV schema.
+  python generator.py --backfill 120 --buildings B1,B2 --seed 7
+
+STORE: --store DIR writes group-committed columnar segments (telemetry_store.py)
+instead of flushed CSV rows.
+
+REPLAY: load driver for the backend /update route — replays data/*.csv rows
+(or synthetic ticks) as many virtual buildings at a target rate.
+  python generator.py --replay --url http://127.0.0.1:5000/update --rate 2000 \
+                      --virtual 500 --connections 16 --duration 30
+
+METRICS: tick latency, CSV write time and per-URL POST latency/failures go to
+metrics.py (--metrics-port 9101 / --metrics-file gen.json); per-building
+console lines are rate-limited to one per --log-every seconds.
+"""
 
-# Track which servers are currently unreachable (suppress repeated errors)
-_server_down = set()
+import math, random, time, threading, csv, os, json
+import numpy as np
+from publisher import TelemetryPublisher
+from telemetry_store import TelemetryStore, COLUMNS
+import metrics
 
 
 # List of servers to update simultaneously (Prod + Local)
@@ -27,6 +48,16 @@ SERVER_URLS = [
 ]
 DATA_DIR   = "data"   # each building writes its own CSV here
 
+CSV_HEADER = list(COLUMNS)   # sim_minute … is_deficit (shared with telemetry_store)
+
+# ── Metrics (see metrics.py) ─────────────────────────────────
+TICK_SECONDS  = metrics.histogram("generator_tick_seconds", "Work per tick, excluding sleep (path=building|fleet)")
+CSV_SECONDS   = metrics.histogram("generator_csv_write_seconds", "Time appending one tick's telemetry rows")
+TICKS         = metrics.counter("generator_building_ticks_total", "Building-minutes simulated")
+CLOCK_LAG     = metrics.gauge("generator_clock_lag_seconds", "Scheduler lag behind its deadline")
+MISSED_TICKS  = metrics.gauge("generator_missed_ticks", "Scheduler ticks that ran later than one period")
+LOG = metrics.RateLimitedLog()   # per-building tick lines; --log-every sets the interval
+
 # Solar panel efficiency factor (accounts for panel losses, inverter, heat, angle)
 # Real-world: 15kW system generates ~63 kWh/day, not raw 15kW * 12hrs = 180 kWh
 SOLAR_EFF  = 0.6
@@ -47,34 +78,391 @@ PROFILES = {
 # ─────────────────────────────────────────────────────────────
 
 
-def solar_kw(hour, peak_solar):
+def solar_kw(hour, peak_solar, rng=random):
     """Solar output in kW at this hour — with 0.6 efficiency factor (real-world losses)."""
     if hour < 6 or hour > 18: return 0.0
-    return max(0.0, round(peak_solar * SOLAR_EFF * math.sin(math.pi*(hour-6)/12) + random.gauss(0, 0.15), 3))
+    return max(0.0, round(peak_solar * SOLAR_EFF * math.sin(math.pi*(hour-6)/12) + rng.gauss(0, 0.15), 3))
 
 
-def base_consumption_kwh(hour, base_mult):
-    """Normal per-minute usage — boosted during rush hours, scaled by building type."""
-    if 7 <= hour < 9:            base = 0.040   # morning rush — kettle, shower, toaster
-    elif 18 <= hour < 22:        base = 0.050   # evening rush  — cooking, AC, washing
-    elif hour >= 22 or hour < 6: base = 0.012   # night         — standby only
-    else:                        base = 0.022   # daytime       — moderate
-    base *= base_mult
-    return max(0.001, round(base + random.gauss(0, 0.002), 4))
+def base_rate(hour):
+    """Un-scaled per-minute usage for this hour (before base_mult and noise)."""
+    if 7 <= hour < 9:            return 0.040   # morning rush — kettle, shower, toaster
+    elif 18 <= hour < 22:        return 0.050   # evening rush  — cooking, AC, washing
+    elif hour >= 22 or hour < 6: return 0.012   # night         — standby only
+    else:                        return 0.022   # daytime       — moderate
 
 
-def run_building(building_id, profile):
+def base_consumption_kwh(hour, base_mult, rng=random):
+    """Normal per-minute usage — boosted during rush hours, scaled by building type."""
+    base = base_rate(hour) * base_mult
+    return max(0.001, round(base + rng.gauss(0, 0.002), 4))
+
+
+def spike_chance(hour):
+    """Per-minute probability of a new appliance event at this hour."""
+    # Realistic: 0.1-0.3% per minute → 2-5 appliance events per day
+    # Rush hours get higher spike chance — more appliances firing simultaneously
+    if 7 <= hour < 9:       return 0.005   # morning rush  — kettle, toaster, shower pump
+    elif 8 <= hour < 18:    return 0.002   # daytime       — AC, dishwasher
+    elif 18 <= hour < 22:   return 0.006   # evening rush  — cooking, laundry, AC (peak)
+    elif 6 <= hour < 7:     return 0.001   # early morning — occasional
+    else:                   return 0.0005  # night         — very rare
+
+
+def new_building_state(profile, sim_minute=0, battery=None):
+    """Mutable per-building state for the scalar path (see step_building)."""
+    return {
+        "battery":            profile["battery_start"] if battery is None else battery,
+        "spike_kwh_per_min":  0.0,
+        "spike_minutes_left": 0,
+        "sim_minute":         sim_minute,
+    }
+
+
+def step_building(state, profile, rng=random):
+    """
+    Advance one building by one simulated minute (scalar reference path).
+    Mutates state in place and returns this minute's tick as a dict.
+    """
+    sim_minute = state["sim_minute"]
+    hour  = (sim_minute % 1440) / 60.0
+    solar = solar_kw(hour, profile["peak_solar"], rng)
+    base  = base_consumption_kwh(hour, profile["base_mult"], rng)
+
+    # ── New spike event? ──────────────────────────────────────
+    spike_started = False
+    if state["spike_minutes_left"] == 0 and rng.random() < spike_chance(hour):
+        state["spike_kwh_per_min"]  = round(rng.uniform(0.033, 0.083), 4)  # 2–5 kW realistic appliance
+        state["spike_minutes_left"] = rng.randint(20, 90)                   # real cycle: 20–90 mins
+        spike_started = True
+
+    # ── Current spike drain ───────────────────────────────────
+    spike_ended    = False
+    spike_this_min = state["spike_kwh_per_min"] if state["spike_minutes_left"] > 0 else 0.0
+    if state["spike_minutes_left"] > 0:
+        state["spike_minutes_left"] -= 1
+        spike_ended = state["spike_minutes_left"] == 0
+
+    # ── Battery update ────────────────────────────────────────
+    solar_gained   = round(solar / 60.0, 6)
+    total_drained  = round(base + spike_this_min, 6)
+    battery_before = state["battery"]
+
+    battery = battery_before + solar_gained - base - spike_this_min
+    battery = max(0.0, min(profile["battery_cap"], round(battery, 4)))
+    state["battery"] = battery
+
+    is_deficit = (battery == 0.0 and total_drained > solar_gained)
+    state["sim_minute"] = sim_minute + 1
+
+    return {
+        "sim_minute":      sim_minute,
+        "hour":            hour,
+        "solar":           solar,
+        "base":            base,
+        "spike":           spike_this_min,
+        "solar_gained":    solar_gained,
+        "total_drained":   total_drained,
+        "battery_before":  battery_before,
+        "battery":         battery,
+        "is_deficit":      is_deficit,
+        "spike_mins_left": state["spike_minutes_left"],
+        "spike_started":   spike_started,
+        "spike_ended":     spike_ended,
+    }
+
+
+# ── Vectorized fleet engine ──────────────────────────────────
+# All buildings share one sim_minute, so hour-of-day terms (solar curve,
+# rush-hour base rate, spike chance) are scalars broadcast over the fleet;
+# only the noise draws and per-building state are arrays.
+
+def fleet_profiles(num_buildings):
+    """Synthetic campus of num_buildings, cycling through the PROFILES templates."""
+    templates = list(PROFILES.values())
+    width = max(3, len(str(num_buildings)))
+    return {f"F{i:0{width}d}": templates[i % len(templates)] for i in range(num_buildings)}
+
+
+class FleetSimulator:
+    """
+    Holds battery, spike countdown and spike drain for every building in
+    NumPy arrays and advances the whole fleet in one vectorized tick.
+
+    seed=None draws fresh entropy; any int gives a reproducible run.
+    """
+
+    def __init__(self, profiles, seed=None, sim_minute=0, battery=None):
+        self.building_ids = list(profiles)
+        self.profiles     = profiles
+        self.rng          = np.random.default_rng(seed)
+
+        def col(key, dtype=np.float64):
+            return np.array([profiles[b][key] for b in self.building_ids], dtype=dtype)
+
+        self.peak_solar  = col("peak_solar")
+        self.battery_cap = col("battery_cap")
+        self.base_mult   = col("base_mult")
+        self.btypes      = [profiles[b]["btype"] for b in self.building_ids]
+
+        self.battery = col("battery_start") if battery is None else np.array(battery, dtype=np.float64)
+        self.spike_kwh_per_min  = np.zeros(len(self.building_ids))
+        self.spike_minutes_left = np.zeros(len(self.building_ids), dtype=np.int64)
+        self.sim_minute = sim_minute
+
+    def __len__(self):
+        return len(self.building_ids)
+
+    def tick(self):
+        """Advance every building by one simulated minute; returns a dict of arrays."""
+        n    = len(self.building_ids)
+        rng  = self.rng
+        hour = (self.sim_minute % 1440) / 60.0
+
+        # ── Solar + base consumption (same curves as the scalar path) ──
+        if hour < 6 or hour > 18:
+            solar = np.zeros(n)
+        else:
+            curve = SOLAR_EFF * math.sin(math.pi*(hour-6)/12)
+            solar = np.maximum(0.0, (self.peak_solar * curve + rng.normal(0, 0.15, n)).round(3))
+        base = np.maximum(0.001, (base_rate(hour) * self.base_mult + rng.normal(0, 0.002, n)).round(4))
+
+        # ── New spike events (only idle buildings can start one) ──
+        idle    = self.spike_minutes_left == 0
+        started = idle & (rng.random(n) < spike_chance(hour))
+        k = int(started.sum())
+        if k:
+            self.spike_kwh_per_min[started]  = rng.uniform(0.033, 0.083, k).round(4)
+            self.spike_minutes_left[started] = rng.integers(20, 91, k)
+
+        # ── Current spike drain ───────────────────────────────────
+        active = self.spike_minutes_left > 0
+        spike  = np.where(active, self.spike_kwh_per_min, 0.0)
+        self.spike_minutes_left[active] -= 1
+        ended  = active & (self.spike_minutes_left == 0)
+
+        # ── Battery update ────────────────────────────────────────
+        solar_gained   = (solar / 60.0).round(6)
+        total_drained  = (base + spike).round(6)
+        battery_before = self.battery
+
+        battery = battery_before + solar_gained - base - spike
+        battery = np.minimum(self.battery_cap, np.maximum(0.0, battery.round(4)))
+        self.battery = battery
+
+        is_deficit = (battery == 0.0) & (total_drained > solar_gained)
+
+        tick = {
+            "sim_minute":      self.sim_minute,
+            "hour":            hour,
+            "solar":           solar,
+            "base":            base,
+            "spike":           spike,
+            "solar_gained":    solar_gained,
+            "total_drained":   total_drained,
+            "battery_before":  battery_before,
+            "battery":         battery,
+            "is_deficit":      is_deficit,
+            "spike_mins_left": self.spike_minutes_left.copy(),
+            "spike_started":   started,
+            "spike_ended":     ended,
+        }
+        self.sim_minute += 1
+        return tick
+
+
+def compare_scalar_fleet(days=30, seed=0):
+    """
+    Run the scalar path and FleetSimulator side by side over the same
+    PROFILES and print per-building summary stats. The two use different
+    RNG streams, so agreement is statistical, not row-for-row.
+    """
+    minutes = int(days * 1440)
+    fields  = ("solar_gained", "total_drained", "battery", "is_deficit")
+
+    scalar = {}
+    for i, (bid, profile) in enumerate(PROFILES.items()):
+        rng, state = random.Random(seed + i), new_building_state(profile)
+        sums, spikes = dict.fromkeys(fields, 0.0), 0
+        for _ in range(minutes):
+            t = step_building(state, profile, rng)
+            for f in fields: sums[f] += t[f]
+            spikes += t["spike_started"]
+        scalar[bid] = {**{f: v / minutes for f, v in sums.items()}, "spikes/day": spikes / days}
+
+    fleet = FleetSimulator(PROFILES, seed=seed)
+    sums, spikes = {f: np.zeros(len(fleet)) for f in fields}, np.zeros(len(fleet))
+    for _ in range(minutes):
+        t = fleet.tick()
+        for f in fields: sums[f] += t[f]
+        spikes += t["spike_started"]
+
+    print(f"Scalar vs fleet — {days} simulated days, seed={seed}\n")
+    print(f"  {'':4s} {'':7s} {'solar/min':>10s} {'drain/min':>10s} {'battery':>8s} {'deficit%':>9s} {'spikes/day':>11s}")
+    for j, bid in enumerate(fleet.building_ids):
+        f_row = {**{f: sums[f][j] / minutes for f in fields}, "spikes/day": spikes[j] / days}
+        for label, row in (("scalar", scalar[bid]), ("fleet", f_row)):
+            print(f"  {bid:4s} {label:7s} {row['solar_gained']:10.5f} {row['total_drained']:10.5f} "
+                  f"{row['battery']:8.3f} {row['is_deficit']*100:8.2f}% {row['spikes/day']:11.2f}")
+
+
+# ── Telemetry sinks (CSV or columnar store) ──────────────────
+
+def read_last_row(csv_path):
+    """Last data row of a building CSV as a dict, or None if empty/missing."""
+    if not os.path.isfile(csv_path):
+        return None
+    with open(csv_path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos, tail = f.tell(), b""
+        while pos > 0 and tail.count(b"\n") < 2:
+            step = min(4096, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+    lines = [l for l in tail.decode().splitlines() if l.strip()]
+    if not lines or lines[-1].startswith("sim_minute"):
+        return None
+    return dict(zip(CSV_HEADER, next(csv.reader([lines[-1]]))))
+
+
+class CsvSink:
+    """Appends rows to data_dir/<id>.csv — the original format."""
+
+    def __init__(self, building_id, data_dir=DATA_DIR, fresh=False):
+        os.makedirs(data_dir, exist_ok=True)
+        self.path = os.path.join(data_dir, f"{building_id}.csv")
+        fresh = fresh or not os.path.isfile(self.path) or os.path.getsize(self.path) == 0
+        self.file   = open(self.path, "w" if fresh else "a", newline="")
+        self.writer = csv.writer(self.file)
+        if fresh:
+            self.writer.writerow(CSV_HEADER)
+
+    def last_row(self):
+        return read_last_row(self.path)
+
+    def write_row(self, row):
+        self.writer.writerow(row)
+
+    def write_columns(self, cols):
+        self.writer.writerows(zip(*(cols[c].tolist() if hasattr(cols[c], "tolist") else cols[c]
+                                    for c in CSV_HEADER)))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class StoreSink:
+    """Group-committed appends into a TelemetryStore (see telemetry_store.py)."""
+
+    def __init__(self, building_id, store, fresh=False, commit_rows=1440):
+        if fresh:
+            store.drop(building_id)
+        self.store, self.building_id = store, building_id
+        self.writer = store.writer(building_id, commit_rows=commit_rows)
+
+    def last_row(self):
+        if not self.store.num_rows(self.building_id):
+            return None
+        tail = self.store.tail(self.building_id, 1)
+        return {c: v[0].item() for c, v in tail.items()}
+
+    def write_row(self, row):
+        self.writer.append(row)
+
+    def write_columns(self, cols):
+        self.writer.append_columns(cols)
+
+    def flush(self):
+        self.writer.commit()
+
+    def close(self):
+        self.writer.close()
+
+
+def open_sink(building_id, data_dir=DATA_DIR, store=None, fresh=False):
+    return StoreSink(building_id, store, fresh) if store is not None else \
+           CsvSink(building_id, data_dir, fresh)
+
+
+# ── Offline backfill ─────────────────────────────────────────
+
+def backfill(building_ids, minutes, seed=0, data_dir=DATA_DIR, resume=True, chunk_minutes=1440, store=None):
+    """
+    Fast-forward building_ids by `minutes` simulated minutes and append the
+    rows to data_dir/<id>.csv in the exact schema run_building writes
+    (or into `store`, a TelemetryStore, when given).
+
+    With resume=True each building continues from its last sim_minute and
+    battery level (spike state is not persisted, so resumed buildings start
+    idle). resume=False truncates and starts from PROFILES defaults.
+    Buildings not in PROFILES reuse the templates in order (see fleet_profiles).
+    """
+    templates = list(PROFILES.values())
+
+    # Buildings resuming from the same sim_minute share one FleetSimulator
+    groups = {}
+    for i, bid in enumerate(building_ids):
+        profile = PROFILES.get(bid) or templates[i % len(templates)]
+        sink = open_sink(bid, data_dir, store, fresh=not resume)
+        last = sink.last_row()
+        start, battery = (0, profile["battery_start"]) if last is None else \
+                         (int(last["sim_minute"]) + 1, float(last["battery_level_kwh"]))
+        groups.setdefault(start, []).append((bid, profile, battery, sink))
+
+    t0 = time.perf_counter()
+    total_rows = 0
+    for start, members in sorted(groups.items()):
+        sim = FleetSimulator({bid: p for bid, p, _, _ in members},
+                             seed=[seed, start], sim_minute=start,
+                             battery=[b for _, _, b, _ in members])
+        sinks = [sink for _, _, _, sink in members]
+        try:
+            done = 0
+            while done < minutes:
+                n = min(chunk_minutes, minutes - done)
+                ticks = [sim.tick() for _ in range(n)]
+                hours = [t["hour"] for t in ticks]
+                shared = {
+                    "sim_minute":  [t["sim_minute"] for t in ticks],
+                    "hour_of_day": [round(h, 4) for h in hours],
+                    "time_sin":    [round(math.sin(2 * math.pi * h / 24), 6) for h in hours],
+                    "time_cos":    [round(math.cos(2 * math.pi * h / 24), 6) for h in hours],
+                }
+                gained  = np.stack([t["solar_gained"] for t in ticks])
+                drained = np.stack([t["total_drained"] for t in ticks])
+                battery = np.stack([t["battery"] for t in ticks])
+                deficit = np.stack([t["is_deficit"] for t in ticks]).astype(np.int64)
+                net     = (gained - drained).round(6)
+
+                for j, sink in enumerate(sinks):
+                    sink.write_columns({**shared,
+                                        "solar_output_kw":   gained[:, j],
+                                        "consumption_kw":    drained[:, j],
+                                        "battery_level_kwh": battery[:, j],
+                                        "net_flow_kw":       net[:, j],
+                                        "is_deficit":        deficit[:, j]})
+                done += n
+            total_rows += minutes * len(members)
+        finally:
+            for sink in sinks:
+                sink.close()
+
+    elapsed = time.perf_counter() - t0
+    print(f"Backfilled {len(building_ids)} buildings × {minutes:,} min = {total_rows:,} rows "
+          f"in {elapsed:.1f}s → {store.root if store is not None else data_dir}/")
+    return total_rows
+
+
+def run_building(building_id, profile, publisher):
     """One building running forever — mirrors your exact single-building logic."""
     try:
         BATTERY_CAPACITY = profile["battery_cap"]
-        battery          = profile["battery_start"]
-        peak_solar       = profile["peak_solar"]
-        base_mult        = profile["base_mult"]
         btype            = profile["btype"]
-
-        spike_kwh_per_min  = 0.0
-        spike_minutes_left = 0
-        sim_minute         = 0
+        state            = new_building_state(profile)
 
         # ── CSV logger — one file per building ───────────────────
         # Columns match exactly what the LSTM will need:
@@ -91,58 +479,30 @@ def run_building(building_id, profile):
         writer = csv.writer(csv_file)
 
         if not file_exists:
-            writer.writerow([
-            "sim_minute", "hour_of_day",
-            "solar_output_kw", "consumption_kw", "battery_level_kwh",
-            "net_flow_kw", "time_sin", "time_cos",
-            "is_deficit"
-        ])
+            writer.writerow(CSV_HEADER)
 
 
         # ─────────────────────────────────────────────────────────
 
         while True:
-            hour  = (sim_minute % 1440) / 60.0
-            solar = solar_kw(hour, peak_solar)
-            base  = base_consumption_kwh(hour, base_mult)
-
-            # ── Spike probability varies by time of day ──────────
-            # Realistic: 0.1-0.3% per minute → 2-5 appliance events per day
-            # Rush hours get higher spike chance — more appliances firing simultaneously
-            if 7 <= hour < 9:       spike_chance = 0.005   # morning rush  — kettle, toaster, shower pump
-            elif 8 <= hour < 18:    spike_chance = 0.002   # daytime       — AC, dishwasher
-            elif 18 <= hour < 22:   spike_chance = 0.006   # evening rush  — cooking, laundry, AC (peak)
-            elif 6 <= hour < 7:     spike_chance = 0.001   # early morning — occasional
-            else:                   spike_chance = 0.0005  # night         — very rare
-
-            # ── New spike event? ──────────────────────────────────
-            if spike_minutes_left == 0 and random.random() < spike_chance:
-                spike_kwh_per_min  = round(random.uniform(0.033, 0.083), 4)  # 2–5 kW realistic appliance
-                spike_minutes_left = random.randint(20, 90)                   # real cycle: 20–90 mins
-                print(f"\n  [{building_id}] ⚡ APPLIANCE ON  — drains {spike_kwh_per_min} kWh/min ({spike_kwh_per_min*60:.1f}kW)  for {spike_minutes_left} simulated minutes\n")
-
-            # ── Current spike drain ───────────────────────────────
-            spike_this_min = spike_kwh_per_min if spike_minutes_left > 0 else 0.0
-            if spike_minutes_left > 0:
-                spike_minutes_left -= 1
-                if spike_minutes_left == 0:
-                    print(f"\n  [{building_id}] ✅ APPLIANCE OFF — event ended\n")
-
-            # ── Battery update ────────────────────────────────────
-            solar_gained   = round(solar / 60.0, 6)
-            total_drained  = round(base + spike_this_min, 6)
-            battery_before = battery
-
-            battery = battery + solar_gained - base - spike_this_min
-            battery = max(0.0, min(BATTERY_CAPACITY, round(battery, 4)))
-
-            is_deficit = (battery == 0.0 and total_drained > solar_gained)
+            tick_start = time.perf_counter()
+            tick = step_building(state, profile)
+            sim_minute, hour, solar, base = tick["sim_minute"], tick["hour"], tick["solar"], tick["base"]
+            spike_this_min, spike_minutes_left = tick["spike"], tick["spike_mins_left"]
+            solar_gained, total_drained = tick["solar_gained"], tick["total_drained"]
+            battery_before, battery, is_deficit = tick["battery_before"], tick["battery"], tick["is_deficit"]
+
+            if tick["spike_started"]:
+                print(f"\n  [{building_id}] ⚡ APPLIANCE ON  — drains {state['spike_kwh_per_min']} kWh/min ({state['spike_kwh_per_min']*60:.1f}kW)  for {spike_minutes_left + 1} simulated minutes\n")
+            if tick["spike_ended"]:
+                print(f"\n  [{building_id}] ✅ APPLIANCE OFF — event ended\n")
 
             # ── Log to CSV ────────────────────────────────────────
             # time_sin/cos encodes hour cyclically so LSTM sees 23:59 ≈ 00:00
             time_sin = round(math.sin(2 * math.pi * hour / 24), 6)
             time_cos = round(math.cos(2 * math.pi * hour / 24), 6)
             net_flow = round(solar_gained - total_drained, 6)   # + surplus / - deficit
+            csv_start = time.perf_counter()
             writer.writerow([
                 sim_minute, round(hour, 4),
                 solar_gained, round(total_drained, 6), battery,
@@ -150,14 +510,15 @@ def run_building(building_id, profile):
                 int(is_deficit)
             ])
             csv_file.flush()   # write immediately so data is readable while running
+            CSV_SECONDS.observe(time.perf_counter() - csv_start)
             # ─────────────────────────────────────────────────────
 
-            # ── Print ─────────────────────────────────────────────
+            # ── Print (rate-limited per building) ─────────────────
             if spike_this_min > 0:
-                print(f"  [{building_id}] min={sim_minute:5}  hr={hour:5.2f}  solar={solar_gained:.4f}  base={base:.4f}  spike={spike_this_min:.3f}  total={total_drained:.4f}  bat:{battery_before}→{battery}  [left={spike_minutes_left}]")
+                LOG(building_id, f"  [{building_id}] min={sim_minute:5}  hr={hour:5.2f}  solar={solar_gained:.4f}  base={base:.4f}  spike={spike_this_min:.3f}  total={total_drained:.4f}  bat:{battery_before}→{battery}  [left={spike_minutes_left}]")
             else:
                 status = "DEFICIT" if is_deficit else "SURPLUS"
-                print(f"  [{building_id}] min={sim_minute:5}  hr={hour:5.2f}  solar={solar_gained:.4f}kWh  base={base:.4f}kWh  bat={battery:6.4f}  {status}")
+                LOG(building_id, f"  [{building_id}] min={sim_minute:5}  hr={hour:5.2f}  solar={solar_gained:.4f}kWh  base={base:.4f}kWh  bat={battery:6.4f}  {status}")
 
             # ── Send to server ────────────────────────────────────
             payload = {
@@ -176,21 +537,11 @@ def run_building(building_id, profile):
                 "spike_mins_left":   spike_minutes_left,
             }
 
-            # Broadcast to all configured servers
-            for url in SERVER_URLS:
-                try:
-                    requests.post(url, json=payload, timeout=1)
-                    # If previously down, log recovery
-                    if url in _server_down:
-                        _server_down.discard(url)
-                        print(f"  [{building_id}] ✅ Reconnected to {url}")
-                except Exception:
-                    # Only print once when server first becomes unreachable
-                    if url not in _server_down:
-                        _server_down.add(url)
-                        print(f"  [{building_id}] ⚠ Server unreachable: {url} (suppressing further errors)")
-
-            sim_minute += 1
+            # Queued for all configured servers — never blocks on the network
+            publisher.publish(payload)
+            TICK_SECONDS.observe(time.perf_counter() - tick_start, path="building")
+            TICKS.inc()
+
             # Reduced sleep to compensate for network latency (Local: ~0.15s, Remote: ~300ms latency + sleep)
             time.sleep(0.085) 
     except Exception as e:
@@ -199,13 +550,344 @@ def run_building(building_id, profile):
         traceback.print_exc()
 
 
-# ── Launch all 5 buildings in parallel ───────────────────────
-if __name__ == "__main__":
+# ── Central scheduler ────────────────────────────────────────
+
+class SimClock:
+    """
+    Ticks on absolute deadlines: tick k is due at start + k * period, so
+    time spent in I/O never accumulates as drift. speed is simulated
+    minutes per real second (1 = the classic "1s = 1 simulated minute");
+    speed=None runs as fast as possible.
+
+    If the machine falls behind, ticks run back-to-back until caught up
+    (no sim minutes are skipped) and each late tick counts as missed.
+    """
+
+    def __init__(self, speed=1.0):
+        self.period  = None if not speed else 1.0 / speed
+        self.start   = time.perf_counter()
+        self.ticks   = 0
+        self.missed  = 0
+        self.lag     = 0.0   # seconds behind the current deadline
+        self.max_lag = 0.0
+
+    def wait(self):
+        """Block until the next tick is due; returns the current lag in seconds."""
+        if self.period is None:
+            self.ticks += 1
+            return 0.0
+        deadline = self.start + self.ticks * self.period
+        now = time.perf_counter()
+        if now < deadline:
+            time.sleep(deadline - now)
+            self.lag = 0.0
+        else:
+            self.lag = now - deadline
+            if self.lag > self.period:
+                self.missed += 1
+            self.max_lag = max(self.max_lag, self.lag)
+        self.ticks += 1
+        return self.lag
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start
+        return {
+            "ticks":         self.ticks,
+            "elapsed_s":     round(elapsed, 3),
+            "rate_per_s":    round(self.ticks / elapsed, 1) if elapsed > 0 else 0.0,
+            "target_per_s":  None if self.period is None else round(1.0 / self.period, 1),
+            "lag_s":         round(self.lag, 4),
+            "max_lag_s":     round(self.max_lag, 4),
+            "missed":        self.missed,
+        }
+
+
+def fleet_payloads(sim, tick):
+    """Per-building /update payloads for one FleetSimulator tick (same shape as run_building)."""
+    hour = round(tick["hour"], 4)
+    return [
+        {
+            "building_id":       bid,
+            "building_type":     btype,
+            "sim_minute":        tick["sim_minute"],
+            "hour_of_day":       hour,
+            "solar_kw":          solar,
+            "base_kwh":          base,
+            "spike_kwh":         spike,
+            "total_drained_kwh": drained,
+            "battery_kwh":       battery,
+            "battery_cap":       cap,
+            "is_deficit":        deficit,
+            "spike_active":      left > 0,
+            "spike_mins_left":   left,
+        }
+        for bid, btype, solar, base, spike, drained, battery, cap, deficit, left in zip(
+            sim.building_ids, sim.btypes,
+            tick["solar"].tolist(), tick["base"].tolist(), tick["spike"].tolist(),
+            tick["total_drained"].tolist(), tick["battery"].tolist(), sim.battery_cap.tolist(),
+            tick["is_deficit"].tolist(), tick["spike_mins_left"].tolist(),
+        )
+    ]
+
+
+def run_scheduler(profiles, speed=1.0, seed=None, publisher=None, data_dir=DATA_DIR,
+                  write_csv=True, max_minutes=None, report_every=10.0, store=None):
+    """
+    Drive every building from one SimClock so they all share the same
+    sim_minute. Each tick: advance FleetSimulator, append telemetry rows
+    (CSV, or `store` when given), queue payloads on the publisher.
+    Lag / missed deadlines are printed every report_every real seconds
+    and returned at the end.
+    """
+    sim   = FleetSimulator(profiles, seed=seed)
+    clock = SimClock(speed)
+    sinks = [open_sink(bid, data_dir, store) for bid in sim.building_ids] if write_csv else []
+
+    verbose     = len(sim) <= len(PROFILES) and speed is not None and speed <= 1
+    next_report = time.perf_counter() + report_every
+    try:
+        while max_minutes is None or clock.ticks < max_minutes:
+            CLOCK_LAG.set(clock.wait())
+            tick_start = time.perf_counter()
+            tick = sim.tick()
+            hour = tick["hour"]
+
+            if sinks:
+                csv_start = time.perf_counter()
+                hour_r   = round(hour, 4)
+                time_sin = round(math.sin(2 * math.pi * hour / 24), 6)
+                time_cos = round(math.cos(2 * math.pi * hour / 24), 6)
+                net      = (tick["solar_gained"] - tick["total_drained"]).round(6).tolist()
+                for sink, g, d, b, n, dfc in zip(sinks, tick["solar_gained"].tolist(),
+                                                 tick["total_drained"].tolist(), tick["battery"].tolist(),
+                                                 net, tick["is_deficit"].tolist()):
+                    sink.write_row([tick["sim_minute"], hour_r, g, d, b, n, time_sin, time_cos, int(dfc)])
+                CSV_SECONDS.observe(time.perf_counter() - csv_start)
+
+            if publisher is not None:
+                publisher.publish_many(fleet_payloads(sim, tick))
+
+            if verbose:
+                for j, bid in enumerate(sim.building_ids):
+                    status = "DEFICIT" if tick["is_deficit"][j] else "SURPLUS"
+                    LOG(bid, f"  [{bid}] min={tick['sim_minute']:5}  hr={hour:5.2f}  solar={tick['solar_gained'][j]:.4f}kWh  "
+                          f"base={tick['base'][j]:.4f}kWh  spike={tick['spike'][j]:.3f}  bat={tick['battery'][j]:6.4f}  {status}")
+
+            now = time.perf_counter()
+            TICK_SECONDS.observe(now - tick_start, path="fleet")
+            TICKS.inc(len(sim))
+            MISSED_TICKS.set(clock.missed)
+            if now >= next_report:
+                for sink in sinks:
+                    sink.flush()   # readable while running, without a flush per row
+                r = clock.report()
+                print(f"  [clock] min={tick['sim_minute']}  rate={r['rate_per_s']}/s (target {r['target_per_s']})  "
+                      f"lag={r['lag_s']}s  max_lag={r['max_lag_s']}s  missed={r['missed']}")
+                next_report = now + report_every
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for sink in sinks:
+            sink.close()
+    return clock.report()
+
+
+# ── Replay load driver ───────────────────────────────────────
+# Pushes /update posts at a target rate to find where the backend falls
+# behind. Rows come from the building CSVs (or FleetSimulator ticks) and
+# are sent in the payload shape run_building uses. CSV rows carry no
+# spike state, so replayed ticks report spike_kwh=0 / spike_active=False.
+
+REPLAY_SECONDS = metrics.histogram("replay_post_seconds", "Load driver POST round-trip latency")
+REPLAY_POSTS   = metrics.counter("replay_posts_total", "Load driver POSTs by outcome (ok / http_<code> / error)")
+
+
+def _replay_sources(data_dir):
+    """[(building_id, profile, columns)] from data_dir/*.csv — columns as Python lists."""
+    sources = []
+    templates = list(PROFILES.values())
+    names = sorted(f for f in os.listdir(data_dir) if f.endswith(".csv")) if os.path.isdir(data_dir) else []
+    for i, name in enumerate(names):
+        path = os.path.join(data_dir, name)
+        with open(path) as f:
+            header = f.readline().strip().split(",")
+        if not set(CSV_HEADER) <= set(header):
+            continue
+        data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2,
+                          usecols=[header.index(c) for c in CSV_HEADER])
+        if not len(data):
+            continue
+        bid = name[:-4]
+        sources.append((bid, PROFILES.get(bid) or templates[i % len(templates)],
+                        {c: data[:, j].tolist() for j, c in enumerate(CSV_HEADER)}))
+    return sources
+
+
+class ReplayStream:
+    """
+    Thread-safe source of /update payloads for `virtual` buildings, round
+    robin. CSV mode: virtual building v replays source v % len(sources)
+    starting at a per-building row offset and wrapping around (sim_minute
+    keeps increasing). Synthetic mode (sources=None): FleetSimulator ticks.
+    """
+
+    def __init__(self, virtual, sources=None, seed=0):
+        self.lock, self.k = threading.Lock(), 0
+        self.virtual, self.sources = virtual, sources
+        self.pending = []
+        if sources:
+            width = max(3, len(str(virtual)))
+            self.ids = [f"{sources[v % len(sources)][0]}-v{v:0{width}d}" if virtual > len(sources)
+                        else sources[v][0] for v in range(virtual)]
+            self.offsets = [(v // len(sources)) * 997 % len(sources[v % len(sources)][2]["sim_minute"])
+                            for v in range(virtual)]
+        else:
+            self.sim = FleetSimulator(fleet_profiles(virtual), seed=seed)
+
+    def _csv_payload(self, v, step):
+        bid, profile, cols = self.sources[v % len(self.sources)]
+        n   = len(cols["sim_minute"])
+        pos = self.offsets[v] + step
+        r   = pos % n
+        drained = cols["consumption_kw"][r]
+        return {
+            "building_id":       self.ids[v],
+            "building_type":     profile["btype"],
+            "sim_minute":        int(cols["sim_minute"][r] + (pos // n) * (cols["sim_minute"][-1] + 1)),
+            "hour_of_day":       cols["hour_of_day"][r],
+            "solar_kw":          round(cols["solar_output_kw"][r] * 60, 3),
+            "base_kwh":          drained,
+            "spike_kwh":         0.0,
+            "total_drained_kwh": drained,
+            "battery_kwh":       cols["battery_level_kwh"][r],
+            "battery_cap":       profile["battery_cap"],
+            "is_deficit":        bool(cols["is_deficit"][r]),
+            "spike_active":      False,
+            "spike_mins_left":   0,
+        }
+
+    def take(self, n):
+        """The next n payloads."""
+        with self.lock:
+            if self.sources:
+                out = [self._csv_payload((self.k + i) % self.virtual, (self.k + i) // self.virtual)
+                       for i in range(n)]
+                self.k += n
+                return out
+            while len(self.pending) < n:
+                self.pending.extend(fleet_payloads(self.sim, self.sim.tick()))
+            out, self.pending = self.pending[:n], self.pending[n:]
+            return out
+
+
+def replay_load(url, rate=None, virtual=None, connections=8, duration=30.0, data_dir=DATA_DIR,
+                synthetic=False, batch=1, timeout=5.0, seed=0, report_every=5.0):
+    """
+    POST replayed ticks to url from `connections` keep-alive connections
+    (one thread each) for `duration` seconds. rate is the target POSTs/s
+    over all connections, paced on absolute deadlines; None sends as fast
+    as the server answers. Each POST carries `batch` ticks (1 = one tick,
+    like an unbatched generator). Returns throughput and latency stats.
+    """
+    import http.client
+    from urllib.parse import urlsplit
+
+    sources = None if synthetic else _replay_sources(data_dir)
+    if not synthetic and not sources:
+        print(f"  [replay] no CSVs in {data_dir}/ — using synthetic ticks")
+    virtual = virtual or (len(sources) if sources else len(PROFILES))
+    stream  = ReplayStream(virtual, sources or None, seed)
+    target  = urlsplit(url)
+    conn_cls = http.client.HTTPSConnection if target.scheme == "https" else http.client.HTTPConnection
+    path    = target.path or "/update"
+
+    stop      = threading.Event()
+    start     = time.perf_counter()
+    latencies = [[] for _ in range(connections)]
+    outcomes  = [{} for _ in range(connections)]
+    max_lag   = [0.0] * connections
+
+    def worker(w):
+        conn = conn_cls(target.netloc, timeout=timeout)
+        k = 0
+        while not stop.is_set():
+            if rate:
+                deadline = start + (k * connections + w) / rate
+                now = time.perf_counter()
+                if now < deadline:
+                    time.sleep(deadline - now)
+                else:
+                    max_lag[w] = max(max_lag[w], now - deadline)
+            k += 1
+            payloads = stream.take(batch)
+            body = json.dumps(payloads[0] if batch == 1 else payloads).encode()
+            t0 = time.perf_counter()
+            try:
+                conn.request("POST", path, body, {"Content-Type": "application/json"})
+                resp = conn.getresponse()
+                resp.read()
+                outcome = "ok" if 200 <= resp.status < 300 else f"http_{resp.status}"
+            except Exception:
+                outcome = "error"
+                conn.close()
+                conn = conn_cls(target.netloc, timeout=timeout)
+            dt = time.perf_counter() - t0
+            latencies[w].append(dt)
+            outcomes[w][outcome] = outcomes[w].get(outcome, 0) + 1
+            REPLAY_SECONDS.observe(dt)
+            REPLAY_POSTS.inc(outcome=outcome)
+        conn.close()
+
+    print(f"  [replay] {virtual:,} buildings ({'synthetic' if not sources else f'{len(sources)} CSVs'}) → {url}  "
+          f"rate={rate or 'max'}/s  connections={connections}  batch={batch}  for {duration:.0f}s")
+    threads = [threading.Thread(target=worker, args=(w,), daemon=True) for w in range(connections)]
+    for t in threads:
+        t.start()
+    try:
+        end, last_n, last_t = start + duration, 0, start
+        while time.perf_counter() < end:
+            time.sleep(max(0.0, min(report_every, end - time.perf_counter())))
+            now, n = time.perf_counter(), sum(len(l) for l in latencies)
+            print(f"  [replay] {now - start:6.1f}s  {(n - last_n) / (now - last_t):8.1f} posts/s  total={n:,}")
+            last_n, last_t = n, now
+    except KeyboardInterrupt:
+        pass
+    stop.set()
+    for t in threads:
+        t.join(timeout + 1)
+    elapsed = time.perf_counter() - start
+
+    lat = np.array([x for l in latencies for x in l]) * 1000
+    counts = {}
+    for o in outcomes:
+        for key, v in o.items():
+            counts[key] = counts.get(key, 0) + v
+    ok = counts.get("ok", 0)
+    return {
+        "url":            url,
+        "buildings":      virtual,
+        "connections":    connections,
+        "batch":          batch,
+        "target_rate":    rate,
+        "elapsed_s":      round(elapsed, 3),
+        "posts":          int(len(lat)),
+        "outcomes":       counts,
+        "posts_per_s":    round(len(lat) / elapsed, 1),
+        "ok_ticks_per_s": round(ok * batch / elapsed, 1),
+        "latency_ms":     {name: round(float(np.percentile(lat, q)), 3) if len(lat) else None
+                           for name, q in (("p50", 50), ("p90", 90), ("p99", 99), ("max", 100))},
+        "max_schedule_lag_s": round(max(max_lag), 4),   # > 0 means the driver couldn't hold the rate
+    }
+
+
+# ── Legacy: one thread per building ──────────────────────────
+def launch_threads():
     print("Starting 5 buildings...\n")
+    publisher = TelemetryPublisher(SERVER_URLS)
     for building_id, profile in PROFILES.items():
         t = threading.Thread(
             target=run_building,
-            args=(building_id, profile),
+            args=(building_id, profile, publisher),
             daemon=True
         )
         t.start()
@@ -216,4 +898,80 @@ if __name__ == "__main__":
     try:
         while True: time.sleep(0.1)
     except KeyboardInterrupt:
-        print("\nStopped.")
\ No newline at end of file
+        publisher.close()
+        print("\nStopped.")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Smart-microgrid telemetry generator")
+    parser.add_argument("--speed", default="1",
+                        help="simulated minutes per real second (1, 60, 1000, …) or 'max'")
+    parser.add_argument("--fleet", type=int, metavar="N",
+                        help="simulate N synthetic buildings (cycling PROFILES) instead of B1–B5")
+    parser.add_argument("--minutes", type=int, help="stop the scheduler after this many sim minutes")
+    parser.add_argument("--no-csv", action="store_true", help="scheduler: don't write CSV rows")
+    parser.add_argument("--no-post", action="store_true", help="scheduler: don't POST to SERVER_URLS")
+    parser.add_argument("--legacy-threads", action="store_true",
+                        help="old mode: one free-running thread per building")
+    parser.add_argument("--compare-fleet", type=float, metavar="DAYS",
+                        help="compare scalar vs vectorized fleet stats over DAYS simulated days")
+    parser.add_argument("--backfill", type=float, metavar="DAYS",
+                        help="write DAYS simulated days of CSV rows offline, as fast as possible")
+    parser.add_argument("--buildings", default=",".join(PROFILES),
+                        help="comma-separated building IDs for --backfill (default: all PROFILES)")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="--backfill: overwrite CSVs instead of continuing from the last row")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="CSV output directory")
+    parser.add_argument("--store", metavar="DIR",
+                        help="write to a columnar TelemetryStore at DIR instead of CSV")
+    parser.add_argument("--seed", type=int,
+                        help="RNG seed (live runs: fresh entropy unless given; other modes default to 0)")
+    replay = parser.add_argument_group("replay load driver")
+    replay.add_argument("--replay", action="store_true", help="POST replayed ticks to --url at --rate and report latency")
+    replay.add_argument("--synthetic", action="store_true", help="--replay: FleetSimulator ticks instead of CSV rows")
+    replay.add_argument("--url", default=SERVER_URLS[-1], help="--replay: /update endpoint (default: local server)")
+    replay.add_argument("--rate", type=float, default=0, help="--replay: target POSTs/s (0 = as fast as possible)")
+    replay.add_argument("--virtual", type=int, help="--replay: virtual buildings (default: one per CSV)")
+    replay.add_argument("--connections", type=int, default=8, help="--replay: concurrent keep-alive connections")
+    replay.add_argument("--duration", type=float, default=30.0, help="--replay: seconds to run")
+    replay.add_argument("--batch", type=int, default=1, help="--replay: ticks per POST (JSON array when > 1)")
+    replay.add_argument("--report", help="--replay: also write the result as JSON")
+    metrics.add_arguments(parser, log_every=True)
+    args = parser.parse_args()
+    store = TelemetryStore(args.store) if args.store else None
+    LOG.interval = args.log_every
+    snapshots = metrics.start_from_args(args)
+    fixed_seed = 0 if args.seed is None else args.seed
+
+    if args.replay:
+        result = replay_load(args.url, args.rate or None, args.virtual, args.connections, args.duration,
+                             args.data_dir, args.synthetic, args.batch, seed=fixed_seed)
+        print(f"\n  {result['posts']:,} POSTs in {result['elapsed_s']}s — {result['posts_per_s']:,}/s, "
+              f"{result['ok_ticks_per_s']:,} ticks/s accepted  {result['outcomes']}")
+        print(f"  latency ms: " + "  ".join(f"{k}={v}" for k, v in result["latency_ms"].items())
+              + f"   max schedule lag {result['max_schedule_lag_s']}s")
+        if args.report:
+            with open(args.report, "w") as f:
+                json.dump(result, f, indent=2)
+    elif args.compare_fleet:
+        compare_scalar_fleet(args.compare_fleet, fixed_seed)
+    elif args.backfill:
+        backfill(args.buildings.split(","), int(args.backfill * 1440), seed=fixed_seed,
+                 data_dir=args.data_dir, resume=not args.no_resume, store=store)
+    elif args.legacy_threads:
+        launch_threads()
+    else:
+        profiles  = fleet_profiles(args.fleet) if args.fleet else PROFILES
+        speed     = None if args.speed == "max" else float(args.speed)
+        publisher = None if args.no_post else TelemetryPublisher(SERVER_URLS)
+        print(f"Starting {len(profiles)} buildings on one clock — speed={args.speed} sim-min/s\n")
+        report = run_scheduler(profiles, speed=speed, seed=args.seed, publisher=publisher,
+                               data_dir=args.data_dir, write_csv=not args.no_csv,
+                               max_minutes=args.minutes, store=store)
+        if publisher is not None:
+            publisher.close()
+        print(f"\nStopped. {report}")
+
+    if snapshots is not None:
+        snapshots.close()
@@ -0,0 +1,373 @@
+"""
+metrics.py — In-process Metrics for the ML Scripts
+─────────────────────────────────────────────────────────
+Counters, gauges and histograms shared by generator, train_local, fedavg
+and predict, so hot paths report numbers instead of print lines.
+
+    TICKS = metrics.counter("generator_ticks_total", "Building ticks simulated")
+    POST  = metrics.histogram("publisher_post_seconds", "POST latency")
+    TICKS.inc()
+    POST.observe(0.012, url=url)          # labels are keyword arguments
+    with POST.time(url=url):              # or time a block
+        ...
+
+Histograms use fixed cumulative buckets (Prometheus style) — observe() is
+a bisect and two additions, no samples are kept; quantiles in snapshots
+are interpolated from the buckets.
+
+Export (one process-wide REGISTRY):
+    render_prometheus()            Prometheus text exposition format
+    snapshot()                     JSON-able dict incl. p50/p95/p99
+    serve_http(port)               GET /metrics  and  GET /metrics.json
+    Snapshotter(path, interval)    rewrites a .json (or .prom) file periodically
+    state() / merge()              carry a worker process's metrics back to its parent
+
+RateLimitedLog replaces per-tick print()s: at most one line per key per
+interval, with the number of suppressed lines appended.
+
+Scripts wire this up with add_arguments(parser) / start_from_args(args):
+--metrics-port, --metrics-file, --metrics-interval, --log-every.
+"""
+
+import os, json, time, bisect, threading, contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds — 100 µs (one NumPy tick) up to 5 min (a training epoch / FedAvg round)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+SNAPSHOT_SECONDS = 10.0   # Snapshotter default interval
+LOG_EVERY        = 1.0    # RateLimitedLog default: seconds between lines per key
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _label_text(key):
+    if not key:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in key) + "}"
+
+
+def _fmt(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    """Monotonic count per label set."""
+    kind = "counter"
+
+    def __init__(self, name, help=""):
+        self.name, self.help = name, help
+        self.lock   = threading.Lock()
+        self.values = {}
+
+    def inc(self, n=1, **labels):
+        key = _key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + n
+
+    def value(self, **labels):
+        return self.values.get(_key(labels), 0)
+
+    def _samples(self):
+        with self.lock:
+            return [(self.name, key, v) for key, v in self.values.items()]
+
+    def _snapshot(self):
+        with self.lock:
+            return {_label_text(k) or "": v for k, v in self.values.items()}
+
+
+class Gauge(Counter):
+    """Last value set per label set (queue depth, loaded models, …)."""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[_key(labels)] = value
+
+
+class Histogram:
+    """Bucketed distribution per label set; values are usually seconds."""
+    kind = "histogram"
+
+    def __init__(self, name, help="", buckets=LATENCY_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = tuple(sorted(buckets))
+        self.lock    = threading.Lock()
+        self.series  = {}   # label key → [per-bucket counts (+Inf last), sum, count]
+
+    def observe(self, value, **labels):
+        key = _key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            s = self.series.get(key)
+            if s is None:
+                s = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        s = self.series.get(_key(labels))
+        return s[2] if s else 0
+
+    def quantile(self, q, **labels):
+        """Estimate from the buckets (linear within a bucket, like histogram_quantile)."""
+        with self.lock:
+            s = self.series.get(_key(labels))
+            counts = list(s[0]) if s else None
+        return self._quantile(q, counts)
+
+    def _quantile(self, q, counts):
+        total = sum(counts) if counts else 0
+        if not total:
+            return None
+        rank, seen = q * total, 0
+        for i, c in enumerate(counts):
+            if seen + c >= rank and c:
+                if i == len(self.buckets):
+                    return self.buckets[-1]       # beyond the last bound
+                lo = self.buckets[i - 1] if i else 0.0
+                return lo + (self.buckets[i] - lo) * (rank - seen) / c
+            seen += c
+        return self.buckets[-1]
+
+    def _samples(self):
+        out = []
+        with self.lock:
+            series = [(k, list(s[0]), s[1], s[2]) for k, s in self.series.items()]
+        for key, counts, total, n in series:
+            cum = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cum += c
+                out.append((f"{self.name}_bucket", key + (("le", _fmt(bound)),), cum))
+            out.append((f"{self.name}_sum", key, total))
+            out.append((f"{self.name}_count", key, n))
+        return out
+
+    def _snapshot(self):
+        with self.lock:
+            series = [(k, list(s[0]), s[1], s[2]) for k, s in self.series.items()]
+        return {_label_text(key) or "": {
+                    "count": n, "sum": round(total, 6), "mean": round(total / n, 6) if n else None,
+                    **{f"p{int(q * 100)}": self._quantile(q, counts) for q in (0.5, 0.95, 0.99)}}
+                for key, counts, total, n in series}
+
+
+class Registry:
+
+    def __init__(self):
+        self.lock    = threading.Lock()
+        self.metrics = {}
+
+    def _get(self, cls, name, help, **kwargs):
+        with self.lock:
+            m = self.metrics.get(name)
+            if m is None:
+                m = self.metrics[name] = cls(name, help, **kwargs)
+            elif type(m) is not cls:
+                raise ValueError(f"metric {name} already registered as a {m.kind}")
+            return m
+
+    def counter(self, name, help=""):
+        return self._get(Counter, name, help)
+
+    def gauge(self, name, help=""):
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name, help="", buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def render_prometheus(self):
+        lines = []
+        for name, m in sorted(self.metrics.items()):
+            if m.help:
+                lines.append(f"# HELP {name} {m.help}")
+            lines.append(f"# TYPE {name} {m.kind}")
+            for sample, key, value in m._samples():
+                lines.append(f"{sample}{_label_text(key)} {_fmt(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        return {"timestamp": time.strftime("%Y-%m-%d %H:%M:%S"), "pid": os.getpid(),
+                "metrics": {name: {"type": m.kind, "values": m._snapshot()}
+                            for name, m in sorted(self.metrics.items())}}
+
+    def state(self, reset=False):
+        """
+        Raw values as a picklable dict, for shipping a worker process's
+        metrics to its parent (merge()). reset=True clears them afterwards,
+        so a pool process reused for the next task doesn't report twice.
+        """
+        out = {}
+        for name, m in list(self.metrics.items()):
+            with m.lock:
+                if m.kind == "histogram":
+                    out[name] = (m.kind, m.help, m.buckets,
+                                 {k: (list(s[0]), s[1], s[2]) for k, s in m.series.items()})
+                    if reset:
+                        m.series = {}
+                else:
+                    out[name] = (m.kind, m.help, None, dict(m.values))
+                    if reset:
+                        m.values = {}
+        return out
+
+    def merge(self, state):
+        """Add another process's state(): counters and histograms sum, gauges take its value."""
+        for name, (kind, help, buckets, values) in state.items():
+            if kind == "histogram":
+                m = self.histogram(name, help, buckets)
+                with m.lock:
+                    for key, (counts, total, n) in values.items():
+                        s = m.series.setdefault(key, [[0] * (len(m.buckets) + 1), 0.0, 0])
+                        s[0] = [a + b for a, b in zip(s[0], counts)]
+                        s[1] += total
+                        s[2] += n
+            else:
+                m = self.gauge(name, help) if kind == "gauge" else self.counter(name, help)
+                with m.lock:
+                    for key, v in values.items():
+                        m.values[key] = v if kind == "gauge" else m.values.get(key, 0) + v
+
+    def write(self, path):
+        """Atomically write a snapshot — Prometheus text for *.prom (textfile collector), else JSON."""
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp = f"{path}.tmp-{os.getpid()}"
+        with open(tmp, "w") as f:
+            if path.endswith(".prom"):
+                f.write(self.render_prometheus())
+            else:
+                json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp, path)
+
+
+REGISTRY = Registry()
+counter           = REGISTRY.counter
+gauge             = REGISTRY.gauge
+histogram         = REGISTRY.histogram
+render_prometheus = REGISTRY.render_prometheus
+snapshot          = REGISTRY.snapshot
+write             = REGISTRY.write
+state             = REGISTRY.state
+merge             = REGISTRY.merge
+
+
+# ── Export ───────────────────────────────────────────────────
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, ctype = self.registry.render_prometheus().encode(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, ctype = json.dumps(self.registry.snapshot()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_http(port, host="0.0.0.0"):
+    """Serve /metrics from a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+class Snapshotter:
+    """Rewrites `path` every interval seconds from a daemon thread, and once more on close()."""
+
+    def __init__(self, path, interval=SNAPSHOT_SECONDS, registry=REGISTRY):
+        self.path, self.interval, self.registry = path, interval, registry
+        self.stop   = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="metrics-snapshot", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stop.wait(self.interval):
+            try:
+                self.registry.write(self.path)
+            except OSError as e:
+                print(f"[metrics] WARNING: snapshot not written — {e}")
+
+    def close(self):
+        self.stop.set()
+        self.thread.join(5.0)
+        self.registry.write(self.path)
+
+
+class RateLimitedLog:
+    """
+    print() at most once per `interval` seconds per key; lines in between
+    are counted and the count is shown on the next line that gets through.
+    interval=0 prints everything, None prints nothing.
+    """
+
+    def __init__(self, interval=LOG_EVERY, out=print):
+        self.interval = interval
+        self.out      = out
+        self.lock     = threading.Lock()
+        self.last     = {}   # key → monotonic time of the last printed line
+        self.skipped  = {}
+        self.suppressed = counter("log_lines_suppressed_total", "Console lines dropped by rate limiting")
+
+    def __call__(self, key, message):
+        if self.interval is None:
+            self.suppressed.inc()
+            return False
+        now = time.monotonic()
+        with self.lock:
+            if self.interval and now - self.last.get(key, -self.interval) < self.interval:
+                self.skipped[key] = self.skipped.get(key, 0) + 1
+                self.suppressed.inc()
+                return False
+            self.last[key] = now
+            n = self.skipped.pop(key, 0)
+        self.out(f"{message}  (+{n} lines)" if n else message)
+        return True
+
+
+def add_arguments(parser, log_every=False):
+    """--metrics-* options (and --log-every for scripts with per-tick console lines)."""
+    group = parser.add_argument_group("metrics")
+    group.add_argument("--metrics-port", type=int, help="serve Prometheus /metrics on this port")
+    group.add_argument("--metrics-file", help="write metrics snapshots here (.json, or .prom for Prometheus text)")
+    group.add_argument("--metrics-interval", type=float, default=SNAPSHOT_SECONDS,
+                       help="seconds between --metrics-file snapshots")
+    if log_every:
+        group.add_argument("--log-every", type=float, default=LOG_EVERY,
+                           help="seconds between per-building console lines (0 = every tick)")
+    return group
+
+
+def start_from_args(args):
+    """Start the exporters requested on the command line; returns a Snapshotter (close() it at exit) or None."""
+    if args.metrics_port:
+        serve_http(args.metrics_port)
+        print(f"[metrics] serving http://0.0.0.0:{args.metrics_port}/metrics")
+    return Snapshotter(args.metrics_file, args.metrics_interval) if args.metrics_file else None
@@ -0,0 +1,74 @@
+"""
+model_registry.py — Which model file serves each building
+─────────────────────────────────────────────────────────
+After a FedAvg round the global weights are written ONCE
+(global_model.keras / global_model.weights.h5) and recorded in
+global_manifest.json together with the exact client files that went into
+the round. A building uses the global model by reference until its own
+model file changes again (i.e. it retrained locally after the round).
+"""
+
+import os, json
+
+GLOBAL_MODEL    = "global_model.keras"
+GLOBAL_WEIGHTS  = "global_model.weights.h5"
+GLOBAL_MANIFEST = "global_manifest.json"
+
+
+def model_path(model_dir, building_id):
+    return os.path.join(model_dir, f"{building_id}_model.keras")
+
+
+def weights_path(model_dir, building_id):
+    return os.path.join(model_dir, f"{building_id}_weights.weights.h5")
+
+
+def file_stamp(path):
+    """Cheap identity of a file version: (size, mtime_ns) — None if missing."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def load_manifest(model_dir):
+    path = os.path.join(model_dir, GLOBAL_MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(model_dir, manifest):
+    path = os.path.join(model_dir, GLOBAL_MANIFEST)
+    tmp  = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def uses_global(model_dir, building_id, manifest=None):
+    """True if building_id was synced in the last round and hasn't retrained since."""
+    manifest = manifest if manifest is not None else load_manifest(model_dir)
+    if not manifest:
+        return False
+    synced = manifest.get("buildings", {}).get(building_id)
+    if synced is None:
+        return False
+    return file_stamp(model_path(model_dir, building_id)) == synced.get("model") and \
+           file_stamp(weights_path(model_dir, building_id)) == synced.get("weights")
+
+
+def resolve_model_path(model_dir, building_id, manifest=None):
+    """The .keras file that currently serves building_id."""
+    if uses_global(model_dir, building_id, manifest):
+        return os.path.join(model_dir, GLOBAL_MODEL)
+    return model_path(model_dir, building_id)
+
+
+def resolve_weights_path(model_dir, building_id, manifest=None):
+    """The .weights.h5 file that currently serves building_id."""
+    if uses_global(model_dir, building_id, manifest):
+        return os.path.join(model_dir, GLOBAL_WEIGHTS)
+    return weights_path(model_dir, building_id)
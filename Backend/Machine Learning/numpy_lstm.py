@@ -0,0 +1,137 @@
+"""
+numpy_lstm.py — TensorFlow-free inference for the energy LSTM
+─────────────────────────────────────────────────────────
+Runs the forward pass of train_local.build_model in NumPy:
+
+    input (60, 5) → LSTM(64, seq) → LSTM(32) ─┬→ Dense(16, relu) → Dense(1)           net_kwh
+                                              └→ Dense(16, relu) → Dense(1, sigmoid)  deficit_prob
+
+Weights come straight from a Keras 3 *_weights.weights.h5 (or the
+weights inside a .keras zip) via h5py, or from a flat .npz exported with
+export(). Startup is a few file reads — no TensorFlow import, no model
+deserialization — and predict_on_batch() has the same signature as the
+Keras model's, so predict.py can use either.
+
+Dropout is inactive at inference, so it has no weights here. Keras gate
+order is i, f, c, o; activations tanh / sigmoid.
+
+Export:  python numpy_lstm.py export models/B1_weights.weights.h5 models/B1_lstm.npz
+Check:   python numpy_lstm.py check  models/B1_model.keras        (needs TensorFlow)
+"""
+
+import io, os, sys, zipfile
+import numpy as np
+from weight_codec import read_tensors
+
+KERAS_WEIGHTS = "model.weights.h5"   # weights member inside a .keras zip
+CHUNK = 512                          # windows per pass — bounds the (N, 60, 256) gate buffer
+
+# Keras 3 .weights.h5 dataset → engine parameter. Layers are stored under
+# auto-generated class names in build order: lstm = lstm_1, lstm_1 = lstm_2,
+# dense = reg_hidden, dense_1 = cls_hidden, dense_2 = net_kwh, dense_3 = deficit_prob.
+H5_LAYOUT = {
+    "layers/lstm/cell/vars/0":   "lstm_1/kernel",
+    "layers/lstm/cell/vars/1":   "lstm_1/recurrent_kernel",
+    "layers/lstm/cell/vars/2":   "lstm_1/bias",
+    "layers/lstm_1/cell/vars/0": "lstm_2/kernel",
+    "layers/lstm_1/cell/vars/1": "lstm_2/recurrent_kernel",
+    "layers/lstm_1/cell/vars/2": "lstm_2/bias",
+    "layers/dense/vars/0":       "reg_hidden/kernel",
+    "layers/dense/vars/1":       "reg_hidden/bias",
+    "layers/dense_1/vars/0":     "cls_hidden/kernel",
+    "layers/dense_1/vars/1":     "cls_hidden/bias",
+    "layers/dense_2/vars/0":     "net_kwh/kernel",
+    "layers/dense_2/vars/1":     "net_kwh/bias",
+    "layers/dense_3/vars/0":     "deficit_prob/kernel",
+    "layers/dense_3/vars/1":     "deficit_prob/bias",
+}
+
+
+def _sigmoid(x):
+    return 0.5 * (1.0 + np.tanh(0.5 * x))   # overflow-free
+
+
+def _lstm(x, kernel, recurrent, bias, return_sequences):
+    """x (N, T, F) → (N, T, units) or (N, units). Input projection for all steps is one matmul."""
+    n, steps, _ = x.shape
+    units = recurrent.shape[0]
+    z_in = (x.reshape(n * steps, -1) @ kernel + bias).reshape(n, steps, 4 * units)
+    h = np.zeros((n, units), dtype=np.float32)
+    c = np.zeros((n, units), dtype=np.float32)
+    seq = np.empty((n, steps, units), dtype=np.float32) if return_sequences else None
+    for t in range(steps):
+        z = z_in[:, t] + h @ recurrent
+        i = _sigmoid(z[:, :units])
+        f = _sigmoid(z[:, units:2 * units])
+        g = np.tanh(z[:, 2 * units:3 * units])
+        o = _sigmoid(z[:, 3 * units:])
+        c = f * c + i * g
+        h = o * np.tanh(c)
+        if return_sequences:
+            seq[:, t] = h
+    return seq if return_sequences else h
+
+
+class NumpyLSTM:
+
+    def __init__(self, params):
+        missing = set(H5_LAYOUT.values()) - set(params)
+        if missing:
+            raise ValueError(f"missing weights: {sorted(missing)}")
+        self.params = {k: np.asarray(v, dtype=np.float32) for k, v in params.items()}
+
+    @classmethod
+    def from_h5(cls, source):
+        tensors = read_tensors(source)
+        return cls({name: tensors[key] for key, name in H5_LAYOUT.items()})
+
+    @classmethod
+    def load(cls, path):
+        """From a .weights.h5, a .keras zip, or an exported .npz."""
+        if path.endswith(".npz"):
+            with np.load(path) as z:
+                return cls({k: z[k] for k in z.files})
+        if path.endswith(".keras"):
+            with zipfile.ZipFile(path) as z:
+                return cls.from_h5(io.BytesIO(z.read(KERAS_WEIGHTS)))
+        return cls.from_h5(path)
+
+    def export(self, path):
+        """Flat .npz of the engine parameters (loads without h5py)."""
+        np.savez(path, **self.params)
+
+    def _forward(self, X):
+        p = self.params
+        x = _lstm(X, p["lstm_1/kernel"], p["lstm_1/recurrent_kernel"], p["lstm_1/bias"], True)
+        x = _lstm(x, p["lstm_2/kernel"], p["lstm_2/recurrent_kernel"], p["lstm_2/bias"], False)
+        reg = np.maximum(x @ p["reg_hidden/kernel"] + p["reg_hidden/bias"], 0)
+        cls = np.maximum(x @ p["cls_hidden/kernel"] + p["cls_hidden/bias"], 0)
+        return (reg @ p["net_kwh/kernel"] + p["net_kwh/bias"],
+                _sigmoid(cls @ p["deficit_prob/kernel"] + p["deficit_prob/bias"]))
+
+    def predict_on_batch(self, X):
+        """(net_kwh (N, 1), deficit_prob (N, 1)) for X of shape (N, window, features)."""
+        X = np.asarray(X, dtype=np.float32)
+        outs = [self._forward(X[i:i + CHUNK]) for i in range(0, len(X), CHUNK)]
+        return np.concatenate([o[0] for o in outs]), np.concatenate([o[1] for o in outs])
+
+
+def check_against_keras(model_path, n=256, seed=0):
+    """Max abs difference between this engine and Keras on random windows."""
+    from tensorflow import keras
+    model = keras.models.load_model(model_path)
+    X = np.random.default_rng(seed).random((n,) + tuple(model.input_shape[1:]), dtype=np.float32)
+    ref = model.predict_on_batch(X)
+    out = NumpyLSTM.load(model_path).predict_on_batch(X)
+    return tuple(float(np.abs(np.asarray(r) - o).max()) for r, o in zip(ref, out))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "export":
+        NumpyLSTM.load(sys.argv[2]).export(sys.argv[3])
+        print(f"Exported {sys.argv[2]} → {sys.argv[3]} ({os.path.getsize(sys.argv[3]) / 1024:.0f} KB)")
+    elif len(sys.argv) == 3 and sys.argv[1] == "check":
+        net, prob = check_against_keras(sys.argv[2])
+        print(f"max |numpy - keras|: net_kwh {net:.2e}  deficit_prob {prob:.2e}")
+    else:
+        print(__doc__)
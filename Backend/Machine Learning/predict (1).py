@@ -1,46 +1,829 @@
-import json, numpy as np, pandas as pd, os
-from tensorflow import keras
+"""
+predict.py — Deficit / net-energy inference
+─────────────────────────────────────────────────────────
+Models are loaded lazily (first request for a building) and kept warm;
+refresh_models() reloads any building whose model or norm file changed,
+e.g. after fedavg publishes a new global model.
+
+Two backends serve the same API: "numpy" (default, numpy_lstm.py) reads
+the weights with h5py and runs the LSTM in NumPy — no TensorFlow import,
+so startup takes well under a second; "keras" loads the full .keras model.
+
+OnlinePredictor keeps a rolling window per building that is updated one
+generator payload at a time, so live forecasting never re-reads history.
+
+Score once:        python predict.py [--backend numpy|keras]
+Run as a daemon:   python predict.py --serve [--port 8765] [--latency-ms 5]
+Backtest:          python predict.py --backtest [B1 B2 …] [--model models/global_model.keras]
+                                     [--stride 1] [--report backtest.json]
+Check backtest:    python predict.py --check [B1 …]   (scratch CSV with truncated rows)
+
+Daemon API (JSON):
+    GET  /health        loaded models + batching stats
+    GET  /predictions   latest telemetry of every building, scored
+    POST /predict       {"buildings": {bid: {feature: [60 values], …}}}
+                        a value may also be a list of such dicts, or a
+                        (k, 60, 5) nested list of raw windows
+    POST /observe       one generator /update payload (or a list of them):
+                        advances that building's window, returns its forecast
+    GET  /metrics       inference / request latency (Prometheus text, metrics.py)
+"""
+
+import io, json, math, numpy as np, pandas as pd, os, threading, time
+from numpy.lib.stride_tricks import sliding_window_view
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from telemetry_store import TelemetryStore, STORE_DIR
+from model_registry import resolve_model_path, resolve_weights_path, load_manifest, file_stamp
+from numpy_lstm import NumpyLSTM
+import metrics
 
 FEATURES  = ["solar_output_kw", "consumption_kw", "battery_level_kwh", "time_sin", "time_cos"]
 WINDOW_IN = 60
+WINDOW_OUT = 60        # label horizon (train_local) — used by the backtest
+PREDICT_BATCH = 4096   # max windows per forward pass
+MODEL_DIR = "models"
+DATA_DIR  = "data"
+BACKEND   = os.environ.get("PREDICT_BACKEND", "numpy")   # "numpy" or "keras"
+
+# Daemon defaults
+SERVE_PORT     = 8765
+LATENCY_BUDGET = 0.005   # seconds a batch stays open for more requests
+RELOAD_SECONDS = 2.0     # how often model files are checked for changes
+
+# Metrics (see metrics.py)
+INFER_SECONDS   = metrics.histogram("predict_inference_seconds", "One forward pass (backend=…)")
+INFER_WINDOWS   = metrics.counter("predict_windows_total", "Windows scored")
+BATCH_WINDOWS   = metrics.histogram("predict_batch_windows", "Windows per forward pass",
+                                    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096))
+REQUEST_SECONDS = metrics.histogram("predict_request_seconds", "Daemon request latency (route=…)")
+MODELS_LOADED   = metrics.gauge("predict_models_loaded", "Buildings with a model in memory")
 
-# ── Load all models ONCE at import time ──────────────────────
+# ── Models are loaded on first use and kept warm ─────────────
 _models = {}
 _norms  = {}
+_scales = {}    # bid → (min, span, span_ok) arrays over FEATURES
+_by_path = {}   # (path, stamp) → model; buildings synced by FedAvg share one global model instance
+_loaded  = {}   # bid → (model path, model stamp, norm stamp) currently in memory
+_load_lock = threading.RLock()   # loads/reloads come from the batcher and HTTP threads (OnlinePredictor)
 
-for bid in ["B1", "B2", "B3", "B4", "B5"]:
-    model_path = f"models/{bid}_model.keras"
-    norm_path  = f"models/{bid}_norm.json"
-    if os.path.exists(model_path) and os.path.exists(norm_path):
-        _models[bid] = keras.models.load_model(model_path)
-        with open(norm_path) as f:
-            _norms[bid] = json.load(f)
-        print(f"[predict] {bid} model loaded")
-    else:
-        print(f"[predict] WARNING: {bid} model not found")
 
+def discover_buildings():
+    """Buildings with saved normalization params in MODEL_DIR."""
+    if not os.path.isdir(MODEL_DIR):
+        return []
+    return sorted(name[:-len("_norm.json")] for name in os.listdir(MODEL_DIR)
+                  if name.endswith("_norm.json"))
 
-def predict_building(building_id, last_60_rows_df):
-    if building_id not in _models:
+
+def _model_version(building_id, manifest):
+    model_path = resolve_model_path(MODEL_DIR, building_id, manifest)
+    if BACKEND == "numpy":
+        weights = resolve_weights_path(MODEL_DIR, building_id, manifest)
+        model_path = weights if os.path.exists(weights) else model_path   # else weights inside the .keras
+    norm_path  = os.path.join(MODEL_DIR, f"{building_id}_norm.json")
+    return model_path, file_stamp(model_path), file_stamp(norm_path)
+
+
+def load_model_file(path):
+    """Model object for a .keras / .weights.h5 / .npz file with the active BACKEND."""
+    if BACKEND == "keras":
+        from tensorflow import keras
+        return keras.models.load_model(path)
+    return NumpyLSTM.load(path)
+
+
+def load_building(building_id, manifest=None):
+    """(Re)load the model serving building_id and its norm params."""
+    with _load_lock:
+        _load_building(building_id, manifest)
+
+
+def _load_building(building_id, manifest):
+    manifest = load_manifest(MODEL_DIR) if manifest is None else manifest
+    version  = _model_version(building_id, manifest)
+    model_path, model_stamp, norm_stamp = version
+    if model_stamp is None or norm_stamp is None:
         raise KeyError(f"Model for {building_id} not loaded. Check if model files exist and are valid.")
-    model = _models[building_id]
-    norm  = _norms[building_id]
+    key = (model_path, tuple(model_stamp))
+    if key not in _by_path:
+        _by_path[key] = load_model_file(model_path)
+    _models[building_id] = _by_path[key]
+    with open(os.path.join(MODEL_DIR, f"{building_id}_norm.json")) as f:
+        _norms[building_id] = json.load(f)
+    _scales[building_id] = norm_scales(_norms[building_id])
+    _loaded[building_id] = version
+    MODELS_LOADED.set(len(_loaded))
+    print(f"[predict] {building_id} model loaded ({os.path.basename(model_path)})")
+
+
+def norm_scales(norm):
+    """(min, span, span_ok) arrays over FEATURES from a *_norm.json dict."""
+    span = np.array([norm[f]["max"] - norm[f]["min"] for f in FEATURES])
+    return (np.array([norm[f]["min"] for f in FEATURES], dtype=np.float32),
+            np.where(span > 1e-10, span, 1.0).astype(np.float32), span > 1e-10)
+
+
+def read_norm_scales(building_id):
+    """norm_scales of a building's saved params, without loading its model."""
+    path = os.path.join(MODEL_DIR, f"{building_id}_norm.json")
+    if not os.path.exists(path):
+        raise KeyError(f"No normalization params for {building_id} ({path})")
+    with open(path) as f:
+        return norm_scales(json.load(f))
+
+
+def refresh_models():
+    """Reload buildings whose model/norm files changed since loading. Returns their IDs."""
+    manifest = load_manifest(MODEL_DIR)
+    with _load_lock:
+        changed = [bid for bid, version in _loaded.items() if _model_version(bid, manifest) != version]
+        for bid in changed:
+            try:
+                _load_building(bid, manifest)
+            except KeyError:
+                for d in (_models, _norms, _scales, _loaded):
+                    d.pop(bid, None)
+                print(f"[predict] WARNING: {bid} model removed")
+        if changed:
+            used = {id(m) for m in _models.values()}
+            for key in [k for k, m in _by_path.items() if id(m) not in used]:
+                del _by_path[key]
+    return changed
+
+
+def _is_windows(rows):
+    return isinstance(rows, np.ndarray) and rows.ndim == 3
+
+
+def _raw_windows(rows):
+    """(k, WINDOW_IN, features) float32 from a frame/dict (its last WINDOW_IN rows) or stacked windows."""
+    if _is_windows(rows):
+        return rows[:, -WINDOW_IN:, :].astype(np.float32, copy=False)
+    X = np.stack([np.asarray(rows[feat])[-WINDOW_IN:] for feat in FEATURES], axis=-1).astype(np.float32)
+    if len(X) < WINDOW_IN:
+        raise ValueError(f"need {WINDOW_IN} rows, got {len(X)}")
+    return X[None]
+
+
+def normalize_windows(building_id, X, scales=None):
+    """Min-max scale raw windows with the building's training params (constant features → 0)."""
+    mn, span, ok = _scales[building_id] if scales is None else scales
+    return np.where(ok, (X - mn) / span, 0).astype(np.float32)
+
+
+def predict_batch(requests, skip_missing=False, scaled=False):
+    """
+    Score many buildings at once. requests maps building_id to one input —
+    a DataFrame/dict of FEATURES (its last WINDOW_IN rows are used), a
+    list of those, or a (k, WINDOW_IN, features) array of raw windows.
+
+    Buildings sharing a model object (everyone synced to the global model)
+    are stacked into one forward pass. Returns {building_id: result} for a
+    single frame, {building_id: [result, …]} for a list or window array.
+    Buildings without a model raise KeyError, or are left out of the
+    result with skip_missing. scaled=True means window arrays are already
+    normalized (OnlinePredictor).
+    """
+    missing = []
+    for bid in requests:
+        if bid not in _models:
+            try:
+                load_building(bid)
+            except KeyError:
+                missing.append(bid)
+    if missing and not skip_missing:
+        raise KeyError(f"Model for {', '.join(missing)} not loaded. Check if model files exist and are valid.")
+
+    groups = {}   # id(model) → [(building_id, windows, single)]
+    for bid, rows in requests.items():
+        if bid in missing:
+            continue
+        single = not isinstance(rows, (list, tuple)) and not _is_windows(rows)
+        parts = [rows] if single or _is_windows(rows) else list(rows)
+        X = np.concatenate([_raw_windows(r) if scaled else normalize_windows(bid, _raw_windows(r))
+                            for r in parts])
+        groups.setdefault(id(_models[bid]), []).append((bid, X, single))
+
+    results = {}
+    for members in groups.values():
+        model = _models[members[0][0]]
+        X = np.concatenate([m[1] for m in members])
+        outs = []
+        for i in range(0, len(X), PREDICT_BATCH):
+            with INFER_SECONDS.time(backend=BACKEND):
+                outs.append(model.predict_on_batch(X[i:i + PREDICT_BATCH]))
+            BATCH_WINDOWS.observe(len(X[i:i + PREDICT_BATCH]))
+        INFER_WINDOWS.inc(len(X))
+        net_kwh      = np.concatenate([np.asarray(o[0]) for o in outs])[:, 0]
+        deficit_prob = np.concatenate([np.asarray(o[1]) for o in outs])[:, 0]
+
+        pos = 0
+        for bid, Xb, single in members:
+            out = [{"predicted_net_kwh":   float(net_kwh[j]),
+                    "deficit_probability": float(deficit_prob[j])}
+                   for j in range(pos, pos + len(Xb))]
+            results[bid] = out[0] if single else out
+            pos += len(Xb)
+    return results
+
+
+def predict_building(building_id, last_60_rows_df):
+    return predict_batch({building_id: last_60_rows_df})[building_id]
+
+
+def read_csv_tail(csv_path, n, block=64 * 1024):
+    """
+    Last n complete rows of a generator CSV, reading backwards from EOF —
+    cost depends on n, not on file size. Truncated or partially written
+    rows are dropped.
+    """
+    with open(csv_path, "rb") as f:
+        header = f.readline()
+        f.seek(0, os.SEEK_END)
+        end = pos = f.tell()
+        data = b""
+        # A couple of spare lines for a half-written last row / bad rows
+        while pos > len(header) and data.count(b"\n") <= n + 2:
+            step = min(block, pos - len(header))
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    if pos > len(header):
+        data = data[data.index(b"\n") + 1:]   # drop the partial first line
+    df = pd.read_csv(io.BytesIO(header + data), on_bad_lines="skip")
+    return clean_rows(df, FEATURES).tail(n)
+
+
+def clean_rows(df, columns):
+    """
+    Rows of a CSV frame whose `columns` all parse as numbers — the same
+    skip / coerce / dropna rule as train_local and telemetry_store.
+    Read the frame with on_bad_lines="skip".
+    """
+    cols = [c for c in df.columns if c in columns]
+    df[cols] = df[cols].apply(pd.to_numeric, errors="coerce")
+    return df.dropna(subset=cols)
+
+
+def latest_telemetry(building_ids, n=WINDOW_IN):
+    """{bid: last n rows} from the store (or CSV) for buildings that have data."""
+    store, latest = TelemetryStore(STORE_DIR), {}
+    for bid in building_ids:
+        csv_path = os.path.join(DATA_DIR, f"{bid}.csv")
+        if store.has(bid):
+            latest[bid] = store.tail(bid, n, FEATURES)   # reads only the last rows
+        elif os.path.exists(csv_path):
+            latest[bid] = read_csv_tail(csv_path, n)
+    return latest
+
+
+# ── Rolling backtest ──────────────────────────────────────────
+
+CALIBRATION_BINS = 10
+BACKTEST_COLUMNS = FEATURES + ["hour_of_day", "net_flow_kw", "is_deficit"]
+
+
+def read_history(building_id, data_dir=DATA_DIR, store_dir=STORE_DIR):
+    """{column: array} of a building's valid telemetry rows (store, else CSV), or None."""
+    store    = TelemetryStore(store_dir)
+    csv_path = os.path.join(data_dir, f"{building_id}.csv")
+    if store.has(building_id):
+        return store.read(building_id, BACKTEST_COLUMNS)
+    if os.path.exists(csv_path):
+        df = clean_rows(pd.read_csv(csv_path, usecols=BACKTEST_COLUMNS, on_bad_lines="skip"), BACKTEST_COLUMNS)
+        return {c: df[c].to_numpy() for c in BACKTEST_COLUMNS}
+    return None
+
+
+def backtest_building(building_id, model=None, stride=1, batch=PREDICT_BATCH, history=None):
+    """
+    Replay a building's history through the serving path: every window
+    (every stride-th one) of WINDOW_IN rows is normalized with the
+    building's norm params and scored, and compared with the labels
+    train_local derives from the next WINDOW_OUT rows (summed net flow,
+    any deficit). The series is normalized once and windows are strided
+    views of it, so only one batch is materialized at a time.
+
+    model defaults to the one serving the building; with a model given
+    only the building's norm params are read. history ({column: array})
+    replaces read_history. Returns arrays (pred_net, y_net, prob, y_def,
+    hour), or None without enough data.
+    """
+    if model is None:
+        if building_id not in _models:
+            load_building(building_id)
+        model, scales = _models[building_id], _scales[building_id]
+    else:
+        scales = read_norm_scales(building_id)
+    cols = read_history(building_id) if history is None else history
+    if cols is None:
+        return None
+    n = len(cols["net_flow_kw"]) - WINDOW_IN - WINDOW_OUT + 1
+    if n <= 0:
+        return None
+
+    raw    = np.stack([np.asarray(cols[f]) for f in FEATURES], axis=-1).astype(np.float32)
+    scaled = normalize_windows(building_id, raw, scales)
+    X      = sliding_window_view(scaled, WINDOW_IN, axis=0).transpose(0, 2, 1)
+    starts = np.arange(0, n, stride)
 
-    X = np.zeros((1, WINDOW_IN, len(FEATURES)), dtype=np.float32)
-    for i, feat in enumerate(FEATURES):
-        col = last_60_rows_df[feat].values[-WINDOW_IN:].astype(np.float32)
-        mn, mx = norm[feat]["min"], norm[feat]["max"]
-        X[0, :, i] = (col - mn) / (mx - mn) if mx - mn > 1e-10 else 0
+    net_flow = np.asarray(cols["net_flow_kw"])
+    deficit  = np.asarray(cols["is_deficit"])
+    y_net = sliding_window_view(net_flow, WINDOW_OUT)[WINDOW_IN:WINDOW_IN + n][starts].sum(axis=1)
+    y_def = sliding_window_view(deficit, WINDOW_OUT)[WINDOW_IN:WINDOW_IN + n][starts].max(axis=1)
+    hour  = np.asarray(cols["hour_of_day"])[starts + WINDOW_IN - 1].astype(np.int64) % 24
 
-    net_kwh, deficit_prob = model.predict(X, verbose=0)
-    return {
-        "predicted_net_kwh":   float(net_kwh[0][0]),
-        "deficit_probability": float(deficit_prob[0][0])
-    }
+    net_out, prob_out = [], []
+    for i in range(0, len(starts), batch):
+        out = model.predict_on_batch(X[starts[i:i + batch]])
+        net_out.append(np.asarray(out[0])[:, 0])
+        prob_out.append(np.asarray(out[1])[:, 0])
+    return (np.concatenate(net_out), y_net.astype(np.float32),
+            np.concatenate(prob_out), y_def.astype(np.float32), hour)
+
+
+def _scores(pred_net, y_net, prob, y_def):
+    err = pred_net - y_net
+    return {"windows":      int(len(err)),
+            "mae":          float(np.abs(err).mean()),
+            "bias":         float(err.mean()),
+            "accuracy":     float(((prob >= 0.5) == (y_def >= 0.5)).mean()),
+            "brier":        float(((prob - y_def) ** 2).mean()),
+            "mean_prob":    float(prob.mean()),
+            "deficit_rate": float(y_def.mean())}
+
+
+def calibration(prob, y_def, bins=CALIBRATION_BINS):
+    """Reliability table over equal-width probability bins, plus expected calibration error."""
+    idx    = np.minimum((prob * bins).astype(np.int64), bins - 1)
+    count  = np.bincount(idx, minlength=bins)
+    p_sum  = np.bincount(idx, weights=prob, minlength=bins)
+    y_sum  = np.bincount(idx, weights=y_def, minlength=bins)
+    table  = [{"bin":       f"{b / bins:.1f}-{(b + 1) / bins:.1f}",
+               "count":     int(count[b]),
+               "predicted": float(p_sum[b] / count[b]) if count[b] else None,
+               "observed":  float(y_sum[b] / count[b]) if count[b] else None}
+              for b in range(bins)]
+    ece = float(np.abs(p_sum - y_sum).sum() / max(1, count.sum()))
+    return table, ece
+
+
+def backtest(building_ids=None, model_path=None, stride=1):
+    """
+    Score every building's full history and report forecast quality
+    overall, per building and per hour of day (the hour the forecast is
+    made), with a deficit_probability calibration table. model_path
+    scores every building with one model file (e.g. the FedAvg global
+    model) instead of each building's serving model.
+    """
+    start  = time.perf_counter()
+    model  = load_model_file(model_path) if model_path else None
+    report = {"model": model_path or "serving", "backend": BACKEND, "stride": stride,
+              "by_building": {}, "by_hour": {}}
+    parts  = []
+    for bid in building_ids or discover_buildings():
+        try:
+            res = backtest_building(bid, model, stride)
+        except KeyError as e:
+            print(f"[predict] WARNING: {bid} skipped — {e}")
+            continue
+        if res is None:
+            print(f"[predict] WARNING: {bid} skipped — not enough telemetry")
+            continue
+        report["by_building"][bid] = _scores(*res[:4])
+        parts.append(res)
+    if not parts:
+        return report
+
+    pred_net, y_net, prob, y_def, hour = (np.concatenate(a) for a in zip(*parts))
+    report["overall"] = _scores(pred_net, y_net, prob, y_def)
+    for h in np.unique(hour):
+        m = hour == h
+        report["by_hour"][int(h)] = _scores(pred_net[m], y_net[m], prob[m], y_def[m])
+    report["calibration"], report["ece"] = calibration(prob, y_def)
+    report["seconds"] = round(time.perf_counter() - start, 2)
+    report["windows_per_sec"] = round(len(pred_net) / max(report["seconds"], 1e-9))
+    return report
+
+
+def check_backtest(building_id, rows=4 * (WINDOW_IN + WINDOW_OUT)):
+    """
+    Backtest a scratch CSV of the building's first `rows` rows with a
+    truncated row in the middle and a half-written last row, which must be
+    dropped rather than turn into NaN forecasts. Returns the failed checks.
+    """
+    import tempfile
+    cols = read_history(building_id)
+    if cols is None:
+        raise KeyError(f"No telemetry for {building_id}")
+    df = pd.DataFrame({c: np.asarray(cols[c])[:rows] for c in BACKTEST_COLUMNS})
+    lines = df.to_csv(index=False).splitlines()
+    truncated = ",".join(lines[len(lines) // 2].split(",")[:3])
+    body = lines[:len(lines) // 2] + [truncated] + lines[len(lines) // 2:] + [truncated]
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, f"{building_id}.csv"), "w") as f:
+            f.write("\n".join(body))          # no trailing newline: last row is half-written
+        history = read_history(building_id, data_dir=tmp, store_dir=tmp)
+
+    failed = []
+    res = backtest_building(building_id, history=history)
+    for name, passed in [
+        ("truncated rows dropped",  len(history["net_flow_kw"]) == len(df)),
+        ("no NaN in history",       not any(np.isnan(np.asarray(v, dtype=np.float64)).any() for v in history.values())),
+        ("finite forecasts",        res is not None and all(np.isfinite(a).all() for a in res[:4])),
+        ("hours in 0..23",          res is not None and ((res[4] >= 0) & (res[4] < 24)).all()),
+    ]:
+        print(f"  {'✅' if passed else '❌'} {building_id}: {name}")
+        if not passed:
+            failed.append(name)
+    if res is not None and not failed:
+        calibration(res[2], res[3])
+    return failed
+
+
+def print_backtest(report):
+    if "overall" not in report:
+        print("No buildings to backtest.")
+        return
+    o = report["overall"]
+    print(f"Backtest ({report['model']}, {report['backend']}, stride {report['stride']}): "
+          f"{o['windows']:,} windows in {report['seconds']}s ({report['windows_per_sec']:,}/s)")
+    print(f"  net_kwh MAE {o['mae']:.4f}  bias {o['bias']:+.4f}   deficit accuracy "
+          f"{o['accuracy'] * 100:.1f}%  brier {o['brier']:.4f}  ECE {report['ece']:.4f}")
+    for title, rows in (("building", report["by_building"]), ("hour", report["by_hour"])):
+        print(f"  {title:>8s}  {'windows':>8s}  {'MAE':>8s}  {'bias':>8s}  {'acc %':>6s}  "
+              f"{'brier':>6s}  {'p̄':>5s}  {'rate':>5s}")
+        for key, s in rows.items():
+            print(f"  {key!s:>8s}  {s['windows']:8d}  {s['mae']:8.4f}  {s['bias']:+8.4f}  "
+                  f"{s['accuracy'] * 100:6.1f}  {s['brier']:6.4f}  {s['mean_prob']:5.3f}  {s['deficit_rate']:5.3f}")
+    print("  calibration   count  predicted  observed")
+    for row in report["calibration"]:
+        if row["count"]:
+            print(f"  {row['bin']:>11s}  {row['count']:7d}  {row['predicted']:9.3f}  {row['observed']:8.3f}")
+
+
+# ── Online (per-tick) forecasting ─────────────────────────────
+
+def payload_features(payload):
+    """Model feature row from a generator /update payload — same values the generator logs to CSV."""
+    hour = (payload["sim_minute"] % 1440) / 60.0   # unrounded, as the generator derives time_sin/cos
+    return (round(payload["solar_kw"] / 60, 6),
+            round(payload["total_drained_kwh"], 6),
+            payload["battery_kwh"],
+            round(math.sin(2 * math.pi * hour / 24), 6),
+            round(math.cos(2 * math.pi * hour / 24), 6))
+
+
+class OnlinePredictor:
+    """
+    Rolling window of normalized feature rows per building. Each row is
+    written twice into a 2 × WINDOW_IN ring buffer (slot i and i + WINDOW_IN),
+    so the latest window is always the contiguous slice buf[i + 1 : i + 1 +
+    WINDOW_IN] — a tick normalizes one row and never copies or re-reads
+    history. Raw rows are kept the same way so the window can be rescaled
+    if the building's norm params change on a model reload.
+
+        online = OnlinePredictor()
+        online.observe(payload)           # generator /update payload
+        online.predict()                  # {bid: forecast} for every ready building
+    """
+
+    def __init__(self, seed_history=True):
+        self.seed_history = seed_history   # prime new buildings from the store/CSV tail
+        self.lock    = threading.Lock()
+        self._raw    = {}    # bid → (2W, F) float32
+        self._scaled = {}    # bid → (2W, F) float32
+        self._pos    = {}    # bid → next slot
+        self._rows   = {}    # bid → rows seen (saturates at WINDOW_IN)
+        self._norm   = {}    # bid → norm dict the scaled ring was built with
+
+    def _ensure(self, building_id):
+        if building_id not in _models:
+            load_building(building_id)
+        if building_id not in self._raw:
+            self._raw[building_id]    = np.zeros((2 * WINDOW_IN, len(FEATURES)), dtype=np.float32)
+            self._scaled[building_id] = np.zeros((2 * WINDOW_IN, len(FEATURES)), dtype=np.float32)
+            self._pos[building_id], self._rows[building_id] = 0, 0
+            self._norm[building_id] = _norms[building_id]
+            if self.seed_history:
+                history = latest_telemetry([building_id]).get(building_id)
+                if history is not None:
+                    self._fill(building_id, np.stack([np.asarray(history[f]) for f in FEATURES], axis=-1))
+        elif self._norm[building_id] is not _norms[building_id]:
+            # Model reloaded with different scaling — rescale the window from the raw rows
+            self._scaled[building_id] = normalize_windows(building_id, self._raw[building_id])
+            self._norm[building_id] = _norms[building_id]
+
+    def _fill(self, building_id, rows):
+        for row in np.asarray(rows, dtype=np.float32)[-WINDOW_IN:]:
+            self._push(building_id, row)
+
+    def _push(self, building_id, row):
+        i = self._pos[building_id]
+        mn, span, ok = _scales[building_id]
+        scaled = np.where(ok, (row - mn) / span, 0)
+        self._raw[building_id][i] = self._raw[building_id][i + WINDOW_IN] = row
+        self._scaled[building_id][i] = self._scaled[building_id][i + WINDOW_IN] = scaled
+        self._pos[building_id]  = (i + 1) % WINDOW_IN
+        self._rows[building_id] = min(WINDOW_IN, self._rows[building_id] + 1)
+
+    def push(self, building_id, row):
+        """Append one raw feature row (FEATURES order). Returns True once a full window exists."""
+        with self.lock:
+            self._ensure(building_id)
+            self._push(building_id, np.asarray(row, dtype=np.float32))
+            return self._rows[building_id] >= WINDOW_IN
+
+    def observe(self, payload):
+        """Append one generator /update payload."""
+        return self.push(payload["building_id"], payload_features(payload))
+
+    def window(self, building_id):
+        """Normalized (WINDOW_IN, features) view of the latest window, or None until it's full."""
+        if self._rows.get(building_id, 0) < WINDOW_IN:
+            return None
+        i = self._pos[building_id]
+        return self._scaled[building_id][i:i + WINDOW_IN]
+
+    def windows(self, building_ids=None):
+        """{bid: (1, WINDOW_IN, features) copy} for every ready building — safe to hand to another thread."""
+        with self.lock:
+            ids = self._rows if building_ids is None else building_ids
+            return {bid: w[None].copy() for bid in ids if (w := self.window(bid)) is not None}
+
+    def predict(self, building_ids=None):
+        """{bid: forecast} for ready buildings, one forward pass per distinct model."""
+        out = predict_batch(self.windows(building_ids), skip_missing=True, scaled=True)
+        return {bid: res[0] for bid, res in out.items()}
+
+    def forecast(self, payload):
+        """observe() then predict that building — None while its window is still filling."""
+        self.observe(payload)
+        return self.predict([payload["building_id"]]).get(payload["building_id"])
+
+
+# ── Inference daemon ──────────────────────────────────────────
+
+class MicroBatcher:
+    """
+    Coalesces concurrent requests into one predict_batch call. The first
+    request opens a batch; it is run once latency_budget seconds have
+    passed or max_windows windows are waiting. A single thread does all
+    inference and model reloads, so Keras is never called concurrently
+    and a reload never swaps a model mid-batch.
+    """
+
+    def __init__(self, latency_budget=LATENCY_BUDGET, max_windows=PREDICT_BATCH,
+                 reload_seconds=RELOAD_SECONDS):
+        self.latency_budget = latency_budget
+        self.max_windows    = max_windows
+        self.reload_seconds = reload_seconds
+        self.queue   = []
+        self.cond    = threading.Condition()
+        self.closing = False
+        self.stats   = {"requests": 0, "batches": 0, "windows": 0, "reloads": 0, "errors": 0}
+        self.thread  = threading.Thread(target=self._run, name="predict-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, requests, timeout=10.0, scaled=False):
+        """Block until the batch holding `requests` has run; returns predict_batch's result."""
+        item = {"requests": requests, "scaled": scaled,
+                "done": threading.Event(), "result": None, "error": None,
+                "windows": sum(len(r) if _is_windows(r) else len(r) if isinstance(r, (list, tuple)) else 1
+                               for r in requests.values())}
+        with self.cond:
+            self.queue.append(item)
+            self.cond.notify()
+        if not item["done"].wait(timeout):
+            raise TimeoutError("prediction timed out")
+        if item["error"] is not None:
+            raise item["error"]
+        return item["result"]
+
+    def _take_batch(self):
+        with self.cond:
+            next_reload = time.monotonic() + self.reload_seconds
+            while not self.queue and not self.closing:
+                if not self.cond.wait(max(0.0, next_reload - time.monotonic())):
+                    return None            # idle — time to check model files
+            deadline = time.monotonic() + self.latency_budget
+            while not self.closing and sum(i["windows"] for i in self.queue) < self.max_windows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            batch, self.queue = self.queue, []
+            return batch
+
+    def _run(self):
+        last_reload = time.monotonic()
+        while not self.closing:
+            batch = None
+            try:
+                batch = self._take_batch()
+                if time.monotonic() - last_reload >= self.reload_seconds:
+                    last_reload = time.monotonic()
+                    self.stats["reloads"] += len(refresh_models())
+                if batch:
+                    self._predict(batch)
+            except Exception as e:
+                # This is the only inference thread — fail what it holds and keep serving
+                self.stats["errors"] += 1
+                print(f"[predict] WARNING: batch failed — {e!r}")
+                for item in batch or []:
+                    if not item["done"].is_set():
+                        item["error"] = e
+                        item["done"].set()
+
+    def _predict(self, batch):
+        # Merge every request into one {bid: [inputs…]} call, remembering each one's slice
+        # Raw and pre-scaled (online) windows are merged separately
+        merged, slots = {False: {}, True: {}}, []
+        for item in batch:
+            item["result"] = {}
+            group = merged[item["scaled"]]
+            for bid, rows in item["requests"].items():
+                single = not isinstance(rows, (list, tuple)) and not _is_windows(rows)
+                parts  = [rows] if single else [rows] if _is_windows(rows) else list(rows)
+                start  = sum(len(p) if _is_windows(p) else 1 for p in group.get(bid, []))
+                count  = sum(len(p) if _is_windows(p) else 1 for p in parts)
+                group.setdefault(bid, []).extend(parts)
+                slots.append((item, bid, start, count, single))
+        self.stats["requests"] += len(batch)
+        self.stats["batches"]  += 1
+        self.stats["windows"]  += sum(s[3] for s in slots)
+
+        try:
+            out = {flag: predict_batch(group, skip_missing=True, scaled=flag) if group else {}
+                   for flag, group in merged.items()}
+        except Exception:
+            # One malformed request must not fail the others — retry them one by one
+            for item in batch:
+                item["result"] = None
+                try:
+                    item["result"] = predict_batch(item["requests"], skip_missing=True, scaled=item["scaled"])
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    item["error"] = e
+                item["done"].set()
+            return
+
+        for item, bid, start, count, single in slots:
+            if bid in out[item["scaled"]]:
+                res = out[item["scaled"]][bid][start:start + count]
+                item["result"][bid] = res[0] if single else res
+        for item in batch:
+            item["done"].set()
+
+    def close(self):
+        with self.cond:
+            self.closing = True
+            self.cond.notify_all()
+        self.thread.join(5.0)
+
+
+def _parse_input(value):
+    """JSON request value → predict_batch input (dict frame, list of frames, or window array)."""
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        return value
+    X = np.asarray(value, dtype=np.float32)
+    return X[None] if X.ndim == 2 else X
+
+
+class PredictHandler(BaseHTTPRequestHandler):
+    batcher = None   # set by serve()
+    online  = None
+
+    def _send(self, code, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = metrics.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            return self.wfile.write(body)
+        if self.path == "/health":
+            return self._send(200, {"status": "ok", "models": sorted(_loaded), **self.batcher.stats})
+        if self.path == "/predictions":
+            start = time.perf_counter()
+            try:
+                latest = latest_telemetry(discover_buildings())
+                preds  = self.batcher.submit(latest) if latest else {}
+            except TimeoutError as e:
+                return self._send(503, {"error": str(e)})
+            except Exception as e:
+                return self._send(500, {"error": str(e)})
+            REQUEST_SECONDS.observe(time.perf_counter() - start, route="/predictions")
+            return self._send(200, {"predictions": preds,
+                                    "latency_ms": round((time.perf_counter() - start) * 1000, 2)})
+        self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path not in ("/predict", "/observe"):
+            return self._send(404, {"error": "not found"})
+        start = time.perf_counter()
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path == "/observe":
+                payloads = body if isinstance(body, list) else [body]
+                for p in payloads:
+                    self.online.observe(p)
+                requests = {p["building_id"]: None for p in payloads}
+                preds = self.batcher.submit(self.online.windows(list(requests)), scaled=True)
+                preds = {bid: res[0] for bid, res in preds.items()}
+            else:
+                requests = {bid: _parse_input(v) for bid, v in body.get("buildings", {}).items()}
+                preds = self.batcher.submit(requests)
+        except TimeoutError as e:
+            return self._send(503, {"error": str(e)})
+        except Exception as e:
+            return self._send(400, {"error": str(e)})
+        REQUEST_SECONDS.observe(time.perf_counter() - start, route=self.path)
+        self._send(200, {"predictions": preds,
+                         "missing":     sorted(set(requests) - set(preds)),
+                         "latency_ms":  round((time.perf_counter() - start) * 1000, 2)})
+
+    def log_message(self, *args):
+        pass   # one line per request is too chatty at fleet rates
+
+
+def serve(host="127.0.0.1", port=SERVE_PORT, latency_budget=LATENCY_BUDGET, reload_seconds=RELOAD_SECONDS):
+    """Run the inference daemon until interrupted. Known buildings are warmed up front."""
+    manifest = load_manifest(MODEL_DIR)
+    for bid in discover_buildings():
+        try:
+            load_building(bid, manifest)
+        except Exception as e:
+            print(f"[predict] WARNING: {bid} not loaded — {e}")
+    # One dummy pass per model so the first real request doesn't pay for tracing
+    if _models:
+        predict_batch({bid: np.zeros((1, WINDOW_IN, len(FEATURES)), dtype=np.float32)
+                       for bid in {id(m): bid for bid, m in _models.items()}.values()})
+
+    PredictHandler.batcher = MicroBatcher(latency_budget, PREDICT_BATCH, reload_seconds)
+    PredictHandler.online  = OnlinePredictor()
+    server = ThreadingHTTPServer((host, port), PredictHandler)
+    server.daemon_threads = True
+    print(f"[predict] serving {len(_models)} buildings on http://{host}:{port} "
+          f"(latency budget {latency_budget * 1000:.1f} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        PredictHandler.batcher.close()
 
 
 if __name__ == "__main__":
-    for bid in ["B1", "B2", "B3", "B4", "B5"]:
-        df     = pd.read_csv(f"data/{bid}.csv")
-        result = predict_building(bid, df.tail(60))
-        print(f"{bid}: net={result['predicted_net_kwh']:.3f}  deficit_prob={result['deficit_probability']:.3f}")
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Building deficit / net-energy predictions")
+    parser.add_argument("--serve", action="store_true", help="run the inference daemon")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_BUDGET * 1000,
+                        help="how long a micro-batch waits for more requests")
+    parser.add_argument("--reload-seconds", type=float, default=RELOAD_SECONDS)
+    parser.add_argument("--backend", choices=["numpy", "keras"], default=BACKEND,
+                        help="inference engine (numpy needs no TensorFlow)")
+    parser.add_argument("--backtest", nargs="*", metavar="BID",
+                        help="score the full history of these buildings (default: all)")
+    parser.add_argument("--model", help="backtest every building with this model file, e.g. models/global_model.keras")
+    parser.add_argument("--stride", type=int, default=1, help="backtest every n-th window")
+    parser.add_argument("--report", help="also write the backtest report as JSON")
+    parser.add_argument("--check", nargs="*", metavar="BID",
+                        help="backtest a scratch CSV with truncated rows for these buildings (default: all); exit 1 on failure")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    BACKEND = args.backend
+    snapshots = metrics.start_from_args(args)
+
+    if args.check is not None:
+        failed = [f for bid in args.check or discover_buildings() for f in check_backtest(bid)]
+        raise SystemExit(1 if failed else 0)
+    elif args.backtest is not None:
+        report = backtest(args.backtest, args.model, args.stride)
+        print_backtest(report)
+        if args.report:
+            with open(args.report, "w") as f:
+                json.dump(report, f, indent=2)
+    elif args.serve:
+        serve(args.host, args.port, args.latency_ms / 1000, args.reload_seconds)
+    else:
+        latest = latest_telemetry(discover_buildings() or ["B1", "B2", "B3", "B4", "B5"])
+        # One forward pass per distinct model
+        for bid, result in predict_batch(latest, skip_missing=True).items():
+            print(f"{bid}: net={result['predicted_net_kwh']:.3f}  deficit_prob={result['deficit_probability']:.3f}")
+
+    if snapshots is not None:
+        snapshots.close()
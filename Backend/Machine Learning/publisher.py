@@ -0,0 +1,298 @@
+"""
+publisher.py — Telemetry Publisher
+─────────────────────────────────────────────────────────
+Decouples the simulation loop from the HTTP POSTs to SERVER_URLS.
+
+publish() never blocks: each endpoint has its own bounded queue and
+worker thread with a pooled keep-alive session. Workers drain the queue
+into batched payloads (a JSON array of tick dicts, accepted by the
+server's /update route) and POST them.
+
+Backpressure: when an endpoint's queue is full the OLDEST ticks are
+dropped (the newest telemetry is the most useful) and counted.
+Retries:      a failed batch is retried up to max_retries times, then
+              dropped. The backoff belongs to the endpoint, not the batch:
+              it doubles on every failed attempt up to max_backoff and
+              resets on the first success, so a dead endpoint is polled
+              ever less often. Other endpoints are unaffected.
+Rejections:   a 4xx response means the server refused the batch, so it is
+              dropped at once instead of retried.
+
+Per-URL POST latency, failures, sent/dropped ticks and backlog are
+recorded in metrics.REGISTRY (label url=…).
+
+Usage:
+    pub = TelemetryPublisher(SERVER_URLS)
+    pub.publish(payload)          # from any thread, any rate
+    pub.close()                   # flush what's left and stop workers
+
+Check the drop / retry / backoff behaviour against a local stub server:
+    python publisher.py check
+"""
+
+import collections, sys, threading, time
+import requests
+from requests.adapters import HTTPAdapter
+import metrics
+
+POST_SECONDS  = metrics.histogram("publisher_post_seconds", "POST attempt latency per endpoint")
+POST_FAILURES = metrics.counter("publisher_post_failures_total", "Failed POST attempts per endpoint")
+TICKS_SENT    = metrics.counter("publisher_ticks_sent_total", "Ticks delivered per endpoint")
+TICKS_DROPPED = metrics.counter("publisher_ticks_dropped_total", "Ticks dropped (queue full or retries exhausted)")
+BACKLOG       = metrics.gauge("publisher_backlog", "Ticks waiting in an endpoint's queue")
+
+
+class _Endpoint:
+    """One URL: bounded queue + worker thread + keep-alive session."""
+
+    def __init__(self, url, max_queue, batch_size, flush_interval,
+                 timeout, max_retries, backoff, max_backoff, log):
+        self.url            = url
+        self.max_queue      = max_queue
+        self.batch_size     = batch_size
+        self.flush_interval = flush_interval
+        self.timeout        = timeout
+        self.max_retries    = max_retries
+        self.backoff        = backoff
+        self.max_backoff    = max_backoff
+        self.delay          = backoff       # current backoff; grows while down, reset on success
+        self.log            = log
+
+        self.session = requests.Session()
+        self.session.mount("http://",  HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+
+        self.queue   = collections.deque()
+        self.cond    = threading.Condition()
+        self.closing = False
+        self.down    = False
+        self.refused = False
+        self.stats   = {"queued": 0, "sent": 0, "dropped": 0, "batches": 0,
+                        "failed_batches": 0, "rejected_batches": 0, "retries": 0}
+
+        self.thread = threading.Thread(target=self._run, name=f"publisher[{url}]", daemon=True)
+        self.thread.start()
+
+    def put(self, payloads):
+        with self.cond:
+            if self.closing:
+                return
+            for p in payloads:
+                if len(self.queue) >= self.max_queue:
+                    self.queue.popleft()
+                    self.stats["dropped"] += 1
+                    TICKS_DROPPED.inc(url=self.url)
+                self.queue.append(p)
+            self.stats["queued"] += len(payloads)
+            if len(self.queue) >= self.batch_size:
+                self.cond.notify()
+
+    def _next_batch(self):
+        """Wait until a full batch, flush_interval, or close — then take up to batch_size ticks."""
+        with self.cond:
+            deadline = time.monotonic() + self.flush_interval
+            while len(self.queue) < self.batch_size and not self.closing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            n = min(self.batch_size, len(self.queue))
+            batch = [self.queue.popleft() for _ in range(n)]
+            BACKLOG.set(len(self.queue), url=self.url)
+            return batch
+
+    def _post(self, batch):
+        """POST one batch. Returns True once delivered, False if dropped (rejected or retries exhausted)."""
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                status = self.session.post(self.url, json=batch, timeout=self.timeout).status_code
+            except requests.RequestException:
+                status = None
+            POST_SECONDS.observe(time.perf_counter() - start, url=self.url)
+            if status is not None and status < 400:
+                self.delay = self.backoff
+                if self.down:
+                    self.down = False
+                    self.log(f"  [publisher] ✅ Reconnected to {self.url}")
+                return True
+            POST_FAILURES.inc(url=self.url)
+            if status is not None and status < 500:
+                # The server is up but refuses this batch — resending it won't help
+                self._count(rejected_batches=1)
+                if not self.refused:
+                    self.refused = True
+                    self.log(f"  [publisher] ⚠ {self.url} rejected a batch (HTTP {status}); dropping rejected batches")
+                return False
+            # Only log once when the server first becomes unreachable
+            if not self.down:
+                self.down = True
+                self.log(f"  [publisher] ⚠ Server unreachable: {self.url} (suppressing further errors)")
+            delay, self.delay = self.delay, min(self.max_backoff, self.delay * 2)
+            if self.closing or attempt == self.max_retries:
+                return False          # drop now — the queue keeps filling while we wait
+            self._count(retries=1)
+            self._sleep(delay)
+        return False
+
+    def _count(self, **deltas):
+        """Bump stats under the lock — put() updates "dropped" from producer threads."""
+        with self.cond:
+            for key, n in deltas.items():
+                self.stats[key] += n
+
+    def _sleep(self, seconds):
+        """Back off, waking early if the publisher is closed."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.closing, seconds)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if self.closing:
+                    return
+                continue
+            self._count(batches=1)
+            if self._post(batch):
+                self._count(sent=len(batch))
+                TICKS_SENT.inc(len(batch), url=self.url)
+            else:
+                self._count(failed_batches=1, dropped=len(batch))
+                TICKS_DROPPED.inc(len(batch), url=self.url)
+
+    def close(self, timeout):
+        with self.cond:
+            self.closing = True
+            self.cond.notify()
+        self.thread.join(timeout)
+        self.session.close()
+
+
+class TelemetryPublisher:
+    """Fan-out publisher: one independent _Endpoint per URL."""
+
+    def __init__(self, urls, max_queue=10_000, batch_size=500, flush_interval=0.25,
+                 timeout=1.0, max_retries=3, backoff=0.5, max_backoff=30.0, log=print):
+        self.endpoints = {
+            url: _Endpoint(url, max_queue, batch_size, flush_interval,
+                           timeout, max_retries, backoff, max_backoff, log)
+            for url in urls
+        }
+
+    def publish(self, payload):
+        """Queue one tick dict for every endpoint. Never blocks on the network."""
+        self.publish_many([payload])
+
+    def publish_many(self, payloads):
+        """Queue a list of tick dicts (e.g. one per building for this sim_minute)."""
+        for ep in self.endpoints.values():
+            ep.put(payloads)
+
+    def down(self):
+        """URLs currently failing."""
+        return {url for url, ep in self.endpoints.items() if ep.down}
+
+    def stats(self):
+        """Per-URL counters: queued, sent, dropped, batches, failed_batches, rejected_batches, retries, backlog."""
+        out = {}
+        for url, ep in self.endpoints.items():
+            with ep.cond:
+                out[url] = {**ep.stats, "backlog": len(ep.queue), "down": ep.down, "backoff": ep.delay}
+        return out
+
+    def close(self, timeout=5.0):
+        """Flush remaining ticks (best effort within timeout) and stop workers."""
+        for ep in self.endpoints.values():
+            ep.close(timeout)
+
+
+def _stub_server():
+    """Local /update stub: /ok → 200, /reject → 400, /flaky → 503 on the first two POSTs, then 200."""
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    received = collections.Counter()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            ticks = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            received[self.path, "posts"] += 1
+            if self.path == "/reject":
+                code = 400
+            elif self.path == "/flaky" and received[self.path, "posts"] <= 2:
+                code = 503
+            else:
+                code = 200
+                received[self.path, "ticks"] += len(ticks)
+            self.send_response(code)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, received
+
+
+def check():
+    """Exercise delivery, retry, rejection, backoff and overflow. Returns the failed checks."""
+    import socket
+    server, received = _stub_server()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    with socket.socket() as s:            # a port nobody listens on
+        s.bind(("127.0.0.1", 0))
+        dead = f"http://127.0.0.1:{s.getsockname()[1]}/update"
+    urls = [f"{base}/ok", f"{base}/flaky", f"{base}/reject", dead]
+    pub = TelemetryPublisher(urls, batch_size=10, flush_interval=0.05, timeout=0.5,
+                             max_retries=2, backoff=0.05, max_backoff=0.2, log=lambda msg: None)
+    for i in range(30):
+        pub.publish({"sim_minute": i})
+    time.sleep(1.5)
+    stats = pub.stats()
+    pub.close(timeout=1.0)
+    server.shutdown()
+
+    ok, flaky, reject, down = (stats[u] for u in urls)
+    failed = []
+    for name, passed in [
+        ("ok: every tick delivered",           received["/ok", "ticks"] == 30 and ok["sent"] == 30),
+        ("flaky: delivered after retries",     flaky["sent"] == 30 and flaky["retries"] == 2),
+        ("flaky: backoff reset on success",    flaky["backoff"] == 0.05),
+        ("reject: dropped without retrying",   reject["rejected_batches"] == 3 and reject["retries"] == 0
+                                               and received["/reject", "posts"] == 3),
+        ("down: backoff capped at max_backoff", down["backoff"] == 0.2 and down["down"]),
+        ("down: batches dropped after retries", down["failed_batches"] >= 1),
+    ]:
+        print(f"  {'✅' if passed else '❌'} {name}")
+        if not passed:
+            failed.append(name)
+
+    # Out of retries: the batch is dropped at once, not after one more backoff
+    stall = TelemetryPublisher([dead], batch_size=1, flush_interval=0.01, timeout=0.5,
+                               max_retries=0, backoff=5.0, max_backoff=5.0, log=lambda msg: None)
+    stall.publish({"sim_minute": 0})
+    time.sleep(0.5)
+    passed = stall.stats()[dead]["failed_batches"] == 1
+    print(f"  {'✅' if passed else '❌'} down: no backoff after the last retry")
+    if not passed:
+        failed.append("no backoff after the last retry")
+    stall.close(timeout=1.0)
+
+    small = TelemetryPublisher([dead], max_queue=5, batch_size=100, flush_interval=60, log=lambda msg: None)
+    small.publish_many([{"sim_minute": i} for i in range(8)])
+    ep = small.endpoints[dead]
+    kept = [p["sim_minute"] for p in ep.queue]
+    passed = kept == [3, 4, 5, 6, 7] and ep.stats["dropped"] == 3
+    print(f"  {'✅' if passed else '❌'} overflow: oldest ticks dropped")
+    if not passed:
+        failed.append("overflow")
+    small.close(timeout=1.0)
+    return failed
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["check"]:
+        sys.exit(1 if check() else 0)
+    print(__doc__)
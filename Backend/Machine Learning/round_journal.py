@@ -0,0 +1,183 @@
+"""
+round_journal.py — Append-only FedAvg Round Log
+─────────────────────────────────────────────────────────
+Replaces rewriting the whole fedavg_log.json array every round.
+
+One JSON object per line (JSON Lines). append() writes a single line
+with one write() + fsync, so a round is either fully logged or not at
+all; a torn last line from a crash is trimmed the next time the journal
+is opened. When the active file passes max_bytes it is rotated to
+<path>.1, <path>.2, … (oldest dropped beyond `keep`).
+
+Readers never parse more than they need:
+    j = RoundJournal("models/fedavg_log.jsonl")
+    j.tail(10)                   # last 10 rounds, read backwards from EOF
+    j.building_history("B3")     # [(timestamp, weight, data_size), …]
+
+CLI:
+    python round_journal.py tail    models/fedavg_log.jsonl 5
+    python round_journal.py history models/fedavg_log.jsonl B3
+    python round_journal.py migrate models/fedavg_log.json  models/fedavg_log.jsonl
+"""
+
+import os, sys, json
+
+MAX_BYTES = 8 * 1024 * 1024   # rotate the active file beyond ~8 MB
+KEEP      = 10                # rotated files kept
+BLOCK     = 64 * 1024         # backwards-read block size
+
+
+class RoundJournal:
+
+    def __init__(self, path, max_bytes=MAX_BYTES, keep=KEEP):
+        self.path      = path
+        self.max_bytes = max_bytes
+        self.keep      = keep
+        self._repair()
+
+    # ── Writing ───────────────────────────────────────────────
+
+    def _repair(self):
+        """Trim a partial trailing line left by a crash mid-append."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            pos = size
+            while pos > 0:
+                step = min(BLOCK, pos)
+                pos -= step
+                f.seek(pos)
+                nl = f.read(step).rfind(b"\n")
+                if nl != -1:
+                    f.truncate(pos + nl + 1)
+                    return
+            f.truncate(0)
+
+    def _rotate(self):
+        for i in range(self.keep - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+        stale = f"{self.path}.{self.keep + 1}"
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    def append(self, entry):
+        self.extend([entry])
+
+    def extend(self, entries):
+        """Append several entries with one write + fsync."""
+        line = b"".join((json.dumps(e, separators=(",", ":")) + "\n").encode() for e in entries)
+        if not line:
+            return
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+            self._rotate()
+        with open(self.path, "ab") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    # ── Reading ───────────────────────────────────────────────
+
+    def files(self):
+        """Journal files, newest first."""
+        out = [self.path] if os.path.exists(self.path) else []
+        i = 1
+        while os.path.exists(f"{self.path}.{i}"):
+            out.append(f"{self.path}.{i}")
+            i += 1
+        return out
+
+    @staticmethod
+    def _lines_backwards(path):
+        """Yield raw lines of one file from last to first, reading fixed-size blocks from EOF."""
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            pos, rest = f.tell(), b""
+            while pos > 0:
+                step = min(BLOCK, pos)
+                pos -= step
+                f.seek(pos)
+                parts = (f.read(step) + rest).split(b"\n")
+                rest = parts[0]
+                for line in reversed(parts[1:]):
+                    if line.strip():
+                        yield line
+            if rest.strip():
+                yield rest
+
+    def iter_lines(self, reverse=False):
+        """Raw JSON lines across all files — oldest first, or newest first if reverse."""
+        if reverse:
+            for path in self.files():
+                yield from self._lines_backwards(path)
+        else:
+            for path in reversed(self.files()):
+                with open(path, "rb") as f:
+                    for line in f:
+                        if line.strip():
+                            yield line
+
+    def __iter__(self):
+        return (json.loads(line) for line in self.iter_lines())
+
+    def tail(self, n):
+        """Last n rounds, oldest first."""
+        out = []
+        for line in self.iter_lines(reverse=True):
+            if len(out) >= n:
+                break
+            out.append(json.loads(line))
+        return out[::-1]
+
+    def building_history(self, building_id, last=None):
+        """
+        [(timestamp, weight, data_size)] for every round building_id took
+        part in, oldest first. Lines not mentioning the ID aren't parsed.
+        """
+        needle, out = f'"{building_id}"'.encode(), []
+        for line in self.iter_lines(reverse=True):
+            if last is not None and len(out) >= last:
+                break
+            if needle not in line:
+                continue
+            e = json.loads(line)
+            if building_id in e.get("weights", {}):
+                out.append((e.get("timestamp"), e["weights"][building_id],
+                            e.get("data_sizes", {}).get(building_id)))
+        return out[::-1]
+
+
+def migrate_json_log(json_path, journal):
+    """One-off import of a legacy fedavg_log.json array. Returns rounds imported."""
+    with open(json_path) as f:
+        entries = json.load(f)
+    journal.extend(entries)
+    return len(entries)
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "tail" and len(sys.argv) >= 3:
+        n = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+        for e in RoundJournal(sys.argv[2]).tail(n):
+            print(json.dumps(e))
+    elif cmd == "history" and len(sys.argv) >= 4:
+        for ts, w, size in RoundJournal(sys.argv[2]).building_history(sys.argv[3]):
+            print(f"{ts}  weight={w:.6f}  rows={size}")
+    elif cmd == "migrate" and len(sys.argv) >= 4:
+        n = migrate_json_log(sys.argv[2], RoundJournal(sys.argv[3]))
+        print(f"Imported {n} rounds → {sys.argv[3]}")
+    else:
+        print(__doc__)
@@ -0,0 +1,333 @@
+"""
+telemetry_store.py — Columnar Telemetry Store
+─────────────────────────────────────────────────────────
+Append-optimized replacement for the per-building CSV files.
+
+Layout (one directory per building):
+    store/B1/index.json              row count + per-segment sim_minute range
+    store/B1/seg_00000/<column>.bin  raw little-endian column, one file per column
+    store/B1/seg_00001/...
+
+Writes are group-committed: rows are buffered in memory and appended to
+the column files in one go every commit_rows rows, then index.json is
+atomically replaced. The index is the source of truth — bytes past the
+committed row count (a crash mid-commit) are truncated, and segment
+directories the index doesn't list are removed, on the next open.
+
+Reads are memory-mapped: segments() yields zero-copy np.memmap columns,
+read()/tail() only copy when a request spans several segments.
+
+Convert existing CSVs:
+    python telemetry_store.py convert data store
+"""
+
+import os, sys, json, shutil
+import numpy as np
+
+STORE_DIR = "store"
+
+# Column order/names match the CSV written by generator.run_building
+COLUMNS = {
+    "sim_minute":        "<i8",
+    "hour_of_day":       "<f8",
+    "solar_output_kw":   "<f8",
+    "consumption_kw":    "<f8",
+    "battery_level_kwh": "<f8",
+    "net_flow_kw":       "<f8",
+    "time_sin":          "<f8",
+    "time_cos":          "<f8",
+    "is_deficit":        "<i1",
+}
+
+SEGMENT_ROWS = 1 << 18   # ~262k rows (~2 MB per float column) before starting a new segment
+COMMIT_ROWS  = 1440      # one simulated day per group commit
+
+
+def _write_json_atomic(path, obj):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class TelemetryStore:
+    """Read side + writer factory for a store root directory."""
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+
+    def _dir(self, building_id):
+        return os.path.join(self.root, building_id)
+
+    def _index_path(self, building_id):
+        return os.path.join(self._dir(building_id), "index.json")
+
+    def has(self, building_id):
+        return os.path.exists(self._index_path(building_id))
+
+    def buildings(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(b for b in os.listdir(self.root) if self.has(b))
+
+    def drop(self, building_id):
+        """Delete all of a building's telemetry."""
+        shutil.rmtree(self._dir(building_id), ignore_errors=True)
+
+    def index(self, building_id):
+        with open(self._index_path(building_id)) as f:
+            return json.load(f)
+
+    def num_rows(self, building_id):
+        """Committed row count — O(1), no data is read."""
+        return self.index(building_id)["rows"]
+
+    def _columns(self, columns):
+        columns = list(COLUMNS) if columns is None else list(columns)
+        unknown = [c for c in columns if c not in COLUMNS]
+        if unknown:
+            raise KeyError(f"Unknown telemetry columns: {unknown}")
+        return columns
+
+    def segments(self, building_id, columns=None):
+        """Yield one {column: np.memmap} dict per non-empty segment (zero-copy, read-only)."""
+        columns = self._columns(columns)
+        index = self.index(building_id)
+        for seg in index["segments"]:
+            if seg["rows"] == 0:
+                continue
+            seg_dir = os.path.join(self._dir(building_id), seg["name"])
+            yield {
+                c: np.memmap(os.path.join(seg_dir, f"{c}.bin"), dtype=COLUMNS[c],
+                             mode="r", shape=(seg["rows"],))
+                for c in columns
+            }
+
+    def read(self, building_id, columns=None, start_minute=None, end_minute=None):
+        """
+        {column: array} for all committed rows, optionally restricted to
+        start_minute <= sim_minute < end_minute. Single-segment reads
+        without a range return the memmaps themselves.
+        """
+        columns = self._columns(columns)
+        need    = columns if start_minute is None and end_minute is None else \
+                  list(dict.fromkeys(columns + ["sim_minute"]))
+        index   = self.index(building_id)
+
+        parts = []
+        for seg, cols in zip([s for s in index["segments"] if s["rows"]],
+                             self.segments(building_id, need)):
+            if start_minute is not None and seg["max_minute"] < start_minute:
+                continue
+            if end_minute is not None and seg["min_minute"] >= end_minute:
+                continue
+            if start_minute is not None or end_minute is not None:
+                m = cols["sim_minute"]
+                mask = np.ones(len(m), dtype=bool)
+                if start_minute is not None: mask &= m >= start_minute
+                if end_minute is not None:   mask &= m < end_minute
+                cols = {c: cols[c][mask] for c in columns}
+            parts.append(cols)
+
+        if not parts:
+            return {c: np.empty(0, dtype=COLUMNS[c]) for c in columns}
+        if len(parts) == 1:
+            return {c: parts[0][c] for c in columns}
+        return {c: np.concatenate([p[c] for p in parts]) for c in columns}
+
+    def read_frame(self, building_id, columns=None, **kwargs):
+        """read() as a pandas DataFrame (copies into pandas-owned memory)."""
+        import pandas as pd
+        return pd.DataFrame(self.read(building_id, columns, **kwargs))
+
+    def tail(self, building_id, n, columns=None):
+        """Last n committed rows — touches only the segments that hold them."""
+        columns = self._columns(columns)
+        parts, left = [], n
+        segs = list(self.segments(building_id, columns))
+        for cols in reversed(segs):
+            if left <= 0:
+                break
+            rows = len(cols[columns[0]])
+            take = min(rows, left)
+            parts.append({c: cols[c][rows - take:] for c in columns})
+            left -= take
+        if not parts:
+            return {c: np.empty(0, dtype=COLUMNS[c]) for c in columns}
+        parts.reverse()
+        if len(parts) == 1:
+            return parts[0]
+        return {c: np.concatenate([p[c] for p in parts]) for c in columns}
+
+    def writer(self, building_id, commit_rows=COMMIT_ROWS, segment_rows=SEGMENT_ROWS, fsync=False):
+        return TelemetryWriter(self, building_id, commit_rows, segment_rows, fsync)
+
+
+class TelemetryWriter:
+    """
+    Group-committing appender for one building. Not thread-safe; one
+    writer per building at a time. Use as a context manager or call
+    close() so the final partial group is committed.
+    """
+
+    def __init__(self, store, building_id, commit_rows=COMMIT_ROWS, segment_rows=SEGMENT_ROWS, fsync=False):
+        self.store        = store
+        self.building_id  = building_id
+        self.commit_rows  = commit_rows
+        self.segment_rows = segment_rows
+        self.fsync        = fsync
+        self.dir          = store._dir(building_id)
+        self._chunks      = []   # pending {column: array} chunks, in append order
+        self._rows        = []   # pending single rows (packed into a chunk lazily)
+        self._buffered    = 0
+
+        os.makedirs(self.dir, exist_ok=True)
+        if store.has(building_id):
+            self.index = store.index(building_id)
+        else:
+            self.index = {"columns": COLUMNS, "rows": 0, "segments": []}
+            _write_json_atomic(store._index_path(building_id), self.index)
+        self._truncate_uncommitted()
+
+    def _truncate_uncommitted(self):
+        """
+        Drop everything written after the last committed index (crash
+        recovery): bytes past each segment's row count, and segment
+        directories a crashed first commit or rollover left unindexed.
+        """
+        indexed = {seg["name"]: seg for seg in self.index["segments"]}
+        for name in os.listdir(self.dir):
+            if name.startswith("seg_") and name not in indexed:
+                shutil.rmtree(os.path.join(self.dir, name), ignore_errors=True)
+        for seg in indexed.values():
+            seg_dir = os.path.join(self.dir, seg["name"])
+            for c, dt in COLUMNS.items():
+                path = os.path.join(seg_dir, f"{c}.bin")
+                size = seg["rows"] * np.dtype(dt).itemsize
+                if os.path.exists(path) and os.path.getsize(path) > size:
+                    with open(path, "r+b") as f:
+                        f.truncate(size)
+
+    @property
+    def last_minute(self):
+        """sim_minute of the last committed-or-buffered row, or None."""
+        if self._rows:
+            return int(self._rows[-1]["sim_minute"])
+        if self._chunks:
+            return int(self._chunks[-1]["sim_minute"][-1])
+        segs = [s for s in self.index["segments"] if s["rows"]]
+        return segs[-1]["last_minute"] if segs else None
+
+    def append(self, row):
+        """Buffer one row — a dict keyed by column, or a sequence in COLUMNS order."""
+        if not isinstance(row, dict):
+            row = dict(zip(COLUMNS, row))
+        self._rows.append(row)
+        self._buffered += 1
+        if self._buffered >= self.commit_rows:
+            self.commit()
+
+    def _pack_rows(self):
+        if self._rows:
+            self._chunks.append({c: np.array([r[c] for r in self._rows], dtype=dt)
+                                 for c, dt in COLUMNS.items()})
+            self._rows = []
+
+    def append_columns(self, cols):
+        """Buffer many rows at once: {column: 1-D array-like}, all the same length."""
+        self._pack_rows()
+        chunk = {c: np.asarray(cols[c], dtype=dt) for c, dt in COLUMNS.items()}
+        n = len(chunk["sim_minute"])
+        for c, arr in chunk.items():
+            if len(arr) != n:
+                raise ValueError(f"Column {c} has {len(arr)} rows, expected {n}")
+        self._chunks.append(chunk)
+        self._buffered += n
+        if self._buffered >= self.commit_rows:
+            self.commit()
+
+    def commit(self):
+        """Append all buffered rows to the column files, then publish the new index."""
+        if not self._buffered:
+            return
+        self._pack_rows()
+        data = {c: np.concatenate([ch[c] for ch in self._chunks]) for c in COLUMNS}
+        self._chunks = []
+        self._buffered = 0
+
+        pos, total = 0, len(data["sim_minute"])
+        while pos < total:
+            segs = self.index["segments"]
+            if not segs or segs[-1]["rows"] >= self.segment_rows:
+                segs.append({"name": f"seg_{len(segs):05d}", "rows": 0,
+                             "min_minute": None, "max_minute": None, "last_minute": None})
+            seg = segs[-1]
+            take = min(total - pos, self.segment_rows - seg["rows"])
+            seg_dir = os.path.join(self.dir, seg["name"])
+            os.makedirs(seg_dir, exist_ok=True)
+            mode = "wb" if seg["rows"] == 0 else "ab"   # a new segment never inherits stray bytes
+
+            for c, arr in data.items():
+                with open(os.path.join(seg_dir, f"{c}.bin"), mode) as f:
+                    f.write(arr[pos:pos + take].tobytes())
+                    if self.fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+
+            minutes = data["sim_minute"][pos:pos + take]
+            lo, hi = int(minutes.min()), int(minutes.max())
+            seg["min_minute"]  = lo if seg["min_minute"] is None else min(seg["min_minute"], lo)
+            seg["max_minute"]  = hi if seg["max_minute"] is None else max(seg["max_minute"], hi)
+            seg["last_minute"] = int(minutes[-1])
+            seg["rows"] += take
+            self.index["rows"] += take
+            pos += take
+
+        _write_json_atomic(self.store._index_path(self.building_id), self.index)
+
+    def close(self):
+        self.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def convert_csv(csv_path, store, building_id=None, chunk_rows=100_000):
+    """
+    Append a generator CSV into the store (chunked, constant memory).
+    Truncated/corrupt rows (any missing field) are skipped and counted.
+    Returns (rows_written, rows_skipped).
+    """
+    import pandas as pd
+    building_id = building_id or os.path.splitext(os.path.basename(csv_path))[0]
+    written = skipped = 0
+    with store.writer(building_id, commit_rows=chunk_rows) as w:
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_rows, on_bad_lines="skip"):
+            clean = chunk[list(COLUMNS)].apply(pd.to_numeric, errors="coerce").dropna()
+            skipped += len(chunk) - len(clean)
+            w.append_columns({c: clean[c].to_numpy() for c in COLUMNS})
+            written += len(clean)
+    return written, skipped
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "convert":
+        src = sys.argv[2] if len(sys.argv) > 2 else "data"
+        dst = sys.argv[3] if len(sys.argv) > 3 else STORE_DIR
+        store = TelemetryStore(dst)
+        for name in sorted(os.listdir(src)):
+            if not name.endswith(".csv"):
+                continue
+            bid = name[:-4]
+            if store.has(bid):
+                print(f"  [{bid}] SKIP — already in {dst}/")
+                continue
+            written, skipped = convert_csv(os.path.join(src, name), store, bid)
+            print(f"  [{bid}] {written:,} rows → {dst}/{bid}/  ({skipped} bad rows skipped)")
+    else:
+        print("usage: python telemetry_store.py convert [csv_dir] [store_dir]")
@@ -1,12 +1,20 @@
 import os
-import sys
+import io
 import json
+import time
+import threading
+import itertools
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import pandas as pd
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers
-from sklearn.model_selection import train_test_split
+from telemetry_store import TelemetryStore, STORE_DIR
+from model_registry import resolve_model_path, load_manifest, file_stamp, GLOBAL_WEIGHTS
+from weight_codec import CODECS, read_tensors, write_update
+import metrics
+import window_cache
 import warnings
 warnings.filterwarnings("ignore")
 
@@ -30,9 +38,112 @@ BATCH_SIZE = 64
 TEST_SPLIT = 0.15
 LEARNING_RATE = 0.001
 
+FIT_VERBOSE = 1               # Keras progress bars; parallel workers switch to 2 (one line/epoch)
+
+# Streaming mode (train_building_streaming) — memory is bounded by these, not by history length
+STREAM_CHUNK_ROWS = 8192      # telemetry rows read per chunk
+STREAM_SHARDS = 4             # contiguous window ranges interleaved in parallel
+SHUFFLE_BUFFER = 10_000       # windows held for shuffling (~12 MB)
+
+# Incremental mode (train_building_incremental) — fine-tune on rows added since the last run
+INCREMENTAL_EPOCHS = 5
+INCREMENTAL_LR = LEARNING_RATE * 0.1
+REPLAY_FRACTION = 0.2         # replayed older windows, as a fraction of the new windows
+REPLAY_BLOCKS = 4             # replay is read as this many random contiguous blocks
+
+# Metrics (see metrics.py) — ALL mode merges each worker's values into the parent
+WINDOW_SECONDS = metrics.histogram("train_windowing_seconds", "create_windows time per call")
+WINDOWS_TOTAL  = metrics.counter("train_windows_total", "Windows produced by create_windows")
+EPOCH_SECONDS  = metrics.histogram("train_epoch_seconds", "Wall time per training epoch")
+TRAIN_SECONDS  = metrics.histogram("train_building_seconds", "Wall time per building (mode=…)")
+TRAIN_RUNS     = metrics.counter("train_runs_total", "Training runs by mode and outcome")
+PREP_SECONDS   = metrics.histogram("train_preprocess_seconds", "Load + normalize + window (cache=hit|miss|off)")
+
+def atomic_save(path, write):
+    """
+    write(tmp_path) then os.replace onto path, so readers (predict,
+    fedavg, a parallel worker) never see a half-written file. The temp
+    name keeps path's suffix because Keras checks .keras / .weights.h5.
+    """
+    folder, name = os.path.split(path)
+    stem, suffix = name.split(".", 1)
+    tmp = os.path.join(folder, f"{stem}.tmp-{os.getpid()}.{suffix}")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def write_norm_params(building_id, norm_params, version = None):
+    """Current params → *_norm.json; version=N archives them as *_norm.v<N>.json."""
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    name = f"{building_id}_norm.json" if version is None else f"{building_id}_norm.v{version}.json"
+    norm_path = os.path.join(MODEL_DIR, name)
+
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(norm_params, f, indent=2)
+    atomic_save(norm_path, write)
+    return norm_path
+
+
+def load_train_state(building_id):
+    """What the last training run consumed — see write_train_state."""
+    state_path = os.path.join(MODEL_DIR, f"{building_id}_train_state.json")
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path) as f:
+        return json.load(f)
+
+
+def global_round():
+    """FedAvg round of the current global model (0 before the first round)."""
+    return (load_manifest(MODEL_DIR) or {}).get("round", 0)
+
+
+def write_train_state(building_id, rows_consumed, last_sim_minute, norm_version, mode, base_round = 0):
+    """
+    rows_consumed is the row offset incremental runs resume from (sim_minute
+    can restart inside a CSV, the row order cannot); norm_version changes
+    whenever *_norm.json changes scale, older versions are kept as
+    *_norm.v<N>.json. base_round is the FedAvg round current when training
+    started — the aggregator discounts updates by how far behind it they are.
+    """
+    state = {
+        "rows_consumed":   int(rows_consumed),
+        "last_sim_minute": int(last_sim_minute),
+        "norm_version":    int(norm_version),
+        "mode":            mode,
+        "base_round":      int(base_round),
+        "updated":         time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(state, f, indent=2)
+    atomic_save(os.path.join(MODEL_DIR, f"{building_id}_train_state.json"), write)
+    return state
+
+
+def next_norm_version(building_id):
+    """Archive the current *_norm.json under its version and return the next version number."""
+    state = load_train_state(building_id)
+    if state is None:
+        return 1
+    old = load_norm_params(building_id)
+    if old is not None:
+        write_norm_params(building_id, old, version = state["norm_version"])
+    return state["norm_version"] + 1
+
+
 def load_buiding_data(building_id):
-    csv_path = os.path.join(DATA_DIR,f"{building_id}.csv")
-    df = pd.read_csv(csv_path)
+    # Prefer the columnar store (memory-mapped, no parsing); fall back to CSV
+    store = TelemetryStore(STORE_DIR)
+    if store.has(building_id):
+        df = store.read_frame(building_id)
+    else:
+        # Same valid-row rule as iter_row_chunks, so every mode counts rows alike
+        csv_path = os.path.join(DATA_DIR,f"{building_id}.csv")
+        df = pd.read_csv(csv_path, usecols=STREAM_COLUMNS, on_bad_lines="skip")
+        df = df.apply(pd.to_numeric, errors="coerce").dropna().reset_index(drop=True)
     print(f"Loaded {building_id}: {len(df):,} rows, {len(df)/1440:.1f} simulated days")
 
     return df
@@ -57,40 +168,68 @@ def normalize_features(df,features,building_id):
         norm_params[feat] = {"min": feat_min, "max": feat_max}
         print(f"  {feat:25s}  min={feat_min:.6f}  max={feat_max:.6f}")
 
-    os.makedirs(MODEL_DIR, exist_ok=True)
-    norm_path = os.path.join(MODEL_DIR, f"{building_id}_norm.json")
-    with open(norm_path, "w") as f:
-        json.dump(norm_params, f, indent=2)
-
+    norm_path = write_norm_params(building_id, norm_params)
     print(f"  Saved normalization params → {norm_path}")
     return scaled_data, norm_params
     
 
 
 def create_windows(scaled_features,df,window_in = WINDOW_IN,window_out = WINDOW_OUT):
-    net_flow = df["net_flow_kw"].values
-    is_deficit = df["is_deficit"].values
-
-    num_samples = len(df)-window_in - window_out + 1
-    num_features = scaled_features.shape[1]
+    """
+    X is a read-only strided view of scaled_features with shape
+    (N, window_in, num_features) — no window is copied. Labels come from
+    the same kind of view over the future window_out rows, reduced in one
+    vectorized pass (same per-window summation order as a slice .sum(),
+    so values are bit-identical to the old per-sample loop).
+    """
+    start = time.perf_counter()
+    net_flow = np.asarray(df["net_flow_kw"])   # DataFrame or {column: array}
+    is_deficit = np.asarray(df["is_deficit"])
 
-    X = np.zeros((num_samples,window_in,num_features),dtype = np.float32)
-    y_net = np.zeros(num_samples,dtype = np.float32)
-    y_def = np.zeros(num_samples,dtype = np.float32)
-    
-    for i in range(num_samples):
-        X[i] = scaled_features[i:i+window_in]
+    num_samples = len(net_flow)-window_in - window_out + 1
 
-        future_start = i+window_in
-        future_end = future_start + window_out
+    X = sliding_window_view(scaled_features,window_in,axis = 0)[:num_samples].transpose(0,2,1)
 
-        y_net[i] = net_flow[future_start:future_end].sum()
+    future_net = sliding_window_view(net_flow,window_out)[window_in:window_in+num_samples]
+    future_def = sliding_window_view(is_deficit,window_out)[window_in:window_in+num_samples]
 
-        y_def[i] = float(is_deficit[future_start:future_end].max())
+    y_net = future_net.sum(axis = 1).astype(np.float32)
+    y_def = future_def.max(axis = 1).astype(np.float32)
 
+    WINDOW_SECONDS.observe(time.perf_counter() - start)
+    WINDOWS_TOTAL.inc(max(0, num_samples))
     return X,y_net,y_def
 
 
+class WindowBatches(keras.utils.PyDataset):
+    """Materializes windows from the create_windows view one batch at a time."""
+
+    def __init__(self, X, y_net, y_def, batch_size = BATCH_SIZE, shuffle = False, **kwargs):
+        super().__init__(**kwargs)
+        self.X, self.y_net, self.y_def = X, y_net, y_def
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.order = np.arange(len(X))
+        if shuffle:
+            np.random.shuffle(self.order)
+
+    def __len__(self):
+        return int(np.ceil(len(self.order) / self.batch_size))
+
+    def __getitem__(self, idx):
+        sel = self.order[idx*self.batch_size:(idx+1)*self.batch_size]
+        if not self.shuffle:
+            sel = slice(sel[0], sel[-1]+1)
+        return (
+            np.ascontiguousarray(self.X[sel]),
+            {"net_kwh": self.y_net[sel], "deficit_prob": self.y_def[sel]},
+        )
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            np.random.shuffle(self.order)
+
+
 
 def build_model(window_in, num_features):
     inputs = keras.Input(shape = (window_in,num_features), name = "input_window")
@@ -128,19 +267,23 @@ def build_model(window_in, num_features):
     return model
 
 
-def train_building(building_id):
-    df = load_buiding_data(building_id)
-    scaled,norm_params = normalize_features(df,FEATURES,building_id)
-    X,y_net,y_def = create_windows(scaled,df)
+class EpochTimer(keras.callbacks.Callback):
+    """Records each epoch's wall time in train_epoch_seconds."""
 
-    split_idx = int(len(X)*(1-TEST_SPLIT))
-    X_train, X_test = X[:split_idx], X[split_idx:]
-    y_net_train, y_net_test = y_net[:split_idx], y_net[split_idx:]
-    y_def_train, y_def_test = y_def[:split_idx], y_def[split_idx:]
+    def __init__(self, building_id = None):
+        super().__init__()
+        self.labels = {"building": building_id} if building_id else {}
 
-    model = build_model(WINDOW_IN,len(FEATURES))
+    def on_epoch_begin(self, epoch, logs = None):
+        self.start = time.perf_counter()
 
-    callbacks = [
+    def on_epoch_end(self, epoch, logs = None):
+        EPOCH_SECONDS.observe(time.perf_counter() - self.start, **self.labels)
+
+
+def training_callbacks(building_id = None):
+    return [
+        EpochTimer(building_id),
         keras.callbacks.EarlyStopping(
             monitor="val_loss",
             patience=5,               # stop if no improvement for 5 epochs
@@ -156,46 +299,548 @@ def train_building(building_id):
         ),
     ]
 
+
+def report_and_save(model, building_id, results, codec = None):
+    """
+    results is model.evaluate(..., return_dict=True). Returns the summary
+    metrics. With a codec, also publishes a compressed update for FedAvg.
+    """
+    scores = {
+        "mae":      float(results["net_kwh_mae"]),
+        "accuracy": float(results["deficit_prob_accuracy"]),
+    }
+    print(f"  Net energy MAE:      {scores['mae']:.4f} kWh  (avg error in energy prediction)")
+    print(f"  Deficit accuracy:    {scores['accuracy']*100:.1f}%  (correctly predicted deficit/surplus)")
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    model_path = os.path.join(MODEL_DIR, f"{building_id}_model.keras")
+    atomic_save(model_path, model.save)
+    print(f"\n  Model saved → {model_path}")
+    weights_path = os.path.join(MODEL_DIR, f"{building_id}_weights.weights.h5")
+    atomic_save(weights_path, model.save_weights)
+    if codec:
+        write_client_update(building_id, codec)
+    return scores
+
+
+def write_client_update(building_id, codec):
+    """<bid>_update.npz: the new weights as a delta against the current global model."""
+    global_path = os.path.join(MODEL_DIR, GLOBAL_WEIGHTS)
+    if not os.path.exists(global_path):
+        print("  No global model yet — FedAvg will read the full weights")
+        return None
+    weights_path = os.path.join(MODEL_DIR, f"{building_id}_weights.weights.h5")
+    header = write_update(MODEL_DIR, building_id, read_tensors(weights_path), read_tensors(global_path),
+                          global_round(), codec, weights_stamp = file_stamp(weights_path))
+    print(f"  Update ({codec}) → {header['bytes']/1024:,.0f} KB vs {header['dense_bytes']/1024:,.0f} KB dense,"
+          f" relative error {header['rel_error']:.2e}")
+    return header
+
+
+def preprocess(building_id, use_cache = True):
+    """
+    Load, normalize and window a building's telemetry for train_building.
+    With use_cache the result is memory-mapped from window_cache.py when
+    the source data, FEATURES and window sizes are unchanged, and stored
+    there otherwise. The previous norm params are archived and the new
+    ones written either way. Returns (X, y_net, y_def, norm_version,
+    rows, last_sim_minute).
+    """
+    start, key = time.perf_counter(), None
+    if use_cache:
+        source = window_cache.source_fingerprint(building_id, TelemetryStore(STORE_DIR), DATA_DIR, STREAM_COLUMNS)
+        if source is not None:
+            key = window_cache.cache_key(*source, FEATURES, WINDOW_IN, WINDOW_OUT)
+            hit = window_cache.load(building_id, key)
+            if hit is not None:
+                arrays, meta = hit
+                norm_version = next_norm_version(building_id)
+                write_norm_params(building_id, meta["norm_params"])
+                X = sliding_window_view(arrays["scaled"],WINDOW_IN,axis = 0)[:meta["windows"]].transpose(0,2,1)
+                print(f"Loaded {building_id} from window cache: {meta['rows']:,} rows, "
+                      f"{meta['windows']:,} windows ({key})")
+                PREP_SECONDS.observe(time.perf_counter() - start, cache = "hit")
+                return X, arrays["y_net"], arrays["y_def"], norm_version, meta["rows"], meta["last_sim_minute"]
+
+    df = load_buiding_data(building_id)
+    norm_version = next_norm_version(building_id)
+    scaled,norm_params = normalize_features(df,FEATURES,building_id)
+    X,y_net,y_def = create_windows(scaled,df)
+    rows, last_minute = len(df), int(df["sim_minute"].iloc[-1])
+
+    # Only cache what matches the fingerprint (rows appended while reading change the hash)
+    if key is not None and window_cache.source_fingerprint(
+            building_id, TelemetryStore(STORE_DIR), DATA_DIR, STREAM_COLUMNS) == source:
+        window_cache.save(building_id, key, {"scaled": scaled, "y_net": y_net, "y_def": y_def}, {
+            "norm_params": norm_params, "rows": rows, "windows": len(y_net), "last_sim_minute": last_minute,
+            "source": source[0], "features": FEATURES, "window_in": WINDOW_IN, "window_out": WINDOW_OUT})
+        print(f"  Cached windows → {window_cache.entry_dir(building_id, key)}")
+    PREP_SECONDS.observe(time.perf_counter() - start, cache = "miss" if use_cache else "off")
+    return X, y_net, y_def, norm_version, rows, last_minute
+
+
+def train_building(building_id, codec = None, cache = True):
+    base_round = global_round()
+    X,y_net,y_def,norm_version,rows,last_minute = preprocess(building_id, cache)
+
+    split_idx = int(len(X)*(1-TEST_SPLIT))
+    X_train, X_test = X[:split_idx], X[split_idx:]
+    y_net_train, y_net_test = y_net[:split_idx], y_net[split_idx:]
+    y_def_train, y_def_test = y_def[:split_idx], y_def[split_idx:]
+
+    model = build_model(WINDOW_IN,len(FEATURES))
+    callbacks = training_callbacks(building_id)
+
+    # Windows stay views until a batch is requested — no (N, 60, 5) copy
+    train_batches = WindowBatches(X_train, y_net_train, y_def_train, shuffle=True)
+    test_batches  = WindowBatches(X_test, y_net_test, y_def_test)
+
     history = model.fit(
-        X_train,
-        {"net_kwh": y_net_train, "deficit_prob": y_def_train},
-        validation_data=(
-            X_test,
-            {"net_kwh": y_net_test, "deficit_prob": y_def_test},
-        ),
+        train_batches,
+        validation_data=test_batches,
         epochs=EPOCHS,
-        batch_size=BATCH_SIZE,
         callbacks=callbacks,
-        verbose=1,
+        verbose=FIT_VERBOSE,
     ) 
 
 
-    results = model.evaluate(
-        X_test,
-        {"net_kwh": y_net_test, "deficit_prob": y_def_test},
-        verbose=0,
+    results = model.evaluate(test_batches, verbose=0, return_dict=True)
+    scores = report_and_save(model, building_id, results, codec)
+    write_train_state(building_id, rows, last_minute, norm_version, "full", base_round)
+
+    return model, history, scores
+
+
+
+# ── Streaming training ────────────────────────────────────────
+# Reads telemetry in chunks and windows it on the fly, so memory stays
+# constant however many days of history a building has.
+
+STREAM_COLUMNS = FEATURES + ["net_flow_kw", "is_deficit", "sim_minute"]
+
+
+def iter_row_chunks(building_id, start_row=0, stop_row=None, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    Yield {column: array} chunks of valid telemetry rows in [start_row, stop_row).
+    The store is sliced straight from its memmaps; CSVs are parsed in
+    chunks with incomplete rows dropped (row numbers count valid rows only).
+    """
+    store = TelemetryStore(STORE_DIR)
+    if store.has(building_id):
+        row = 0
+        for seg in store.segments(building_id, STREAM_COLUMNS):
+            n = len(seg[STREAM_COLUMNS[0]])
+            lo, hi = max(start_row - row, 0), n if stop_row is None else min(stop_row - row, n)
+            for i in range(lo, hi, chunk_rows):
+                j = min(i + chunk_rows, hi)
+                yield {c: np.asarray(seg[c][i:j]) for c in STREAM_COLUMNS}
+            row += n
+            if stop_row is not None and row >= stop_row:
+                return
+        return
+
+    csv_path = os.path.join(DATA_DIR, f"{building_id}.csv")
+    row, offset = 0, None
+    if start_row:
+        # Seek to the nearest checkpoint instead of parsing from the top, so
+        # shards and epochs cost O(their range), not O(start_row)
+        for valid, pos in csv_checkpoints(csv_path):
+            if valid > start_row:
+                break
+            row, offset = valid, pos
+    with open(csv_path, "rb") as f:
+        names = _csv_header(f.readline())
+        if offset is not None:
+            f.seek(offset)
+        for chunk in pd.read_csv(f, header=None, names=names, chunksize=chunk_rows,
+                                 usecols=STREAM_COLUMNS, on_bad_lines="skip"):
+            chunk = chunk.apply(pd.to_numeric, errors="coerce").dropna()
+            n = len(chunk)
+            lo, hi = max(start_row - row, 0), n if stop_row is None else min(stop_row - row, n)
+            if lo < hi:
+                yield {c: chunk[c].values[lo:hi] for c in STREAM_COLUMNS}
+            row += n
+            if stop_row is not None and row >= stop_row:
+                return
+
+
+_CSV_CHECKPOINTS = {}
+_CSV_LOCK = threading.Lock()
+
+
+def _csv_header(line):
+    return list(pd.read_csv(io.BytesIO(line), nrows=0).columns)
+
+
+def csv_checkpoints(csv_path, every = STREAM_CHUNK_ROWS):
+    """
+    [(valid rows before, byte offset)] at every `every`-th line of a CSV.
+    Built with one parse under iter_row_chunks' rules (blocks end on line
+    boundaries, so counts match) and cached per file size/mtime.
+    """
+    stat = os.stat(csv_path)
+    key = (os.path.abspath(csv_path), stat.st_size, stat.st_mtime_ns, every)
+    with _CSV_LOCK:
+        if key not in _CSV_CHECKPOINTS:
+            points = []
+            with open(csv_path, "rb") as f:
+                header = f.readline()
+                names, offset, valid = _csv_header(header), len(header), 0
+                while block := b"".join(itertools.islice(f, every)):
+                    points.append((valid, offset))
+                    parsed = pd.read_csv(io.BytesIO(block), header=None, names=names,
+                                         usecols=STREAM_COLUMNS, on_bad_lines="skip")
+                    valid += len(parsed.apply(pd.to_numeric, errors="coerce").dropna())
+                    offset += len(block)
+            for stale in [k for k in _CSV_CHECKPOINTS if k[0] == key[0]]:
+                del _CSV_CHECKPOINTS[stale]   # older versions of this file
+            _CSV_CHECKPOINTS[key] = points
+        return _CSV_CHECKPOINTS[key]
+
+
+def read_rows(building_id, start_row, stop_row):
+    """Valid rows [start_row, stop_row) as {column: array} — reads only that range from the store."""
+    chunks = list(iter_row_chunks(building_id, start_row, stop_row))
+    if not chunks:
+        return {c: np.empty(0) for c in STREAM_COLUMNS}
+    return {c: np.concatenate([ch[c] for ch in chunks]) for c in STREAM_COLUMNS}
+
+
+def scan_telemetry(building_id, need_norm):
+    """One streaming pass: valid row count (+ per-feature min/max if need_norm)."""
+    store = TelemetryStore(STORE_DIR)
+    if store.has(building_id) and not need_norm:
+        return store.num_rows(building_id), None
+
+    rows, mins, maxs = 0, {}, {}
+    for chunk in iter_row_chunks(building_id):
+        rows += len(chunk[FEATURES[0]])
+        if need_norm:
+            for feat in FEATURES:
+                col = chunk[feat].astype(np.float32)
+                mins[feat] = min(mins.get(feat, np.inf), float(col.min()))
+                maxs[feat] = max(maxs.get(feat, -np.inf), float(col.max()))
+    norm = {feat: {"min": mins[feat], "max": maxs[feat]} for feat in FEATURES} if need_norm else None
+    return rows, norm
+
+
+def load_norm_params(building_id):
+    norm_path = os.path.join(MODEL_DIR, f"{building_id}_norm.json")
+    if not os.path.exists(norm_path):
+        return None
+    with open(norm_path) as f:
+        return json.load(f)
+
+
+def scale_features(cols, norm_params, features = FEATURES):
+    """Apply saved min/max params — same formula as normalize_features."""
+    scaled = np.zeros((len(cols[features[0]]), len(features)), dtype = np.float32)
+    for i, feat in enumerate(features):
+        col = np.asarray(cols[feat]).astype(np.float32)
+        mn, mx = norm_params[feat]["min"], norm_params[feat]["max"]
+        scaled[:, i] = 0 if mx - mn < 1e-10 else (col - mn) / (mx - mn)
+    return scaled
+
+
+def stream_window_blocks(building_id, norm_params, first, last, block = 1024):
+    """
+    Yield (X, {"net_kwh", "deficit_prob"}) blocks for window indices
+    [first, last). Window i covers rows [i, i + WINDOW_IN + WINDOW_OUT).
+    A (WINDOW_IN + WINDOW_OUT - 1)-row carry bridges chunk boundaries.
+    """
+    span  = WINDOW_IN + WINDOW_OUT
+    carry = None
+    for chunk in iter_row_chunks(building_id, first, last + span - 1):
+        if carry is not None:
+            chunk = {c: np.concatenate([carry[c], chunk[c]]) for c in STREAM_COLUMNS}
+        if len(chunk[FEATURES[0]]) >= span:
+            scaled = scale_features(chunk, norm_params)
+            X, y_net, y_def = create_windows(scaled, chunk)
+            for i in range(0, len(X), block):
+                yield (np.ascontiguousarray(X[i:i+block]),
+                       {"net_kwh": y_net[i:i+block], "deficit_prob": y_def[i:i+block]})
+            carry = {c: chunk[c][-(span - 1):] for c in STREAM_COLUMNS}
+        else:
+            carry = chunk
+
+
+def make_stream_dataset(building_id, norm_params, first, last, shuffle = False, shards = STREAM_SHARDS):
+    """tf.data pipeline over windows [first, last): interleaved shards → unbatch → (shuffle) → batch → prefetch."""
+    shards = max(1, min(shards, last - first))
+    bounds = np.linspace(first, last, shards + 1).astype(np.int64)
+    signature = (
+        tf.TensorSpec((None, WINDOW_IN, len(FEATURES)), tf.float32),
+        {"net_kwh": tf.TensorSpec((None,), tf.float32), "deficit_prob": tf.TensorSpec((None,), tf.float32)},
     )
 
-    print(f"  Net energy MAE:      {results[3]:.4f} kWh  (avg error in energy prediction)")
-    print(f"  Deficit accuracy:    {results[4]*100:.1f}%  (correctly predicted deficit/surplus)")
+    def shard(lo, hi):
+        return tf.data.Dataset.from_generator(
+            lambda lo, hi: stream_window_blocks(building_id, norm_params, int(lo), int(hi)),
+            args = (lo, hi), output_signature = signature,
+        )
+
+    ds = tf.data.Dataset.from_tensor_slices((bounds[:-1], bounds[1:])).interleave(
+        shard, cycle_length = shards, num_parallel_calls = tf.data.AUTOTUNE, deterministic = not shuffle,
+    ).unbatch()
+    if shuffle:
+        ds = ds.shuffle(SHUFFLE_BUFFER, reshuffle_each_iteration = True)
+    return ds.batch(BATCH_SIZE).prefetch(tf.data.AUTOTUNE)
+
+
+def train_building_streaming(building_id, codec = None):
+    """
+    train_building without loading the history into RAM. Uses the saved
+    *_norm.json when present (otherwise computes and saves it in one
+    streaming pass) and keeps the same chronological TEST_SPLIT.
+    """
+    base_round = global_round()
+    norm_params = load_norm_params(building_id)
+    state = load_train_state(building_id)
+    rows, scanned = scan_telemetry(building_id, need_norm = norm_params is None)
+    if norm_params is None:
+        norm_version = next_norm_version(building_id)
+        norm_params = scanned
+        write_norm_params(building_id, norm_params)
+    else:
+        norm_version = state["norm_version"] if state else 1
+    print(f"Streaming {building_id}: {rows:,} rows, {rows/1440:.1f} simulated days")
 
-    os.makedirs(MODEL_DIR, exist_ok=True)
+    num_samples = rows - WINDOW_IN - WINDOW_OUT + 1
+    split_idx = int(num_samples*(1-TEST_SPLIT))
+    train_ds = make_stream_dataset(building_id, norm_params, 0, split_idx, shuffle = True)
+    test_ds  = make_stream_dataset(building_id, norm_params, split_idx, num_samples)
+
+    model = build_model(WINDOW_IN,len(FEATURES))
+    history = model.fit(
+        train_ds,
+        validation_data=test_ds,
+        epochs=EPOCHS,
+        callbacks=training_callbacks(building_id),
+        verbose=FIT_VERBOSE,
+    )
+
+    results = model.evaluate(test_ds, verbose=0, return_dict=True)
+    scores = report_and_save(model, building_id, results, codec)
+    last = read_rows(building_id, rows - 1, rows)
+    write_train_state(building_id, rows, last["sim_minute"][-1], norm_version, "stream", base_round)
+
+    return model, history, scores
+
+
+# ── Incremental warm-start training ───────────────────────────
+# Loads the deployed model and fine-tunes it on rows added since the last
+# run (plus a replay sample of older windows), instead of retraining on
+# the whole history. Normalization is either frozen (keep the scale the
+# deployed model was trained under) or running (widen min/max to cover
+# the new rows, bumping the norm version when the scale changes).
+
+def train_building_incremental(building_id, replay = REPLAY_FRACTION, norm_mode = "frozen", codec = None):
     model_path = os.path.join(MODEL_DIR, f"{building_id}_model.keras")
-    model.save(model_path)
-    print(f"\n  Model saved → {model_path}")
-    weights_path = os.path.join(MODEL_DIR, f"{building_id}_weights.weights.h5")
-    model.save_weights(weights_path)
+    base_round = global_round()
+    state = load_train_state(building_id)
+    norm_params = load_norm_params(building_id)
+    if state is None or norm_params is None or not os.path.exists(model_path):
+        print(f"  [{building_id}] no previous run recorded — full training")
+        return train_building(building_id, codec)
+
+    span = WINDOW_IN + WINDOW_OUT
+    rows, _ = scan_telemetry(building_id, need_norm = False)
+    consumed = state["rows_consumed"]
+    if rows < consumed:
+        print(f"  [{building_id}] telemetry has {rows:,} rows, fewer than the {consumed:,} already consumed"
+              f" (rotated or truncated) — full training")
+        return train_building(building_id, codec)
+    if rows - consumed < WINDOW_OUT or rows < span:
+        print(f"  [{building_id}] up to date — {rows - consumed} new rows since last run")
+        return None, None, None
+
+    # Windows whose future ends in the new rows: start at consumed - span + 1
+    first = max(0, consumed - span + 1)
+    new = read_rows(building_id, first, rows)
+    print(f"Incremental {building_id}: {rows - consumed:,} new rows since sim_minute {state['last_sim_minute']}")
+
+    norm_version = state["norm_version"]
+    if norm_mode == "running":
+        widened = {
+            feat: {"min": min(norm_params[feat]["min"], float(new[feat][-(rows - consumed):].astype(np.float32).min())),
+                   "max": max(norm_params[feat]["max"], float(new[feat][-(rows - consumed):].astype(np.float32).max()))}
+            for feat in FEATURES
+        }
+        if widened != {feat: norm_params[feat] for feat in FEATURES}:
+            norm_version = next_norm_version(building_id)
+            norm_params = widened
+            write_norm_params(building_id, norm_params)
+            print(f"  Normalization widened → version {norm_version}")
+
+    X_new, y_net_new, y_def_new = create_windows(scale_features(new, norm_params), new)
+    split_idx = int(len(X_new)*(1-TEST_SPLIT))
+    X_parts = [np.asarray(X_new[:split_idx])]
+    y_net_parts, y_def_parts = [y_net_new[:split_idx]], [y_def_new[:split_idx]]
+
+    # Replay older windows so fine-tuning doesn't forget the rest of the history
+    n_replay = int(replay * len(X_new))
+    if n_replay and first > 0:
+        block = max(1, -(-n_replay // REPLAY_BLOCKS))
+        rng = np.random.default_rng()
+        for start in rng.integers(0, max(1, first - block), size = REPLAY_BLOCKS):
+            old = read_rows(building_id, int(start), int(min(start + block + span - 1, first + span - 1)))
+            if len(old[FEATURES[0]]) < span:
+                continue
+            X_old, y_net_old, y_def_old = create_windows(scale_features(old, norm_params), old)
+            X_parts.append(np.asarray(X_old))
+            y_net_parts.append(y_net_old)
+            y_def_parts.append(y_def_old)
+        print(f"  Replaying {sum(len(x) for x in X_parts[1:]):,} older windows")
+
+    train_batches = WindowBatches(np.concatenate(X_parts), np.concatenate(y_net_parts),
+                                  np.concatenate(y_def_parts), shuffle=True)
+    test_batches  = WindowBatches(X_new[split_idx:], y_net_new[split_idx:], y_def_new[split_idx:])
+
+    # Warm-start from whatever serves this building now — the FedAvg global
+    # model if it was synced and hasn't retrained since, else its own model
+    model = keras.models.load_model(resolve_model_path(MODEL_DIR, building_id))
+    model.optimizer.learning_rate.assign(INCREMENTAL_LR)
+    history = model.fit(
+        train_batches,
+        validation_data=test_batches,
+        epochs=INCREMENTAL_EPOCHS,
+        callbacks=training_callbacks(building_id),
+        verbose=FIT_VERBOSE,
+    )
+
+    results = model.evaluate(test_batches, verbose=0, return_dict=True)
+    scores = report_and_save(model, building_id, results, codec)
+    write_train_state(building_id, rows, new["sim_minute"][-1], norm_version, f"incremental/{norm_mode}", base_round)
+
+    return model, history, scores
+
+
+# ── Parallel multi-building training ──────────────────────────
+
+def discover_buildings():
+    """Every building with telemetry — in the store or as data/<id>.csv."""
+    ids = set(TelemetryStore(STORE_DIR).buildings())
+    if os.path.isdir(DATA_DIR):
+        ids |= {f[:-4] for f in os.listdir(DATA_DIR) if f.endswith(".csv")}
+    return sorted(ids)
+
+
+def _init_worker(intra_threads, inter_threads):
+    """Pin TF thread pools so N worker processes don't oversubscribe the cores."""
+    global FIT_VERBOSE
+    FIT_VERBOSE = 2
+    tf.config.threading.set_intra_op_parallelism_threads(intra_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_threads)
+
+
+TRAINERS = {
+    "full":        train_building,
+    "stream":      train_building_streaming,
+    "incremental": train_building_incremental,
+}
+
+
+def _train_worker(building_id, mode, options):
+    start = time.perf_counter()
+    try:
+        _, history, scores = TRAINERS[mode](building_id, **options)
+        if history is None:
+            row = {"building": building_id, "status": "up to date"}
+        else:
+            row = {"building": building_id, "status": "ok", **scores,
+                   "epochs": len(history.history["loss"])}
+    except Exception as e:
+        row = {"building": building_id, "status": f"FAILED: {e}"}
+    wall = time.perf_counter() - start
+    TRAIN_SECONDS.observe(wall, mode=mode)
+    TRAIN_RUNS.inc(mode=mode, status=row["status"].split(":")[0])
+    # This process's metrics travel back with the result (merged by train_many)
+    return {**row, "wall_s": round(wall, 1), "metrics": metrics.state(reset=True)}
+
+
+def train_many(building_ids, workers=None, threads_per_worker=None, mode="full", **options):
+    """
+    Train building_ids in a process pool with the TRAINERS[mode] function
+    (options are passed through to it). Each worker gets
+    threads_per_worker intra-op threads (default: cores / workers) and
+    writes its model, weights and norm files atomically. Returns one
+    summary dict per building and saves them to train_summary.json.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    import multiprocessing as mp
+
+    cores   = os.cpu_count() or 1
+    workers = max(1, min(workers or cores, len(building_ids)))
+    threads = threads_per_worker or max(1, cores // workers)
+    print(f"Training {len(building_ids)} buildings — {workers} workers × {threads} TF threads")
+
+    start, summary = time.perf_counter(), []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                             initializer=_init_worker, initargs=(threads, min(2, threads))) as pool:
+        futures = [pool.submit(_train_worker, bid, mode, options) for bid in building_ids]
+        for fut in as_completed(futures):
+            row = fut.result()
+            metrics.merge(row.pop("metrics"))
+            summary.append(row)
+            print(f"  [{row['building']}] {row['status']}  ({row['wall_s']}s)  — {len(summary)}/{len(building_ids)} done")
+
+    summary.sort(key=lambda r: r["building"])
+    print(f"\n  {'building':10s} {'MAE kWh':>9s} {'accuracy':>9s} {'epochs':>7s} {'wall s':>8s}  status")
+    for r in summary:
+        if r["status"] == "ok":
+            print(f"  {r['building']:10s} {r['mae']:9.4f} {r['accuracy']*100:8.1f}% {r['epochs']:7d} {r['wall_s']:8.1f}  ok")
+        else:
+            print(f"  {r['building']:10s} {'':9s} {'':9s} {'':7s} {r['wall_s']:8.1f}  {r['status']}")
+    print(f"\n  Total wall time: {time.perf_counter() - start:.1f}s")
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    summary_path = os.path.join(MODEL_DIR, "train_summary.json")
+
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(summary, f, indent=2)
+    atomic_save(summary_path, write)
+    print(f"  Summary → {summary_path}")
+    return summary
 
-    return model, history
 
 if __name__ == "__main__":
     
-    building_arg = sys.argv[1].upper()
+    import argparse
+    parser = argparse.ArgumentParser(description="Train per-building LSTM models")
+    parser.add_argument("building", help="building ID, or ALL for every building with telemetry")
+    parser.add_argument("--stream", action="store_true", help="streaming tf.data input (constant memory)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="fine-tune the saved model on rows added since the last run")
+    parser.add_argument("--norm", choices=["frozen", "running"], default="frozen",
+                        help="--incremental: keep the saved scaling, or widen it to cover new rows")
+    parser.add_argument("--replay", type=float, default=REPLAY_FRACTION,
+                        help="--incremental: older windows replayed, as a fraction of new windows")
+    parser.add_argument("--workers", type=int, help="ALL: parallel worker processes (default: cores)")
+    parser.add_argument("--threads", type=int, help="ALL: TF intra-op threads per worker")
+    parser.add_argument("--update", choices=CODECS,
+                        help="also write a compressed FedAvg update (delta against the global model)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="full mode: don't use or write the preprocessed window cache (window_cache.py)")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    snapshots = metrics.start_from_args(args)
+
+    building_arg = args.building.upper()
+    mode = "incremental" if args.incremental else "stream" if args.stream else "full"
+    options = {"replay": args.replay, "norm_mode": args.norm} if args.incremental else {}
+    if args.update:
+        options["codec"] = args.update
+    if args.no_cache and mode == "full":
+        options["cache"] = False
 
     if building_arg=="ALL":
-        for bid in ["B1", "B2", "B3", "B4", "B5"]:
-            train_building(bid)
+        train_many(discover_buildings(), args.workers, args.threads, mode, **options)
     else:
-        train_building(building_arg)
+        with TRAIN_SECONDS.time(mode=mode):
+            TRAINERS[mode](building_arg, **options)
+
+    if snapshots is not None:
+        snapshots.close()
 
     
@@ -0,0 +1,157 @@
+"""
+weight_codec.py — Compressed FedAvg Client Updates
+─────────────────────────────────────────────────────────
+Instead of the aggregator reading a client's whole model, a client can
+publish <bid>_update.npz: the difference between its new weights and
+the global model it trained from, in one of three codecs:
+
+    delta   float32 delta, no loss
+    int8    delta quantized to int8 with one scale per tensor (~4x smaller)
+    topk    only the largest topk_fraction of delta entries across the
+            whole model, as (flat index, value) pairs
+
+Lossy codecs use error feedback: what a round didn't transmit is kept in
+<bid>_residual.npy on the client and added to the next delta, so no part
+of the update is lost for good, only delayed.
+
+Tensors are handled as one flat float32 vector (in sorted key order), so
+encoding and decoding are a handful of whole-model NumPy operations.
+The header records the keys/shapes, the global round the delta is
+against, the codec and the client-side reconstruction error.
+"""
+
+import os, io, json
+import numpy as np
+import h5py
+
+CODECS        = ("delta", "int8", "topk")
+TOPK_FRACTION = 0.01              # topk: share of delta entries sent each round
+WEIGHTS_GROUP = "layers"          # model tensors inside a Keras 3 .weights.h5 (optimizer/metrics are skipped)
+
+
+def update_path(model_dir, building_id):
+    return os.path.join(model_dir, f"{building_id}_update.npz")
+
+
+def residual_path(model_dir, building_id):
+    return os.path.join(model_dir, f"{building_id}_residual.npy")
+
+
+def read_tensors(source):
+    """{"layers/...": array} from a .weights.h5 path or file-like object, sorted by key."""
+    tensors = {}
+    with h5py.File(source, "r") as f:
+        def visit(name, obj):
+            if isinstance(obj, h5py.Dataset):
+                tensors[f"{WEIGHTS_GROUP}/{name}"] = obj[()]
+        f[WEIGHTS_GROUP].visititems(visit)
+    return dict(sorted(tensors.items()))
+
+
+def flatten(tensors):
+    keys   = sorted(tensors)
+    shapes = [list(np.shape(tensors[k])) for k in keys]
+    flat   = np.concatenate([np.asarray(tensors[k], dtype=np.float32).ravel() for k in keys])
+    return keys, shapes, flat
+
+
+def unflatten(keys, shapes, flat):
+    sizes = [int(np.prod(s)) for s in shapes]
+    parts = np.split(flat, np.cumsum(sizes)[:-1])
+    return {k: p.reshape(s) for k, s, p in zip(keys, shapes, parts)}
+
+
+def _encode_flat(target, sizes, codec, topk_fraction):
+    """Arrays to store for `target` (flat float32) and its decoded value."""
+    if codec == "delta":
+        return {"values": target}, target
+    if codec == "int8":
+        offsets = np.cumsum(sizes)[:-1]
+        peaks   = np.array([np.abs(p).max(initial=0.0) for p in np.split(target, offsets)], dtype=np.float32)
+        scales  = np.where(peaks > 0, peaks / 127.0, 1.0).astype(np.float32)
+        q = np.clip(np.rint(target / np.repeat(scales, sizes)), -127, 127).astype(np.int8)
+        return {"q": q, "scales": scales}, _decode_flat({"q": q, "scales": scales}, sizes, "int8")
+    if codec == "topk":
+        k   = max(1, int(np.ceil(topk_fraction * target.size)))
+        idx = np.sort(np.argpartition(np.abs(target), target.size - k)[-k:]).astype(np.int32)
+        arrays = {"idx": idx, "values": target[idx]}
+        return arrays, _decode_flat(arrays, sizes, "topk")
+    raise ValueError(f"Unknown codec {codec!r} — expected one of {CODECS}")
+
+
+def _decode_flat(arrays, sizes, codec):
+    if codec == "delta":
+        return arrays["values"].astype(np.float32, copy=False)
+    if codec == "int8":
+        return arrays["q"].astype(np.float32) * np.repeat(arrays["scales"], sizes)
+    if codec == "topk":
+        flat = np.zeros(int(np.sum(sizes)), dtype=np.float32)
+        flat[arrays["idx"]] = arrays["values"]
+        return flat
+    raise ValueError(f"Unknown codec {codec!r} — expected one of {CODECS}")
+
+
+def write_update(model_dir, building_id, local, base, base_round, codec,
+                 weights_stamp=None, topk_fraction=TOPK_FRACTION):
+    """
+    Encode local - base (both {key: array}) to <bid>_update.npz, carrying
+    the client's residual for lossy codecs. Returns the header.
+    """
+    keys, shapes, flat_local = flatten(local)
+    base_keys, base_shapes, flat_base = flatten(base)
+    if keys != base_keys or shapes != base_shapes:
+        raise ValueError("local weights don't match the global model (different architecture?)")
+    sizes = [int(np.prod(s)) for s in shapes]
+
+    target = flat_local - flat_base
+    res_path = residual_path(model_dir, building_id)
+    if codec != "delta" and os.path.exists(res_path):
+        residual = np.load(res_path)
+        if residual.shape == target.shape:
+            target = target + residual
+
+    arrays, decoded = _encode_flat(target, sizes, codec, topk_fraction)
+    err  = decoded - target
+    norm = float(np.linalg.norm(target))
+    if codec == "delta":
+        if os.path.exists(res_path):
+            os.remove(res_path)
+    else:
+        np.save(res_path, err * -1.0)   # what this round didn't send
+
+    header = {
+        "building":      building_id,
+        "base_round":    int(base_round),
+        "codec":         codec,
+        "keys":          keys,
+        "shapes":        shapes,
+        "weights_stamp": weights_stamp,
+        "rel_error":     float(np.linalg.norm(err)) / norm if norm else 0.0,
+        "dense_bytes":   int(flat_local.nbytes),
+    }
+
+    buf = io.BytesIO()
+    np.savez(buf, header=np.frombuffer(json.dumps(header).encode(), dtype=np.uint8), **arrays)
+    path = update_path(model_dir, building_id)
+    tmp  = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(buf.getbuffer())
+    os.replace(tmp, path)
+    header["bytes"] = buf.getbuffer().nbytes
+    return header
+
+
+def read_update_header(path):
+    with np.load(path) as z:
+        return json.loads(z["header"].tobytes())
+
+
+def read_update(path):
+    """(header, {key: float32 delta}) — decoded with whole-model vector ops."""
+    with np.load(path) as z:
+        header = json.loads(z["header"].tobytes())
+        arrays = {name: z[name] for name in z.files if name != "header"}
+    sizes = [int(np.prod(s)) for s in header["shapes"]]
+    flat  = _decode_flat(arrays, sizes, header["codec"])
+    header["bytes"] = os.path.getsize(path)
+    return header, unflatten(header["keys"], header["shapes"], flat)
@@ -0,0 +1,144 @@
+"""
+window_cache.py — Preprocessed Training Window Cache
+─────────────────────────────────────────────────────────
+Keeps the output of train_local's preprocessing (normalized feature
+matrix, window labels, norm params) as .npy files that are memory-mapped
+back in, so a repeated run — e.g. a LEARNING_RATE / BATCH_SIZE sweep —
+skips CSV parsing, normalize_features and create_windows.
+
+Layout:
+    cache/B1/<key>/scaled.npy      (rows, features) float32
+    cache/B1/<key>/y_net.npy       (windows,) float32
+    cache/B1/<key>/y_def.npy       (windows,) float32
+    cache/B1/<key>/meta.json       norm params, rows, last sim_minute, key inputs
+
+The key hashes everything the arrays depend on: a content hash of the
+source telemetry (CSV bytes, or the store's committed columns) and its
+row range, the feature list, the window sizes and the entry FORMAT.
+Change any of them and the key changes, so a stale entry is never read;
+older entries of the building are removed when a new one is written.
+Entries are written to a temp dir and renamed into place, so a crash
+never leaves a partial entry.
+
+    python window_cache.py list            # cached entries per building
+    python window_cache.py clear [B1 …]    # drop entries
+"""
+
+import os, sys, json, time, shutil, hashlib
+import numpy as np
+
+CACHE_DIR  = "cache"
+ARRAYS     = ("scaled", "y_net", "y_def")
+HASH_BLOCK = 1 << 20
+FORMAT     = 2          # bump when what an entry holds changes (2: rows counts valid rows only)
+
+
+def source_fingerprint(building_id, store, data_dir, columns):
+    """
+    (content hash, rows) of a building's telemetry — the store's committed
+    `columns` if it has the building, else data_dir/<id>.csv. None if neither exists.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    if store.has(building_id):
+        rows = 0
+        for cols in store.segments(building_id, columns):
+            for c in columns:
+                h.update(c.encode())
+                h.update(np.ascontiguousarray(cols[c]))
+            rows += len(cols[columns[0]])
+        return "store:" + h.hexdigest(), rows
+    csv_path = os.path.join(data_dir, f"{building_id}.csv")
+    if not os.path.exists(csv_path):
+        return None
+    newlines, last = 0, b"\n"
+    with open(csv_path, "rb") as f:
+        while block := f.read(HASH_BLOCK):
+            h.update(block)
+            newlines += block.count(b"\n")
+            last = block[-1:]
+    rows = newlines - 1 + (last != b"\n")   # minus header, plus an unterminated last row
+    return "csv:" + h.hexdigest(), rows
+
+
+def cache_key(fingerprint, rows, features, window_in, window_out):
+    spec = json.dumps({"format": FORMAT, "source": fingerprint, "rows": [0, rows], "features": list(features),
+                       "window_in": window_in, "window_out": window_out}, sort_keys=True)
+    return hashlib.blake2b(spec.encode(), digest_size=12).hexdigest()
+
+
+def entry_dir(building_id, key, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, building_id, key)
+
+
+def load(building_id, key, cache_dir=CACHE_DIR):
+    """(arrays as read-only memmaps, meta) for a complete entry, or None."""
+    path = entry_dir(building_id, key, cache_dir)
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+    except (OSError, ValueError):
+        return None
+    return arrays, meta
+
+
+def save(building_id, key, arrays, meta, cache_dir=CACHE_DIR):
+    """Write an entry atomically and drop the building's older entries. Returns its directory."""
+    final = entry_dir(building_id, key, cache_dir)
+    tmp   = f"{final}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name in ARRAYS:
+        np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(arrays[name]))
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({**meta, "key": key, "created": time.strftime("%Y-%m-%d %H:%M:%S")}, f, indent=2)
+    shutil.rmtree(final, ignore_errors=True)
+    os.replace(tmp, final)
+    clear(building_id, cache_dir, keep=key)
+    return final
+
+
+def clear(building_id=None, cache_dir=CACHE_DIR, keep=None):
+    """Remove a building's entries (all buildings if None), except `keep`. Returns entries removed."""
+    ids = [building_id] if building_id else (os.listdir(cache_dir) if os.path.isdir(cache_dir) else [])
+    removed = 0
+    for bid in ids:
+        folder = os.path.join(cache_dir, bid)
+        if not os.path.isdir(folder):
+            continue
+        for name in os.listdir(folder):
+            if name != keep and ".tmp-" not in name:
+                shutil.rmtree(os.path.join(folder, name), ignore_errors=True)
+                removed += 1
+    return removed
+
+
+def entries(cache_dir=CACHE_DIR):
+    """[(building, key, meta, bytes)] for every complete entry."""
+    out = []
+    if not os.path.isdir(cache_dir):
+        return out
+    for bid in sorted(os.listdir(cache_dir)):
+        for key in sorted(os.listdir(os.path.join(cache_dir, bid))):
+            path = os.path.join(cache_dir, bid, key)
+            try:
+                with open(os.path.join(path, "meta.json")) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            size = sum(os.path.getsize(os.path.join(path, n)) for n in os.listdir(path))
+            out.append((bid, key, meta, size))
+    return out
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "list":
+        for bid, key, meta, size in entries():
+            print(f"{bid:8s} {key}  rows={meta['rows']:,}  windows={meta['windows']:,}  "
+                  f"{size / 2**20:.1f} MB  {meta['created']}")
+    elif cmd == "clear":
+        n = sum(clear(bid) for bid in sys.argv[2:]) if len(sys.argv) > 2 else clear()
+        print(f"Removed {n} cache entries")
+    else:
+        print(__doc__)
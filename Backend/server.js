@@ -32,7 +32,7 @@ app.use(cors({
     methods: ['GET', 'POST', 'PUT', 'DELETE'],
     // credentials: true, // Disable to allow wildcard origin
 }));
-app.use(express.json());
+app.use(express.json({ limit: '5mb' }));  // generator publisher sends batched ticks
 
 // Supabase Admin Client (service role — keep this server-side only!)
 const supabase = createClient(
@@ -100,59 +100,66 @@ function hasLiveData() {
 //  POST /update  — receives real-time data from Python generator
 // ═══════════════════════════════════════════════════════════════
 
+/** Apply one generator tick to the live store + history */
+function ingestUpdate(d) {
+    const bid = d.building_id;
+
+    // Store latest snapshot
+    liveBuildings[bid] = {
+        id: bid,
+        name: BUILDING_META[bid]?.name || bid,
+        building_type: d.building_type || BUILDING_META[bid]?.btype || 'Unknown',
+        sim_minute: d.sim_minute,
+        hour_of_day: d.hour_of_day,
+        solar_kw: d.solar_kw,
+        base_kwh: d.base_kwh,
+        spike_kwh: d.spike_kwh,
+        total_drained_kwh: d.total_drained_kwh,
+        battery_kwh: d.battery_kwh,
+        battery_cap: d.battery_cap,
+        is_deficit: d.is_deficit,
+        spike_active: d.spike_active,
+        spike_mins_left: d.spike_mins_left,
+        // Derived fields for the frontend
+        solar: Math.round(d.solar_kw || 0),
+        load: Math.round((d.total_drained_kwh || 0) * 60),   // kWh/min → approx kW
+        battery: d.battery_cap > 0 ? Math.round((d.battery_kwh / d.battery_cap) * 100) : 0,
+        status: d.is_deficit ? 'Deficit' : 'Surplus',
+        last_updated: Date.now(),
+    };
+
+    // Append to history
+    if (!buildingHistory[bid]) buildingHistory[bid] = [];
+    buildingHistory[bid].push({
+        sim_minute: d.sim_minute,
+        hour_of_day: d.hour_of_day,
+        solar_kw: d.solar_kw,
+        solar_output_kw: d.solar_kw / 60,   // per-minute for LSTM compatibility
+        consumption_kw: d.total_drained_kwh,
+        battery_kwh: d.battery_kwh,
+        battery_cap: d.battery_cap,
+        is_deficit: d.is_deficit,
+        net_flow_kw: (d.solar_kw / 60) - d.total_drained_kwh,
+        total_drained_kwh: d.total_drained_kwh,
+        spike_active: d.spike_active,
+    });
+    if (buildingHistory[bid].length > MAX_HISTORY) {
+        buildingHistory[bid] = buildingHistory[bid].slice(-MAX_HISTORY);
+    }
+
+    // Recharge central battery from surplus
+    rechargeCentralBattery();
+}
+
+// Body is one tick object, or an array of ticks (batched by the generator's publisher)
 app.post('/update', (req, res) => {
     try {
-        const d = req.body;
-        const bid = d.building_id;
-        if (!bid) return res.status(400).json({ error: 'Missing building_id' });
-
-        // Store latest snapshot
-        liveBuildings[bid] = {
-            id: bid,
-            name: BUILDING_META[bid]?.name || bid,
-            building_type: d.building_type || BUILDING_META[bid]?.btype || 'Unknown',
-            sim_minute: d.sim_minute,
-            hour_of_day: d.hour_of_day,
-            solar_kw: d.solar_kw,
-            base_kwh: d.base_kwh,
-            spike_kwh: d.spike_kwh,
-            total_drained_kwh: d.total_drained_kwh,
-            battery_kwh: d.battery_kwh,
-            battery_cap: d.battery_cap,
-            is_deficit: d.is_deficit,
-            spike_active: d.spike_active,
-            spike_mins_left: d.spike_mins_left,
-            // Derived fields for the frontend
-            solar: Math.round(d.solar_kw || 0),
-            load: Math.round((d.total_drained_kwh || 0) * 60),   // kWh/min → approx kW
-            battery: d.battery_cap > 0 ? Math.round((d.battery_kwh / d.battery_cap) * 100) : 0,
-            status: d.is_deficit ? 'Deficit' : 'Surplus',
-            last_updated: Date.now(),
-        };
+        const ticks = Array.isArray(req.body) ? req.body : [req.body];
+        if (ticks.some(d => !d || !d.building_id)) return res.status(400).json({ error: 'Missing building_id' });
 
-        // Append to history
-        if (!buildingHistory[bid]) buildingHistory[bid] = [];
-        buildingHistory[bid].push({
-            sim_minute: d.sim_minute,
-            hour_of_day: d.hour_of_day,
-            solar_kw: d.solar_kw,
-            solar_output_kw: d.solar_kw / 60,   // per-minute for LSTM compatibility
-            consumption_kw: d.total_drained_kwh,
-            battery_kwh: d.battery_kwh,
-            battery_cap: d.battery_cap,
-            is_deficit: d.is_deficit,
-            net_flow_kw: (d.solar_kw / 60) - d.total_drained_kwh,
-            total_drained_kwh: d.total_drained_kwh,
-            spike_active: d.spike_active,
-        });
-        if (buildingHistory[bid].length > MAX_HISTORY) {
-            buildingHistory[bid] = buildingHistory[bid].slice(-MAX_HISTORY);
-        }
-
-        // Recharge central battery from surplus
-        rechargeCentralBattery();
+        for (const d of ticks) ingestUpdate(d);
 
-        res.json({ status: 'ok' });
+        res.json({ status: 'ok', received: ticks.length });
     } catch (err) {
         console.error('[/update] Error:', err.message);
         res.status(500).json({ error: 'Internal error' });
@@ -277,12 +284,67 @@ app.get('/api/buildings/history', (_req, res) => {
 });
 
 // ─── Building predictions (ML-derived) ────────────────────────
-app.get('/api/buildings/predictions', (_req, res) => {
+// Real predictions come from the Python inference daemon
+// (`python "predict (1).py" --serve`), scored on the last 60 ticks of
+// history. Buildings it can't score — or everything, if it's down — fall
+// back to the heuristic estimates below.
+const PREDICT_URL = process.env.PREDICT_URL || 'http://127.0.0.1:8765';
+const PREDICT_TIMEOUT_MS = 250;
+const MODEL_WINDOW = 60;
+
+/** Last MODEL_WINDOW history rows as the model's feature columns */
+function modelWindow(history) {
+    const rows = history.slice(-MODEL_WINDOW);
+    return {
+        solar_output_kw: rows.map(r => r.solar_output_kw),
+        consumption_kw: rows.map(r => r.consumption_kw),
+        battery_level_kwh: rows.map(r => r.battery_kwh),
+        time_sin: rows.map(r => +Math.sin(2 * Math.PI * r.hour_of_day / 24).toFixed(6)),
+        time_cos: rows.map(r => +Math.cos(2 * Math.PI * r.hour_of_day / 24).toFixed(6)),
+    };
+}
+
+/** { bid: { predicted_net_kwh, deficit_probability } } from the daemon, or {} if unavailable */
+async function fetchModelPredictions() {
+    const buildings = {};
+    for (const [bid, history] of Object.entries(buildingHistory)) {
+        if (history.length >= MODEL_WINDOW) buildings[bid] = modelWindow(history);
+    }
+    if (Object.keys(buildings).length === 0) return {};
+    try {
+        const r = await fetch(`${PREDICT_URL}/predict`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ buildings }),
+            signal: AbortSignal.timeout(PREDICT_TIMEOUT_MS),
+        });
+        if (!r.ok) return {};
+        return (await r.json()).predictions || {};
+    } catch {
+        return {};   // daemon not running / too slow — use the fallback
+    }
+}
+
+app.get('/api/buildings/predictions', async (_req, res) => {
+    const model = await fetchModelPredictions();
     const predictions = {};
     const deficitBuildings = new Set(['B2', 'B4']);
     for (const bid of ['B1', 'B2', 'B3', 'B4', 'B5']) {
         const live = liveBuildings[bid];
-        if (live) {
+        if (live && model[bid]) {
+            const batteryPct = live.battery_cap > 0 ? live.battery_kwh / live.battery_cap : 0.5;
+            const { predicted_net_kwh, deficit_probability } = model[bid];
+            predictions[bid] = {
+                predicted_net_kwh,
+                deficit_probability,
+                // Minutes the battery lasts at the predicted drain rate (capped at a day);
+                // predicted_net_kwh is the total over the next 60 minutes
+                buffer_minutes: predicted_net_kwh < 0
+                    ? Math.min(1440, Math.floor(60 * live.battery_kwh / -predicted_net_kwh))
+                    : Math.floor(60 + batteryPct * 80),
+                source: 'model',
+            };
+        } else if (live) {
             // Derive predictions from live state
             const isDef = live.is_deficit;
             const batteryPct = live.battery_cap > 0 ? live.battery_kwh / live.battery_cap : 0.5;